@@ -1,38 +1,46 @@
 # web-monitor/app/__init__.py
+import logging
 import os
+import time
+
+_import_started = time.perf_counter()
 
 from flask import Flask
-from flask_admin import Admin
-from flask_admin.menu import MenuLink
-from flask_login import LoginManager
-
-from . import extensions
-from .commands import create_reset_token_command, init_db_command
-from .models import HealthCheckLog, MonitoredSite, MonitoringConfig, NotificationChannel, User
-from .routes import (
-    AuthenticatedMenuLink,
-    HealthCheckLogView,
-    MonitoringSettingsView,
-    MonitoredSiteView,
-    MyAdminIndexView,
-    NotificationChannelView,
-    ThemeSettingsView,
-    main_bp,
+
+from . import extensions, log_config, log_store, metrics, status_snapshot
+from .checker import start_background_jobs, sync_monitoring_config
+from .commands import (
+    bench_group,
+    cleanup_data_command,
+    create_reset_token_command,
+    init_db_command,
+    monitor_group,
+    rebuild_segments_command,
 )
-from .services import check_website_health, cleanup_old_data
+from .models import HealthCheckLog, MonitoredSite, NotificationChannel, User
 
+_import_seconds = time.perf_counter() - _import_started
+logger = logging.getLogger(__name__)
 
-def create_app(config_object='config'):
-    app = Flask(__name__, instance_relative_config=True)
-    app.config.from_object(config_object)
-    try:
-        os.makedirs(app.instance_path)
-    except OSError:
-        pass
 
-    # 2. 初始化插件
-    extensions.db.init_app(app)
-    extensions.migrate.init_app(app, extensions.db)
+def _register_web(app):
+    """登录、后台管理与页面蓝图；独立检查进程（web=False）不需要，也不导入 routes 与 Flask-Admin 的模型视图。"""
+    from flask_admin import Admin
+    from flask_admin.menu import MenuLink
+    from flask_login import LoginManager
+
+    from .routes import (
+        AuthenticatedMenuLink,
+        HealthCheckLogView,
+        MonitoringSettingsView,
+        MonitoredSiteView,
+        MyAdminIndexView,
+        NotificationChannelView,
+        PartitionedHealthCheckLogView,
+        ProfilesView,
+        ThemeSettingsView,
+        main_bp,
+    )
 
     # 3. 初始化 Flask-Login
     login_manager = LoginManager()
@@ -63,7 +71,13 @@ def create_app(config_object='config'):
 
     # 5. 添加所有导航项
     extensions.admin.add_view(MonitoredSiteView(MonitoredSite, extensions.db.session, name="站点管理"))
-    extensions.admin.add_view(HealthCheckLogView(HealthCheckLog, extensions.db.session, name="监控日志"))
+    with app.app_context():
+        has_partitions = bool(log_store.list_partitions())
+    if app.config.get('LOG_PARTITIONING') or has_partitions:
+        # 分区模式下（或关闭分区后仍有分区表时）日志分散在多张表中，改用按游标翻页的只读列表
+        extensions.admin.add_view(PartitionedHealthCheckLogView(name="监控日志", endpoint='healthchecklog'))
+    else:
+        extensions.admin.add_view(HealthCheckLogView(HealthCheckLog, extensions.db.session, name="监控日志"))
     extensions.admin.add_view(MonitoringSettingsView(name="监控参数", category="系统设置", endpoint='monitor_config'))
     extensions.admin.add_view(
         NotificationChannelView(
@@ -75,40 +89,73 @@ def create_app(config_object='config'):
         )
     )
 
+    extensions.admin.add_view(ProfilesView(name="性能分析", category="系统设置", endpoint='profiles'))
+
     extensions.admin.add_link(MenuLink(name='查看面板', url='/', icon_type='fa', icon_value='fa-desktop'))
     extensions.admin.add_view(ThemeSettingsView(name="更换主题", category="用户操作", endpoint='themes'))
     extensions.admin.add_link(MenuLink(name='修改密码', url='/admin/change-password', category='用户操作', icon_type='fa', icon_value='fa-key'))
     extensions.admin.add_link(AuthenticatedMenuLink(name='安全退出', endpoint='admin.logout', category='用户操作', icon_type='fa', icon_value='fa-sign-out'))
 
-    # 6. 注册蓝图与自定义命令
     app.register_blueprint(main_bp)
+
+    # 其他工作进程或检查进程保存的监控参数：按版本号检查，变化时重新读取（见 app/config_sync.py）
+    @app.before_request
+    def _sync_monitoring_config():
+        sync_monitoring_config(app)
+
+
+def create_app(config_object='config', web=True):
+    # app.startup 同时是 python -m app.startup 的入口，不在包导入时加载
+    from .startup import StartupProfile, prepare_database
+
+    profile = StartupProfile()
+    profile.record('导入 app 包', _import_seconds)
+    with profile.phase('加载配置'):
+        app = Flask(__name__, instance_relative_config=True)
+        app.config.from_object(config_object)
+        try:
+            os.makedirs(app.instance_path)
+        except OSError:
+            pass
+
+    log_config.configure_logging(app.config)
+    metrics.configure(app.config)
+
+    # 2. 初始化插件
+    with profile.phase('初始化插件'):
+        extensions.db.init_app(app)
+        extensions.migrate.init_app(app, extensions.db)
+        # 必须在任何代码建立连接之前注册，连接池中的每个连接才都会设置 busy_timeout
+        with app.app_context():
+            extensions.configure_sqlite_connections(app)
+
+    # 3 ~ 5. 登录、后台管理与页面
+    if web:
+        with profile.phase('注册后台与页面'):
+            _register_web(app)
+
+    # 6. 注册自定义命令
     app.cli.add_command(init_db_command)
     app.cli.add_command(create_reset_token_command)
+    app.cli.add_command(cleanup_data_command)
+    app.cli.add_command(rebuild_segments_command)
+    app.cli.add_command(bench_group)
+    app.cli.add_command(monitor_group)
 
-    # 7. 确保数据库与动态配置就绪
+    # 7. 确保数据库与动态配置就绪（一次性初始化只在标记变化时执行，见 app/startup.py）
+    started = time.perf_counter()
     with app.app_context():
-        extensions.db.create_all()
-        monitoring_config = MonitoringConfig.ensure(app.config)
-        monitoring_config.apply_to_config(app.config)
-        NotificationChannel.bootstrap_from_config(app.config)
-    # 8. 配置和启动后台定时任务
-    if not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
-        if not extensions.scheduler.running:
-            extensions.scheduler.init_app(app)
-            extensions.scheduler.start()
-            extensions.scheduler.add_job(
-                id='check_health_job',
-                func=check_website_health,
-                trigger='interval',
-                seconds=app.config.get('MONITOR_INTERVAL_SECONDS', 60),
-                args=[app]
-            )
-            extensions.scheduler.add_job(
-                id='cleanup_data_job',
-                func=cleanup_old_data,
-                trigger='cron', hour=3,
-                args=[app]
-            )
-            print("后台监控任务已启动...")
+        bootstrapped = prepare_database(app)
+    profile.record('准备数据库（含一次性初始化）' if bootstrapped else '准备数据库', time.perf_counter() - started)
+    # 8. 配置和启动后台定时任务；使用独立检查进程时只读取其发布的状态快照
+    with profile.phase('启动后台任务'):
+        if app.config.get('MONITOR_EMBEDDED_CHECKER', True):
+            if not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+                start_background_jobs(app)
+        elif web:
+            status_snapshot.configure_shared(app.config['STATUS_TABLE_PATH'], app.config['STATUS_EVENTS_PATH'], reader=True)
 
+    app.extensions['startup_profile'] = profile
+    if app.config.get('STARTUP_PROFILE'):
+        logger.info(profile.report())
     return app
@@ -0,0 +1,131 @@
+# web-monitor/app/alert_state.py
+"""
+站点告警判定状态的检查点（site_alert_state 表，每个站点一行 JSON）。
+
+健康检查任务每轮结束后只写入状态有变化的站点：连续计数、失败 / 慢响应滑动窗口、通知已发送标记、
+故障 / 减速开始时间与各类告警的最近发送时间（降噪用）。变化判定忽略每次检查都会变化的字段
+（累计检查次数、上次检查时间、响应时间），连续计数达到最大确认阈值后按阈值比较，状态稳定的站点不产生写入。
+
+服务启动时用一次查询读回全部检查点，重启后不会重复发送宕机告警，也不会丢失尚未发送的恢复通知。
+"""
+import datetime
+import json
+from typing import Dict, Iterable, Optional
+
+import sqlalchemy as sa
+
+from .extensions import db
+from .models import SiteAlertState
+
+_state_table = SiteAlertState.__table__
+
+# 每次检查都会变化的字段，不触发写入（写入时仍保存最新值）
+VOLATILE_FIELDS = ('total_checks', 'last_checked', 'response_time_seconds')
+COUNTER_FIELDS = ('failure_count', 'success_count', 'slow_count')
+
+
+def counter_cap(config) -> int:
+    """告警判定用到的最大连续次数阈值，连续计数超过它之后的增长不影响告警，检查点不必写入。"""
+    recovery_consecutive = config.get('RECOVERY_CONFIRMATION_THRESHOLD', 2)
+    return max(
+        config.get('FAILURE_CONFIRMATION_THRESHOLD', 3),
+        recovery_consecutive,
+        config.get('SLOW_RESPONSE_CONFIRMATION_THRESHOLD', 3),
+        config.get('SLOW_RESPONSE_RECOVERY_THRESHOLD', recovery_consecutive),
+    )
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def change_key(state: dict, counter_cap: int) -> tuple:
+    """变化判定键：忽略易变字段，连续计数超过 counter_cap 后按 counter_cap 比较。"""
+    return tuple(
+        (field, min(value, counter_cap) if field in COUNTER_FIELDS and isinstance(value, int) else _freeze(value))
+        for field, value in sorted(state.items())
+        if field not in VOLATILE_FIELDS
+    )
+
+
+class AlertStateStore:
+    """记录已写入数据库的各站点变化判定键，据此只写入有变化的站点。"""
+
+    def __init__(self):
+        # 站点 -> 已写入的变化判定键；键为 None 表示行已存在但内容未知（下次必定更新）
+        self._saved: Dict[str, Optional[tuple]] = {}
+        self._stale = True
+
+    def load(self, counter_cap: int, connection=None) -> Dict[str, dict]:
+        """一次查询读回全部检查点。"""
+        executor = connection if connection is not None else db.session
+        rows = executor.execute(sa.select(_state_table.c.site_name, _state_table.c.state)).all()
+        states = {}
+        self._saved = {}
+        for site_name, raw_state in rows:
+            try:
+                state = json.loads(raw_state)
+            except ValueError:
+                self._saved[site_name] = None
+                continue
+            states[site_name] = state
+            self._saved[site_name] = change_key(state, counter_cap)
+        self._stale = False
+        return states
+
+    def invalidate(self):
+        """写入失败（事务已回滚）后调用，下次写入前重新确认数据库中已有哪些行。"""
+        self._stale = True
+
+    def _resync(self, executor):
+        existing = executor.execute(sa.select(_state_table.c.site_name)).scalars().all()
+        self._saved = {name: self._saved.get(name) for name in existing}
+        self._stale = False
+
+    def checkpoint(self, states: Dict[str, dict], counter_cap: int, removed: Iterable[str] = (),
+                   connection=None) -> Dict[str, tuple]:
+        """写入有变化的站点并删除已移除站点的检查点，返回待确认的 {站点: 变化判定键}；
+        调用方提交事务后调用 confirm()，失败回滚后调用 invalidate()。
+        """
+        executor = connection if connection is not None else db.session
+        if self._stale:
+            self._resync(executor)
+        now = datetime.datetime.utcnow()
+        updates = []
+        inserts = []
+        pending = {}
+        for site_name, state in states.items():
+            key = change_key(state, counter_cap)
+            if site_name in self._saved and self._saved[site_name] == key:
+                continue
+            raw_state = json.dumps(state, ensure_ascii=False, separators=(',', ':'))
+            if site_name in self._saved:
+                updates.append({'target_site': site_name, 'state': raw_state, 'updated_at': now})
+            else:
+                inserts.append({'site_name': site_name, 'state': raw_state, 'updated_at': now})
+            pending[site_name] = key
+        if updates:
+            executor.execute(
+                sa.update(_state_table)
+                .where(_state_table.c.site_name == sa.bindparam('target_site'))
+                .values(state=sa.bindparam('state'), updated_at=sa.bindparam('updated_at')),
+                updates,
+            )
+        if inserts:
+            executor.execute(sa.insert(_state_table), inserts)
+        removed = [name for name in removed if name in self._saved]
+        if removed:
+            executor.execute(sa.delete(_state_table).where(_state_table.c.site_name.in_(removed)))
+        return pending
+
+    def confirm(self, pending: Dict[str, tuple], removed: Iterable[str] = ()):
+        self._saved.update(pending)
+        for site_name in removed:
+            self._saved.pop(site_name, None)
+
+
+store = AlertStateStore()
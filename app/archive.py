@@ -0,0 +1,231 @@
+# web-monitor/app/archive.py
+"""
+过期检查日志的冷归档。
+
+清理任务删除原始日志前，先按 站点/月份 导出到 LOG_ARCHIVE_DIR/<站点>/<YYYY-MM>.wma：
+每个文件由若干数据块顺序追加组成，每块包含块头与三段 zlib 压缩的列数据：
+  - 时间戳：相对块内第一条记录的 int64 毫秒差值
+  - 状态：uint8（0 正常 / 1 访问过慢 / 2 无法访问 / 255 未知）
+  - 响应时间：float32，缺失值为 NaN
+读取时以 mmap 打开文件，按块头的时间范围跳过无关数据块，再用 numpy 做向量化统计。
+"""
+import datetime
+import mmap
+import os
+import struct
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote
+
+import numpy as np
+import sqlalchemy as sa
+from flask import current_app
+
+from .extensions import db
+
+ARCHIVE_SUFFIX = '.wma'
+CHUNK_MAGIC = b'WMA1'
+# magic, 行数, 首条时间(ms), 末条时间(ms), 三段压缩数据的长度
+CHUNK_HEADER = struct.Struct('<4sIqqIII')
+STATUS_CODES = {'正常': 0, '访问过慢': 1, '无法访问': 2}
+STATUS_UNKNOWN = 255
+EXPORT_FETCH_SIZE = 5000
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_MS = datetime.timedelta(milliseconds=1)
+
+
+def archive_dir() -> str:
+    return current_app.config.get('LOG_ARCHIVE_DIR') or os.path.join(current_app.instance_path, 'archive')
+
+
+def _to_ms(value: datetime.datetime) -> int:
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // _MS
+
+
+def _from_ms(value: int) -> datetime.datetime:
+    return _EPOCH + datetime.timedelta(milliseconds=int(value))
+
+
+def _archive_path(site_name: str, year: int, month: int) -> str:
+    return os.path.join(archive_dir(), quote(site_name, safe=''), f'{year:04d}-{month:02d}{ARCHIVE_SUFFIX}')
+
+
+def _iter_chunks(buffer):
+    """遍历文件中的完整数据块，返回 (行数, 首条时间, 末条时间, 各列起止偏移)。
+    末尾写入中断留下的残缺块会被忽略。
+    """
+    offset = 0
+    size = len(buffer)
+    while offset + CHUNK_HEADER.size <= size:
+        magic, rows, first_ms, last_ms, ts_len, status_len, rt_len = CHUNK_HEADER.unpack_from(buffer, offset)
+        payload_start = offset + CHUNK_HEADER.size
+        payload_end = payload_start + ts_len + status_len + rt_len
+        if magic != CHUNK_MAGIC or payload_end > size:
+            return
+        columns = (
+            (payload_start, payload_start + ts_len),
+            (payload_start + ts_len, payload_start + ts_len + status_len),
+            (payload_start + ts_len + status_len, payload_end),
+        )
+        yield rows, first_ms, last_ms, columns
+        offset = payload_end
+
+
+def _last_archived_ms(path: str) -> Optional[int]:
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    with open(path, 'rb') as f:
+        data = f.read()
+    last = None
+    for _, _, last_ms, _ in _iter_chunks(data):
+        last = last_ms if last is None else max(last, last_ms)
+    return last
+
+
+def _append_chunk(path: str, ts_ms: np.ndarray, status: np.ndarray, response_times: np.ndarray) -> None:
+    deltas = np.diff(ts_ms, prepend=ts_ms[0]).astype('<i8')
+    ts_blob = zlib.compress(deltas.tobytes(), 6)
+    status_blob = zlib.compress(status.astype(np.uint8).tobytes(), 6)
+    rt_blob = zlib.compress(response_times.astype('<f4').tobytes(), 6)
+    header = CHUNK_HEADER.pack(
+        CHUNK_MAGIC, len(ts_ms), int(ts_ms[0]), int(ts_ms[-1]), len(ts_blob), len(status_blob), len(rt_blob)
+    )
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'ab') as f:
+        f.write(header + ts_blob + status_blob + rt_blob)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def export_logs(table: sa.Table, cutoff: datetime.datetime, stats: Dict) -> int:
+    """把 table 中早于 cutoff 的日志追加到归档文件，返回新写入的行数。
+    按每个文件已归档的最后时间去重，重复执行（例如上次删除失败）不会产生重复数据。
+    """
+    rows = db.session.execute(
+        sa.select(table.c.site_name, table.c.timestamp, table.c.status, table.c.response_time_seconds)
+        .where(table.c.timestamp < cutoff)
+        .order_by(table.c.site_name, table.c.timestamp)
+        .execution_options(yield_per=EXPORT_FETCH_SIZE)
+    )
+    exported = 0
+    current_key = None
+    watermark = None
+    ts_buffer: List[int] = []
+    status_buffer: List[int] = []
+    rt_buffer: List[float] = []
+
+    def flush():
+        nonlocal exported
+        if not ts_buffer:
+            return
+        _append_chunk(
+            _archive_path(*current_key),
+            np.asarray(ts_buffer, dtype=np.int64),
+            np.asarray(status_buffer, dtype=np.uint8),
+            np.asarray(rt_buffer, dtype=np.float32),
+        )
+        exported += len(ts_buffer)
+        stats['archive_chunks'] = stats.get('archive_chunks', 0) + 1
+        ts_buffer.clear()
+        status_buffer.clear()
+        rt_buffer.clear()
+
+    for site_name, timestamp, status, response_time in rows:
+        key = (site_name, timestamp.year, timestamp.month)
+        if key != current_key:
+            flush()
+            current_key = key
+            watermark = _last_archived_ms(_archive_path(*key))
+        ts_ms = _to_ms(timestamp)
+        if watermark is not None and ts_ms <= watermark:
+            continue
+        ts_buffer.append(ts_ms)
+        status_buffer.append(STATUS_CODES.get(status, STATUS_UNKNOWN))
+        rt_buffer.append(np.nan if response_time is None else response_time)
+    flush()
+    stats['archived_total'] = stats.get('archived_total', 0) + exported
+    return exported
+
+
+def _months_between(start: datetime.datetime, end: datetime.datetime) -> Iterable[Tuple[int, int]]:
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def load_site(site_name: str, start: datetime.datetime, end: datetime.datetime):
+    """读取站点在 [start, end] 范围内的归档数据，返回 (时间戳 ms, 状态码, 响应时间) 三个 numpy 数组。"""
+    start_ms, end_ms = _to_ms(start), _to_ms(end)
+    parts_ts, parts_status, parts_rt = [], [], []
+    for year, month in _months_between(_from_ms(start_ms), _from_ms(end_ms)):
+        path = _archive_path(site_name, year, month)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            continue
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as view:
+                for rows, first_ms, last_ms, columns in _iter_chunks(view):
+                    if last_ms < start_ms or first_ms > end_ms:
+                        continue
+                    (ts_a, ts_b), (st_a, st_b), (rt_a, rt_b) = columns
+                    ts = first_ms + np.cumsum(np.frombuffer(zlib.decompress(view[ts_a:ts_b]), dtype='<i8'))
+                    status = np.frombuffer(zlib.decompress(view[st_a:st_b]), dtype=np.uint8)
+                    response_times = np.frombuffer(zlib.decompress(view[rt_a:rt_b]), dtype='<f4')
+                    mask = (ts >= start_ms) & (ts <= end_ms)
+                    parts_ts.append(ts[mask])
+                    parts_status.append(status[mask])
+                    parts_rt.append(response_times[mask])
+    if not parts_ts:
+        return np.empty(0, np.int64), np.empty(0, np.uint8), np.empty(0, np.float32)
+    ts = np.concatenate(parts_ts)
+    order = np.argsort(ts, kind='stable')
+    return ts[order], np.concatenate(parts_status)[order], np.concatenate(parts_rt)[order]
+
+
+def summarize(site_names: Iterable[str], start: datetime.datetime, end: datetime.datetime, bucket_seconds: int) -> Dict:
+    """按固定时间桶统计归档数据的可用率与响应时间。
+    返回 {站点: {'buckets': {...}, 'overall_stats': {...}}}，桶起点为 UTC 毫秒时间戳。
+    """
+    start_ms, end_ms = _to_ms(start), _to_ms(end)
+    bucket_ms = bucket_seconds * 1000
+    bucket_count = max(1, (end_ms - start_ms) // bucket_ms + 1)
+    results = {}
+    for site_name in site_names:
+        ts, status, response_times = load_site(site_name, start, end)
+        index = (ts - start_ms) // bucket_ms
+        total = np.bincount(index, minlength=bucket_count)
+        # 与聚合数据相同：正常与访问过慢计为可用，其余状态（含无法识别的状态）都计为不可用
+        up = np.bincount(index, weights=(status == STATUS_CODES['正常']), minlength=bucket_count)
+        slow = np.bincount(index, weights=(status == STATUS_CODES['访问过慢']), minlength=bucket_count)
+        available = up + slow
+        down = total - available
+        valid = ~np.isnan(response_times)
+        rt_sum = np.bincount(index[valid], weights=response_times[valid], minlength=bucket_count)
+        rt_count = np.bincount(index[valid], minlength=bucket_count)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            availability = np.where(total > 0, available / total * 100, np.nan)
+            avg_response = np.where(rt_count > 0, rt_sum / rt_count, np.nan)
+        present = np.flatnonzero(total)
+        valid_rt = response_times[valid].astype(np.float64)
+        total_checks = int(total.sum())
+        results[site_name] = {
+            'buckets': {
+                'start_ms': (start_ms + present * bucket_ms).tolist(),
+                'total': total[present].tolist(),
+                'slow': slow[present].astype(int).tolist(),
+                'down': down[present].astype(int).tolist(),
+                'availability': np.round(availability[present], 4).tolist(),
+                'avg_response_time': [None if np.isnan(v) else round(float(v), 4) for v in avg_response[present]],
+            },
+            'overall_stats': {
+                'total_checks': total_checks,
+                'availability': float(available.sum()) / total_checks * 100 if total_checks else None,
+                'avg_response_time': round(float(valid_rt.mean()), 4) if valid_rt.size else None,
+                'p95_response_time': round(float(np.percentile(valid_rt, 95)), 4) if valid_rt.size else None,
+                'p99_response_time': round(float(np.percentile(valid_rt, 99)), 4) if valid_rt.size else None,
+            },
+        }
+    return results
@@ -0,0 +1,385 @@
+# web-monitor/app/benchmarks.py
+"""
+性能基准：在合成数据上对比不同实现的耗时，并校验结果一致。
+由 `flask bench ...` 命令调用，不依赖数据库中的真实数据。
+"""
+import datetime
+import json
+import random
+import time
+from collections import namedtuple
+from datetime import timezone
+
+import sqlalchemy as sa
+
+from . import history_format, history_stats, log_store, sketches, timeline_sql
+from .history_cache import HISTORY_LOG_COLUMNS
+from .extensions import db
+from .utils import to_gmt8
+
+class BenchLog(namedtuple(
+    'BenchLog', ['site_name', 'timestamp', 'status', 'response_time_seconds', 'http_status_code', 'error_detail']
+)):
+    __slots__ = ()
+
+    @property
+    def _mapping(self):
+        # 与 SQLAlchemy Row 一致，供 incidents.incident_reason 等按列名读取
+        return self._asdict()
+
+
+def synthetic_logs(rows, interval_seconds=20, seed=1, site_name='bench'):
+    """生成按时间升序排列的检查日志：大部分正常，夹杂慢响应、宕机以及少量监控中断。"""
+    rng = random.Random(seed)
+    start = datetime.datetime.utcnow() - datetime.timedelta(seconds=interval_seconds * rows * 1.02)
+    timestamp = start
+    status = '正常'
+    logs = []
+    for _ in range(rows):
+        timestamp += datetime.timedelta(seconds=interval_seconds + rng.random())
+        if rng.random() < 0.001:
+            timestamp += datetime.timedelta(seconds=interval_seconds * 5)
+        if rng.random() < 0.01:
+            status = rng.choice(['正常', '正常', '访问过慢', '无法访问'])
+        if status == '无法访问':
+            logs.append(BenchLog(site_name, timestamp, status, None, rng.choice([503, None]), rng.choice(['连接超时', None])))
+        else:
+            response_time = round(rng.uniform(3, 6) if status == '访问过慢' else rng.uniform(0.05, 1.5), 2)
+            logs.append(BenchLog(site_name, timestamp, status, response_time, 200, None))
+    return logs
+
+
+def legacy_history_stats(logs, now_utc, monitor_interval):
+    """逐条循环的原始实现（向量化之前的 get_history 统计部分），仅用于基准对比。
+    now_utc 由调用方固定传入，保证两种实现的 SLA 区间一致。
+    """
+    up_count = sum(1 for log in logs if log.status in ['正常', '访问过慢'])
+    availability = (up_count / len(logs) * 100) if logs else 0
+    valid_times = [log.response_time_seconds for log in logs if log.response_time_seconds is not None]
+    avg_response_time = sum(valid_times) / len(valid_times) if valid_times else 0
+    p95_response_time = p99_response_time = 0
+    if valid_times:
+        sorted_times = sorted(valid_times)
+        p95_response_time = sorted_times[min(int(len(sorted_times) * 0.95), len(sorted_times) - 1)]
+        p99_response_time = sorted_times[min(int(len(sorted_times) * 0.99), len(sorted_times) - 1)]
+
+    response_points = []
+    for log in logs:
+        gmt8_timestamp = to_gmt8(log.timestamp)
+        response_points.append((
+            gmt8_timestamp.strftime('%Y-%m-%d %H:%M'),
+            int(gmt8_timestamp.timestamp() * 1000),
+            log.response_time_seconds,
+        ))
+
+    sla = []
+    for period_start in (
+        datetime.datetime.combine(now_utc.date(), datetime.time.min, tzinfo=timezone.utc),
+        now_utc - datetime.timedelta(days=7),
+        now_utc - datetime.timedelta(days=30),
+    ):
+        period_logs = [log for log in logs if period_start <= log.timestamp.replace(tzinfo=timezone.utc) <= now_utc]
+        if not period_logs:
+            sla.append(availability)
+            continue
+        sla.append(sum(1 for log in period_logs if log.status in ['正常', '访问过慢']) / len(period_logs) * 100)
+
+    def simple(log):
+        return 'down' if log.status == '无法访问' else 'slow' if log.status == '访问过慢' else 'up'
+
+    segments = []
+    i = 0
+    while i < len(logs):
+        current_status = simple(logs[i])
+        j = i
+        while j < len(logs) and simple(logs[j]) == current_status:
+            if j > i and (logs[j].timestamp - logs[j - 1].timestamp) > monitor_interval * 1.5:
+                break
+            j += 1
+        segment_logs = logs[i:j]
+        valid_logs = [l for l in segment_logs if l.response_time_seconds is not None]
+        avg = sum(l.response_time_seconds for l in valid_logs) / len(valid_logs) if valid_logs else None
+        segments.append((i, j, current_status, avg))
+        i = j
+    return {
+        'overall': (availability, avg_response_time, p95_response_time, p99_response_time),
+        'sla': sla,
+        'points': len(response_points),
+        'segments': segments,
+    }
+
+
+def vectorized_history_stats(logs, now_utc, monitor_interval):
+    """numpy 向量化实现（与 get_history 使用的 history_stats 模块相同）。"""
+    arrays = history_stats.log_arrays(logs)
+    overall = history_stats.overall_stats(arrays)
+    labels, timestamps_ms = history_stats.response_points(arrays)
+    now_us = history_stats.to_epoch_us(now_utc)
+    sla = [
+        history_stats.period_availability(arrays, history_stats.to_epoch_us(period_start), now_us, overall[0])
+        for period_start in (
+            datetime.datetime.combine(now_utc.date(), datetime.time.min, tzinfo=timezone.utc),
+            now_utc - datetime.timedelta(days=7),
+            now_utc - datetime.timedelta(days=30),
+        )
+    ]
+    gap_us = int(monitor_interval.total_seconds() * 1.5 * 1_000_000)
+    starts, ends = history_stats.timeline_segments(arrays, gap_us)
+    averages = history_stats.segment_response_means(arrays, starts, ends)
+    segments = [
+        (start, end, history_stats.SIMPLE_STATUS_KEYS[int(arrays.status[start])], None if avg != avg else avg)
+        for start, end, avg in zip(starts.tolist(), ends.tolist(), averages.tolist())
+    ]
+    return {'overall': overall, 'sla': sla, 'points': len(labels), 'segments': segments}
+
+
+def _close(a, b):
+    if a is None or b is None:
+        return a is b
+    return abs(a - b) <= 1e-9 * max(1.0, abs(a), abs(b))
+
+
+def compare_history_stats(expected, actual):
+    """返回两种实现结果不一致的字段列表。"""
+    problems = []
+    if not all(_close(a, b) for a, b in zip(expected['overall'], actual['overall'])):
+        problems.append(f"overall: {expected['overall']} != {actual['overall']}")
+    if not all(_close(a, b) for a, b in zip(expected['sla'], actual['sla'])):
+        problems.append(f"sla: {expected['sla']} != {actual['sla']}")
+    if expected['points'] != actual['points']:
+        problems.append('response points')
+    if len(expected['segments']) != len(actual['segments']) or not all(
+        a[:3] == b[:3] and _close(a[3], b[3]) for a, b in zip(expected['segments'], actual['segments'])
+    ):
+        problems.append('timeline segments')
+    return problems
+
+
+def timed(func, *args, repeat=1):
+    """返回 (最短耗时秒数, 最后一次的结果)。"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def compare_timeline_sources(site_names, start, end, monitor_interval):
+    """在真实日志上分别用逐条日志（Python）与窗口函数（SQL）计算时间线，返回各站点的耗时与差异。"""
+    # routes 依赖蓝图等 Web 层对象，只在执行基准时导入
+    from .routes import _build_timeline_from_logs, _build_timeline_from_runs
+
+    end_time_utc = end.replace(tzinfo=timezone.utc)
+
+    def python_path():
+        source = log_store.log_source(start, end, site_names)
+        rows = db.session.execute(
+            sa.select(*[source.c[name] for name in HISTORY_LOG_COLUMNS]).where(
+                source.c.site_name.in_(site_names),
+                source.c.timestamp.between(start, end),
+            ).order_by(source.c.site_name, source.c.timestamp)
+        ).all()
+        by_site = {}
+        for row in rows:
+            by_site.setdefault(row.site_name, []).append(row)
+        return {
+            site: history_format.timeline_rows(
+                _build_timeline_from_logs(logs, history_stats.log_arrays(logs), end_time_utc, monitor_interval)
+            )
+            for site, logs in by_site.items()
+        }, len(rows)
+
+    def sql_path():
+        runs = timeline_sql.timeline_runs(site_names, start, end, monitor_interval.total_seconds())
+        return {
+            site: history_format.timeline_rows(_build_timeline_from_runs(site_runs, end_time_utc))
+            for site, site_runs in runs.items()
+        }
+
+    python_seconds, (expected, row_count) = timed(python_path)
+    sql_seconds, actual = timed(sql_path)
+    mismatches = {}
+    for site in sorted(set(expected) | set(actual)):
+        left, right = expected.get(site, []), actual.get(site, [])
+        if left != right:
+            first = next((i for i, (a, b) in enumerate(zip(left, right)) if a != b), min(len(left), len(right)))
+            mismatches[site] = (len(left), len(right), first)
+    return {
+        'rows': row_count,
+        'segments': sum(len(items) for items in actual.values()),
+        'python_seconds': python_seconds,
+        'sql_seconds': sql_seconds,
+        'mismatches': mismatches,
+    }
+
+
+PERCENTILE_DISTRIBUTIONS = ('lognormal', 'bimodal', 'uniform', 'spiky')
+
+
+def _synthetic_latencies(distribution, rows, rng):
+    if distribution == 'lognormal':
+        return [rng.lognormvariate(-1.0, 0.8) for _ in range(rows)]
+    if distribution == 'bimodal':
+        return [rng.gauss(0.2, 0.03) if rng.random() < 0.9 else rng.gauss(4.0, 0.5) for _ in range(rows)]
+    if distribution == 'uniform':
+        return [rng.uniform(0.01, 10.0) for _ in range(rows)]
+    return [rng.uniform(0.05, 0.3) if rng.random() < 0.995 else rng.uniform(20, 60) for _ in range(rows)]
+
+
+def check_sketch_accuracy(rows, bucket_size=3, quantiles=(0.5, 0.9, 0.95, 0.99, 0.999), seed=1):
+    """把合成响应时间按 bucket_size 条一组建草图、序列化后再合并，与精确分位数对比。
+    返回 {分布: {'max_relative_error': ..., 'sketch_bytes': ..., 'raw_bytes': ..., 'merge_seconds': ...}}。
+    """
+    rng = random.Random(seed)
+    results = {}
+    for distribution in PERCENTILE_DISTRIBUTIONS:
+        values = [max(value, 0.0) for value in _synthetic_latencies(distribution, rows, rng)]
+        blobs = []
+        for offset in range(0, len(values), bucket_size):
+            sketch = sketches.LatencySketch()
+            sketch.add_many(values[offset:offset + bucket_size])
+            blobs.append(sketch.to_bytes())
+        merge_seconds, merged = timed(sketches.merge_blobs, blobs)
+        ordered = sorted(values)
+        worst = 0.0
+        for q in quantiles:
+            exact = ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+            estimate = merged.quantile(q)
+            if exact >= sketches.MIN_VALUE:
+                worst = max(worst, abs(estimate - exact) / exact)
+        results[distribution] = {
+            'count': merged.count,
+            'max_relative_error': worst,
+            'sketch_bytes': sum(len(blob) for blob in blobs),
+            'merged_bytes': len(merged.to_bytes()),
+            'raw_bytes': len(values) * 8,
+            'merge_seconds': merge_seconds,
+        }
+    return results
+
+
+def _stdlib_dumps(payload):
+    # 与 Flask 默认 JSON provider（jsonify）的输出一致
+    return json.dumps(payload, ensure_ascii=True, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def compare_payload_formats(rows, interval_seconds=20, max_points=0, repeat=3):
+    """用合成日志构建一个站点的 /api/history 结果，对比 rows / compact 两种格式在不同序列化器下的
+    构建与编码耗时、响应体大小及压缩后大小。返回每种组合一项的列表。
+    """
+    from .routes import _build_site_history
+
+    logs = synthetic_logs(rows, interval_seconds=interval_seconds)
+    arrays = history_stats.log_arrays(logs)
+    start = logs[0].timestamp.replace(tzinfo=timezone.utc)
+    end = logs[-1].timestamp.replace(tzinfo=timezone.utc)
+    monitor_interval = datetime.timedelta(seconds=interval_seconds)
+    encoders = [('json', _stdlib_dumps)]
+    if history_format.orjson is not None:
+        encoders.append(('orjson', history_format.orjson.dumps))
+
+    results = []
+    for fmt in history_format.FORMATS:
+        build_seconds, site_result = timed(
+            lambda: _build_site_history(
+                'bench', logs, start, end, monitor_interval, 'logs',
+                max_points=max_points, arrays=arrays, labels=fmt == 'rows',
+            ),
+            repeat=repeat,
+        )
+        for encoder_name, dumps in encoders:
+            encode_seconds, body = timed(lambda: dumps(history_format.encode({'bench': site_result}, fmt)), repeat=repeat)
+            results.append({
+                'format': fmt,
+                'encoder': encoder_name,
+                'build_seconds': build_seconds,
+                'encode_seconds': encode_seconds,
+                'bytes': len(body),
+                'gzip_bytes': len(history_format.compress(body, 'gzip')),
+                'br_bytes': len(history_format.compress(body, 'br')) if history_format.brotli is not None else None,
+            })
+    return results
+
+
+def _synthetic_alert_state(index, rng, window_size=5):
+    down = rng.random() < 0.05
+    return {
+        'status': '无法访问' if down else '正常',
+        'last_checked': '2024-01-01 00:00:00',
+        'response_time_seconds': None if down else round(rng.uniform(0.05, 1.5), 3),
+        'total_checks': rng.randint(1, 100_000),
+        'failure_count': rng.randint(10, 50) if down else 0,
+        'success_count': 0 if down else rng.randint(10, 5000),
+        'slow_count': 0,
+        'history': [1 if down else 0] * window_size,
+        'slow_history': [0] * window_size,
+        'notification_sent': down,
+        'slow_notification_sent': False,
+        'down_since': '2024-01-01 00:00:00' if down else None,
+        'slow_since': None,
+        'last_notifications': {f'down:{index}': 1704067200.0} if down else {},
+    }
+
+
+def compare_alert_state_restore(site_count, counter_cap=3, change_ratio=0.01, seed=1):
+    """在临时 SQLite 数据库中测试告警状态检查点：首次写入、无变化与少量变化时的写入量与耗时，
+    以及启动时一次查询读回与逐站点查询的耗时。"""
+    import os
+    import tempfile
+
+    from .alert_state import AlertStateStore, _state_table, change_key
+
+    rng = random.Random(seed)
+    states = {f'site-{index:05d}': _synthetic_alert_state(index, rng) for index in range(site_count)}
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    engine = sa.create_engine(f'sqlite:///{path}')
+    try:
+        _state_table.create(engine)
+        store = AlertStateStore()
+        results = {}
+
+        def checkpoint_round(label):
+            with engine.begin() as connection:
+                seconds, pending = timed(store.checkpoint, states, counter_cap, (), connection)
+            store.confirm(pending)
+            results[label] = {'seconds': seconds, 'writes': len(pending)}
+
+        checkpoint_round('initial')
+        for state in states.values():
+            # 每轮都会变化的字段与超过阈值的连续计数不触发写入
+            state['total_checks'] += 1
+            state['last_checked'] = '2024-01-01 00:01:00'
+            state['success_count' if state['status'] == '正常' else 'failure_count'] += 1
+        checkpoint_round('steady')
+        for site_name in rng.sample(sorted(states), max(1, int(site_count * change_ratio))):
+            state = states[site_name]
+            state['history'] = state['history'][1:] + [1]
+            state['failure_count'] = 1
+        checkpoint_round('changed')
+
+        with engine.connect() as connection:
+            results['load_seconds'], loaded = timed(AlertStateStore().load, counter_cap, connection)
+
+            def per_site():
+                return {
+                    site_name: connection.execute(
+                        sa.select(_state_table.c.state).where(_state_table.c.site_name == site_name)
+                    ).scalar_one()
+                    for site_name in states
+                }
+
+            results['per_site_seconds'], _ = timed(per_site)
+        results['restored'] = len(loaded)
+        # 未写入的站点只有易变字段与超过阈值的计数落后，按变化判定键比较
+        results['matches'] = {name: change_key(state, counter_cap) for name, state in loaded.items()} == {
+            name: change_key(state, counter_cap) for name, state in states.items()
+        }
+        results['table_bytes'] = os.path.getsize(path)
+        return results
+    finally:
+        engine.dispose()
+        os.remove(path)
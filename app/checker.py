@@ -0,0 +1,120 @@
+# web-monitor/app/checker.py
+"""
+后台任务的启动入口与独立检查进程。
+
+默认（MONITOR_EMBEDDED_CHECKER=true）由 create_app 在 Web 进程内启动健康检查、数据聚合与清理任务。
+多进程部署时设为 false：Web 进程不再启动任务，也不持有站点状态，只读取 STATUS_TABLE_PATH 共享状态表；
+检查、状态维护、告警通知与数据维护全部由单独运行的检查进程负责：
+
+    flask monitor run
+    python -m app.checker
+
+后台修改的监控参数只写入数据库，检查进程每 MONITORING_CONFIG_SYNC_SECONDS 秒检查一次参数版本（见 app/config_sync.py），
+变化时重新读取并按新的间隔重新调度检查任务。
+"""
+import logging
+import signal
+import sys
+import threading
+
+from . import config_sync
+from .extensions import db, scheduler
+from .services import check_website_health, cleanup_old_data, initialize_site_statuses, rollup_health_logs
+from . import status_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+def start_background_jobs(app) -> bool:
+    """从数据库预热站点状态，并启动健康检查、数据聚合与清理定时任务（每个进程只启动一次）。"""
+    if scheduler.running:
+        return False
+    initialize_site_statuses(app)
+    scheduler.init_app(app)
+    scheduler.start()
+    scheduler.add_job(
+        id='check_health_job',
+        func=check_website_health,
+        trigger='interval',
+        seconds=app.config.get('MONITOR_INTERVAL_SECONDS', 60),
+        args=[app]
+    )
+    scheduler.add_job(
+        id='rollup_data_job',
+        func=rollup_health_logs,
+        trigger='interval',
+        seconds=app.config.get('ROLLUP_INTERVAL_SECONDS', 300),
+        args=[app]
+    )
+    scheduler.add_job(
+        id='cleanup_data_job',
+        func=cleanup_old_data,
+        trigger='cron', hour=3,
+        args=[app]
+    )
+    logger.info("后台监控任务已启动...")
+    return True
+
+
+def sync_monitoring_config(app, force: bool = False) -> bool:
+    """参数版本变化时重新读取后台保存的监控参数（需在应用上下文中调用），检查间隔变化时重新调度检查任务。"""
+    previous_interval = app.config.get('MONITOR_INTERVAL_SECONDS')
+    if not config_sync.sync(app, force=force):
+        return False
+    interval = app.config.get('MONITOR_INTERVAL_SECONDS')
+    if interval != previous_interval:
+        job = scheduler.get_job('check_health_job')
+        if job:
+            job.reschedule(trigger='interval', seconds=interval)
+            logger.info("检查间隔已更新为 %s 秒。", interval)
+    return True
+
+
+def _sync_monitoring_config_job(app):
+    with app.app_context():
+        try:
+            sync_monitoring_config(app, force=True)
+        finally:
+            db.session.remove()
+
+
+def run(app):
+    """在当前进程中运行全部后台任务并把状态快照写入共享文件，直到收到 SIGINT / SIGTERM。"""
+    if app.config.get('MONITOR_EMBEDDED_CHECKER', True):
+        raise RuntimeError(
+            "MONITOR_EMBEDDED_CHECKER 仍为开启状态，Web 进程也会执行检查与告警；"
+            "请为 Web 进程与检查进程都设置 MONITOR_EMBEDDED_CHECKER=false 后再启动。"
+        )
+    table_path = app.config['STATUS_TABLE_PATH']
+    status_snapshot.configure_shared(table_path, app.config['STATUS_EVENTS_PATH'], reader=False)
+    start_background_jobs(app)
+    scheduler.add_job(
+        id='sync_config_job',
+        func=_sync_monitoring_config_job,
+        trigger='interval',
+        seconds=app.config.get('MONITORING_CONFIG_SYNC_SECONDS', 5),
+        args=[app]
+    )
+
+    stop_event = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop_event.set())
+    logger.info("独立检查进程已启动，共享状态表: %s", table_path)
+    stop_event.wait()
+    logger.info("正在停止检查进程（等待进行中的任务结束）...")
+    scheduler.shutdown()
+
+
+def main():
+    from . import create_app
+
+    try:
+        # 检查进程不提供页面，跳过后台管理与页面蓝图的注册
+        run(create_app(web=False))
+    except RuntimeError as e:
+        logger.error("%s", e)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
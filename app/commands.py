@@ -7,9 +7,17 @@ from flask import current_app
 from flask.cli import with_appcontext
 from werkzeug.security import generate_password_hash
 
+from . import alert_state, benchmarks, checker
 from .extensions import db
+from .incidents import rebuild_incidents
 from .models import MonitoringConfig, MonitoredSite, NotificationChannel, PasswordResetToken, User
-from .services import check_website_health  # 【新增】导入健康检查函数
+from .segments import rebuild_segments
+from .services import (
+    check_website_health,
+    cleanup_old_data,
+    enable_incremental_vacuum as enable_incremental_vacuum_mode,
+    last_cleanup_stats,
+)
 
 
 @click.command('init-db')
@@ -129,3 +137,198 @@ def create_reset_token_command(username, expires_in):
     click.echo('请妥善保管并在忘记密码页面输入以下令牌：')
     click.echo(raw_token)
     click.echo('=' * 60)
+
+
+@click.command('cleanup-data')
+@click.option('--enable-incremental-vacuum', is_flag=True, help='先将 SQLite 切换为增量 VACUUM 模式（会执行一次完整 VACUUM）')
+@with_appcontext
+def cleanup_data_command(enable_incremental_vacuum):
+    """立即执行一次数据清理（分批删除过期数据并回收空间），并输出统计信息。"""
+    if enable_incremental_vacuum:
+        click.echo('正在切换为增量 VACUUM 模式，数据库较大时可能需要较长时间...')
+        if enable_incremental_vacuum_mode():
+            click.echo('已开启 auto_vacuum=INCREMENTAL。')
+        else:
+            click.echo('当前数据库不是 SQLite，跳过。')
+    cleanup_old_data()
+    click.echo('=' * 60)
+    click.echo(f"状态: {last_cleanup_stats.get('status', '-')}")
+    for table_name, table_stats in (last_cleanup_stats.get('tables') or {}).items():
+        click.echo(
+            f"  - {table_name}: 删除 {table_stats['deleted']} 条，{table_stats['batches']} 批，"
+            f"耗时 {table_stats['duration_seconds']} 秒"
+        )
+    if 'archived_total' in last_cleanup_stats:
+        click.echo(f"归档日志: {last_cleanup_stats['archived_total']} 条")
+    click.echo(f"回收空闲页: {last_cleanup_stats.get('vacuumed_pages', 0)}")
+    click.echo(f"总耗时: {last_cleanup_stats.get('duration_seconds', 0)} 秒")
+    click.echo('=' * 60)
+
+
+@click.command('rebuild-segments')
+@click.option('--site', 'sites', multiple=True, help='只重建指定站点（可重复），默认重建全部站点')
+@with_appcontext
+def rebuild_segments_command(sites):
+    """根据现有检查日志重建状态区间表与事件表（首次启用或数据修复时执行）。"""
+    interval = current_app.config.get('MONITOR_INTERVAL_SECONDS', 60)
+    site_names = list(sites) or None
+    try:
+        total = rebuild_segments(interval, site_names)
+        incident_total = rebuild_incidents(site_names)
+    except Exception as exc:
+        db.session.rollback()
+        raise click.ClickException(f'重建状态区间失败: {exc}')
+    click.echo(f'已重建 {total} 个状态区间、{incident_total} 个事件（历史事件的告警发送状态无法还原）。')
+
+
+@click.group('monitor')
+def monitor_group():
+    """独立检查进程。"""
+
+
+@monitor_group.command('run')
+@with_appcontext
+def monitor_run_command():
+    """运行独立检查进程：负责健康检查、站点状态、告警通知与数据维护，Web 进程只读取其发布的状态快照。"""
+    try:
+        checker.run(current_app._get_current_object())
+    except RuntimeError as exc:
+        raise click.ClickException(str(exc))
+
+
+@click.group('bench')
+def bench_group():
+    """性能基准测试（使用合成数据，不读写数据库）。"""
+
+
+@bench_group.command('history-stats')
+@click.option('--rows', default=1_000_000, show_default=True, help='合成日志条数')
+@click.option('--interval', default=20, show_default=True, help='合成日志的检查间隔（秒）')
+@click.option('--repeat', default=3, show_default=True, help='重复次数，取最短耗时')
+@with_appcontext
+def bench_history_stats_command(rows, interval, repeat):
+    """对比 /api/history 统计部分的逐条循环实现与 numpy 向量化实现。"""
+    if rows <= 0:
+        raise click.BadParameter('rows 必须大于 0', param='rows')
+    click.echo(f'正在生成 {rows} 条合成日志...')
+    logs = benchmarks.synthetic_logs(rows, interval_seconds=interval)
+    now_utc = datetime.datetime.now(datetime.timezone.utc)
+    monitor_interval = datetime.timedelta(seconds=interval)
+
+    legacy_seconds, expected = benchmarks.timed(
+        benchmarks.legacy_history_stats, logs, now_utc, monitor_interval, repeat=repeat
+    )
+    vector_seconds, actual = benchmarks.timed(
+        benchmarks.vectorized_history_stats, logs, now_utc, monitor_interval, repeat=repeat
+    )
+    convert_seconds, _ = benchmarks.timed(benchmarks.history_stats.log_arrays, logs, repeat=repeat)
+
+    problems = benchmarks.compare_history_stats(expected, actual)
+    click.echo('=' * 60)
+    click.echo(f'逐条循环实现: {legacy_seconds:.3f} 秒')
+    click.echo(f'向量化实现:   {vector_seconds:.3f} 秒（其中转换为数组 {convert_seconds:.3f} 秒）')
+    click.echo(f'加速比: {legacy_seconds / vector_seconds:.1f}x（不含数组转换 '
+               f'{legacy_seconds / max(vector_seconds - convert_seconds, 1e-9):.1f}x）')
+    click.echo(f"时间线分段: {len(actual['segments'])} 段")
+    click.echo('=' * 60)
+    if problems:
+        raise click.ClickException('两种实现的结果不一致: ' + '; '.join(problems))
+    click.echo('两种实现的结果一致。')
+
+
+@bench_group.command('timeline-sql')
+@click.option('--days', default=7, show_default=True, help='统计最近多少天的日志')
+@click.option('--site', 'sites', multiple=True, help='只检查指定站点（可重复），默认全部站点')
+@with_appcontext
+def bench_timeline_sql_command(days, sites):
+    """用数据库中的真实日志交叉校验时间线的 Python 计算与 SQL 窗口函数计算，并对比耗时。"""
+    if not benchmarks.timeline_sql.supported():
+        raise click.ClickException('当前数据库不支持窗口函数（需要 SQLite >= 3.25 或 PostgreSQL）。')
+    site_names = list(sites) or [site.name for site in MonitoredSite.query.order_by(MonitoredSite.id).all()]
+    end = datetime.datetime.utcnow()
+    start = end - datetime.timedelta(days=days)
+    interval = datetime.timedelta(seconds=current_app.config.get('MONITOR_INTERVAL_SECONDS', 60))
+    result = benchmarks.compare_timeline_sources(site_names, start, end, interval)
+    click.echo('=' * 60)
+    click.echo(f"日志: {result['rows']} 条，时间线分段: {result['segments']} 段")
+    click.echo(f"逐条日志（Python）: {result['python_seconds']:.3f} 秒")
+    click.echo(f"窗口函数（SQL）:    {result['sql_seconds']:.3f} 秒")
+    click.echo('=' * 60)
+    if result['mismatches']:
+        for site_name, (expected, actual, first) in result['mismatches'].items():
+            click.echo(f'  - {site_name}: Python {expected} 段 / SQL {actual} 段，第 {first} 段起不一致')
+        raise click.ClickException('两种计算方式的时间线不一致。')
+    click.echo('两种计算方式的时间线一致。')
+
+
+@bench_group.command('percentiles')
+@click.option('--rows', default=300_000, show_default=True, help='每种分布的合成响应时间条数')
+@click.option('--bucket-size', default=3, show_default=True, help='每个草图包含的条数（模拟每分钟的检查次数）')
+@with_appcontext
+def bench_percentiles_command(rows, bucket_size):
+    """校验分位数草图合并后的 P50~P99.9 与精确结果的相对误差不超过设计上限。"""
+    if rows <= 0 or bucket_size <= 0:
+        raise click.BadParameter('rows 与 bucket-size 必须大于 0')
+    results = benchmarks.check_sketch_accuracy(rows, bucket_size)
+    bound = benchmarks.sketches.RELATIVE_ACCURACY
+    click.echo('=' * 60)
+    failed = []
+    for distribution, result in results.items():
+        click.echo(
+            f"{distribution:>9}: 最大相对误差 {result['max_relative_error']:.4%}，"
+            f"{len(range(0, rows, bucket_size))} 个草图共 {result['sketch_bytes'] / 1024:.0f} KB"
+            f"（原始 {result['raw_bytes'] / 1024:.0f} KB，合并后 {result['merged_bytes']} 字节），"
+            f"合并耗时 {result['merge_seconds']:.3f} 秒"
+        )
+        # 浮点取整可能让恰好落在桶边界的值多出极小的误差
+        if result['max_relative_error'] > bound + 1e-9:
+            failed.append(distribution)
+    click.echo('=' * 60)
+    if failed:
+        raise click.ClickException(f"相对误差超过 {bound:.0%}: {', '.join(failed)}")
+    click.echo(f'所有分布的分位数误差均在 {bound:.0%} 以内。')
+
+
+@bench_group.command('history-payload')
+@click.option('--rows', default=100_000, show_default=True, help='合成日志条数')
+@click.option('--interval', default=20, show_default=True, help='合成日志的检查间隔（秒）')
+@click.option('--max-points', default=0, show_default=True, help='响应时间曲线点数上限，0 表示全部原始点')
+@click.option('--repeat', default=3, show_default=True, help='重复次数，取最短耗时')
+@with_appcontext
+def bench_history_payload_command(rows, interval, max_points, repeat):
+    """对比 /api/history 行式（rows）与列式（compact）响应在不同 JSON 序列化器下的耗时与体积。"""
+    if rows <= 0:
+        raise click.BadParameter('rows 必须大于 0', param='rows')
+    click.echo(f'正在生成 {rows} 条合成日志...')
+    results = benchmarks.compare_payload_formats(rows, interval, max_points, repeat)
+    if benchmarks.history_format.orjson is None:
+        click.echo('未安装 orjson，只测试标准库 json。')
+    click.echo('=' * 60)
+    for result in results:
+        br_text = f"，br {result['br_bytes'] / 1024:.0f} KB" if result['br_bytes'] is not None else ''
+        click.echo(
+            f"{result['format']:>7} + {result['encoder']:<6}: 构建 {result['build_seconds']:.3f} 秒，"
+            f"编码 {result['encode_seconds']:.3f} 秒，"
+            f"{result['bytes'] / 1024:.0f} KB（gzip {result['gzip_bytes'] / 1024:.0f} KB{br_text}）"
+        )
+    click.echo('=' * 60)
+
+
+@bench_group.command('alert-state')
+@click.option('--sites', default=10_000, show_default=True, help='合成站点数')
+@with_appcontext
+def bench_alert_state_command(sites):
+    """测试告警状态检查点的增量写入量与启动时一次查询恢复的耗时（使用临时数据库）。"""
+    if sites <= 0:
+        raise click.BadParameter('sites 必须大于 0', param='sites')
+    result = benchmarks.compare_alert_state_restore(sites, counter_cap=alert_state.counter_cap(current_app.config))
+    click.echo('=' * 60)
+    for label, title in (('initial', '首次写入'), ('steady', '状态无变化'), ('changed', '1% 站点变化')):
+        click.echo(f"{title}: 写入 {result[label]['writes']} 个站点，耗时 {result[label]['seconds']:.3f} 秒")
+    click.echo(f"启动恢复（一次查询）: {result['load_seconds']:.3f} 秒，恢复 {result['restored']} 个站点")
+    click.echo(f"逐站点查询:           {result['per_site_seconds']:.3f} 秒")
+    click.echo(f"检查点表大小: {result['table_bytes'] / 1024:.0f} KB")
+    click.echo('=' * 60)
+    if not result['matches']:
+        raise click.ClickException('读回的告警状态与写入的不一致。')
+    click.echo('读回的告警状态与写入的一致。')
@@ -0,0 +1,69 @@
+# web-monitor/app/config_sync.py
+"""
+后台“监控参数”在多个进程之间的同步。
+
+参数保存在 monitoring_config 表中，每个进程（各 Web 工作进程与检查进程）在 app.config 中各有一份副本。
+保存时 updated_at 随之更新，用作版本号：每个进程记录已应用的版本，最多每 MONITORING_CONFIG_SYNC_SECONDS
+秒查询一次版本号（单行单列），变化时才重新读取整行并应用。Web 进程在请求开始时检查，检查进程由定时任务检查。
+"""
+import threading
+import time
+
+import sqlalchemy as sa
+
+from .extensions import db
+from .models import MonitoringConfig
+
+EXTENSION_KEY = 'monitoring_config_sync'
+
+
+class ConfigSyncState:
+    """单个应用已应用的参数版本与上次检查时间。"""
+
+    def __init__(self, version=None):
+        self.version = version
+        self.checked_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def due(self, interval: float) -> bool:
+        """距上次检查超过 interval 秒时返回 True 并记为已检查（并发请求中只有一个执行检查）。"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self.checked_at < interval:
+                return False
+            self.checked_at = now
+            return True
+
+
+def mark_applied(app, config_record):
+    """记录本进程已直接应用的参数版本（启动时与后台保存后调用），避免随后重复读取。"""
+    state = app.extensions.get(EXTENSION_KEY)
+    if state is None:
+        app.extensions[EXTENSION_KEY] = ConfigSyncState(config_record.updated_at)
+    else:
+        state.version = config_record.updated_at
+
+
+def sync(app, force: bool = False) -> bool:
+    """
+    数据库中的参数版本与本进程已应用的不同时重新读取并应用到 app.config（需在应用上下文中调用）。
+    force=False 时最多每 MONITORING_CONFIG_SYNC_SECONDS 秒查询一次；返回是否应用了新参数。
+    """
+    state = app.extensions.get(EXTENSION_KEY)
+    if state is None:
+        state = app.extensions[EXTENSION_KEY] = ConfigSyncState()
+    if not force and not state.due(float(app.config.get('MONITORING_CONFIG_SYNC_SECONDS', 5))):
+        return False
+    version = db.session.execute(
+        sa.select(MonitoringConfig.updated_at).order_by(MonitoringConfig.id).limit(1)
+    ).scalar()
+    if version is None or version == state.version:
+        return False
+    config_record = db.session.execute(
+        sa.select(MonitoringConfig).order_by(MonitoringConfig.id).limit(1)
+    ).scalar()
+    if config_record is None:
+        return False
+    config_record.apply_to_config(app.config)
+    state.version = config_record.updated_at
+    return True
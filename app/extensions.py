@@ -3,8 +3,27 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_apscheduler import APScheduler
 from flask_admin import Admin
 from flask_migrate import Migrate
+from sqlalchemy import event
+
 db = SQLAlchemy()
 # 创建 APScheduler 实例
 scheduler = APScheduler()
 admin = Admin()
-migrate = Migrate()
\ No newline at end of file
+migrate = Migrate()
+
+
+def configure_sqlite_connections(app):
+    """
+    为 SQLite 连接设置 busy_timeout，清理任务持有写锁时检查任务会等待而不是直接失败。
+    只对之后新建的连接生效，需在 db.init_app 之后、首次访问数据库之前调用（见 create_app）。
+    """
+    engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+    busy_timeout = int(app.config.get('SQLITE_BUSY_TIMEOUT_MS', 30000))
+
+    @event.listens_for(engine, 'connect')
+    def _set_busy_timeout(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'PRAGMA busy_timeout = {busy_timeout}')
+        cursor.close()
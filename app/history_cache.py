@@ -0,0 +1,209 @@
+# web-monitor/app/history_cache.py
+"""
+/api/history 的分块日志缓存。
+
+查询范围按 HISTORY_CACHE_CHUNK_SECONDS 对齐切分为若干整块，外加范围开头不完整的一段与末尾的实时部分。
+站点最新一条日志的时间晚于某个整块的结束时间时，说明该块之前的检查结果都已提交，块内数据不会再变化：
+这样的块连同其 numpy 列数组缓存在按行数限制的 LRU 中，之后的请求直接复用；
+开头的零散部分与尚未封闭的末尾部分每次都从数据库读取。所有需要读取的区间合并为一次查询。
+缓存只存在于当前进程内，过期数据被清理后，范围起点会前移到最早数据时间，被删除的块不会再被访问。
+"""
+import datetime
+import threading
+from bisect import bisect_right
+from collections import OrderedDict, namedtuple
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import sqlalchemy as sa
+from flask import current_app
+
+from . import history_stats, log_store
+from .extensions import db
+
+HISTORY_LOG_COLUMNS = ('site_name', 'timestamp', 'status', 'response_time_seconds', 'http_status_code', 'error_detail')
+HISTORY_FETCH_SIZE = 5000
+
+CachedChunk = namedtuple('CachedChunk', ['logs', 'arrays'])
+# kind: 'chunk' 为可缓存的整块，'live' 为每次实时读取的部分；end_inclusive 只用于范围末尾
+Piece = namedtuple('Piece', ['kind', 'start', 'end', 'end_inclusive'])
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+class ChunkCache:
+    """按 (站点, 块起始时间) 保存日志块的 LRU，容量以缓存的日志总行数计。"""
+
+    def __init__(self, max_rows: int):
+        self.max_rows = max_rows
+        self.rows = 0
+        self.hits = 0
+        self.misses = 0
+        self._items: 'OrderedDict[Tuple[str, datetime.datetime], CachedChunk]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[CachedChunk]:
+        with self._lock:
+            chunk = self._items.get(key)
+            if chunk is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return chunk
+
+    def put(self, key, chunk: CachedChunk) -> None:
+        # 空块也缓存（监控中断的时段），按 1 行计入容量
+        size = max(len(chunk.logs), 1)
+        if size > self.max_rows:
+            return
+        with self._lock:
+            previous = self._items.pop(key, None)
+            if previous is not None:
+                self.rows -= max(len(previous.logs), 1)
+            self._items[key] = chunk
+            self.rows += size
+            while self.rows > self.max_rows and self._items:
+                _, evicted = self._items.popitem(last=False)
+                self.rows -= max(len(evicted.logs), 1)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self.rows = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'chunks': len(self._items), 'rows': self.rows, 'hits': self.hits, 'misses': self.misses}
+
+
+_cache: Optional[ChunkCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ChunkCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ChunkCache(int(current_app.config.get('HISTORY_CACHE_MAX_ROWS', 1_000_000)))
+        return _cache
+
+
+def _floor(value: datetime.datetime, chunk_seconds: int) -> datetime.datetime:
+    seconds = (value - _EPOCH) // datetime.timedelta(seconds=1)
+    return _EPOCH + datetime.timedelta(seconds=seconds - seconds % chunk_seconds)
+
+
+def plan_pieces(start, end, latest, chunk_seconds) -> List[Piece]:
+    """把 [start, end] 切分为开头零散部分、可缓存的整块与末尾实时部分（均为 naive UTC）。"""
+    if latest is None:
+        return []
+    step = datetime.timedelta(seconds=chunk_seconds)
+    first = _floor(start, chunk_seconds)
+    if first < start:
+        first += step
+    sealed_until = min(end, latest)
+    pieces = []
+    cursor = start
+    chunk_start = first
+    while chunk_start + step <= sealed_until:
+        if cursor < chunk_start:
+            pieces.append(Piece('live', cursor, chunk_start, False))
+        pieces.append(Piece('chunk', chunk_start, chunk_start + step, False))
+        cursor = chunk_start = chunk_start + step
+    pieces.append(Piece('live', cursor, end, True))
+    return pieces
+
+
+def _range_clause(source, site_name, piece):
+    upper = source.c.timestamp <= piece.end if piece.end_inclusive else source.c.timestamp < piece.end
+    return sa.and_(source.c.site_name == site_name, source.c.timestamp >= piece.start, upper)
+
+
+def _merge_adjacent(fetch: List[Tuple[str, Piece]]) -> List[Tuple[str, Piece]]:
+    """合并同一站点首尾相接的待读取区间，减少查询条件的数量（首次请求时大部分整块都未缓存）。"""
+    merged: List[Tuple[str, Piece]] = []
+    for site, piece in fetch:
+        if merged and merged[-1][0] == site and merged[-1][1].end == piece.start and not merged[-1][1].end_inclusive:
+            previous = merged[-1][1]
+            merged[-1] = (site, Piece('live', previous.start, piece.end, piece.end_inclusive))
+        else:
+            merged.append((site, piece))
+    return merged
+
+
+def _empty_arrays():
+    return history_stats.log_arrays([])
+
+
+def load_history_logs(
+    site_names: Iterable[str], start, end, latest: Optional[Dict[str, datetime.datetime]] = None
+) -> Dict[str, Tuple[List, history_stats.LogArrays]]:
+    """读取各站点 [start, end] 内按时间升序的日志及对应的列数组，整块数据优先取自缓存。
+    latest 为调用方已查询的各站点最新日志时间（log_store.latest_log_times）。
+    """
+    site_names = list(dict.fromkeys(site_names))
+    start = log_store.to_naive_utc(start)
+    end = log_store.to_naive_utc(end)
+    if not current_app.config.get('HISTORY_CACHE_ENABLED', True):
+        return _load_uncached(site_names, start, end)
+
+    cache = get_cache()
+    chunk_seconds = int(current_app.config.get('HISTORY_CACHE_CHUNK_SECONDS', 3600))
+    if latest is None:
+        latest = log_store.latest_log_times(site_names)
+    plans: Dict[str, List[Piece]] = {}
+    parts: Dict[str, List[Optional[CachedChunk]]] = {}
+    fetch: List[Tuple[str, Piece]] = []
+    for site in site_names:
+        plans[site] = plan_pieces(start, end, latest.get(site), chunk_seconds)
+        parts[site] = []
+        for piece in plans[site]:
+            cached = cache.get((site, piece.start)) if piece.kind == 'chunk' else None
+            parts[site].append(cached)
+            if cached is None:
+                fetch.append((site, piece))
+
+    fetched = {(site, piece.start): [] for site, piece in fetch}
+    if fetch:
+        source = log_store.log_source(start, end, site_names)
+        rows = db.session.execute(
+            sa.select(*[source.c[name] for name in HISTORY_LOG_COLUMNS])
+            .where(sa.or_(*[_range_clause(source, site, piece) for site, piece in _merge_adjacent(fetch)]))
+            .order_by(source.c.site_name, source.c.timestamp)
+            .execution_options(yield_per=HISTORY_FETCH_SIZE)
+        )
+        starts = {site: [piece.start for piece in plans[site]] for site in site_names}
+        for row in rows:
+            site_starts = starts[row.site_name]
+            piece_start = site_starts[bisect_right(site_starts, row.timestamp) - 1]
+            fetched[(row.site_name, piece_start)].append(row)
+
+    results = {}
+    for site in site_names:
+        site_logs: List = []
+        site_arrays = []
+        for piece, cached in zip(plans[site], parts[site]):
+            if cached is None:
+                logs = fetched[(site, piece.start)]
+                cached = CachedChunk(logs, history_stats.log_arrays(logs))
+                if piece.kind == 'chunk':
+                    cache.put((site, piece.start), cached)
+            site_logs.extend(cached.logs)
+            site_arrays.append(cached.arrays)
+        results[site] = (site_logs, history_stats.concat(site_arrays) if site_arrays else _empty_arrays())
+    return results
+
+
+def _load_uncached(site_names, start, end):
+    results = {site: [] for site in site_names}
+    if site_names:
+        source = log_store.log_source(start, end, site_names)
+        rows = db.session.execute(
+            sa.select(*[source.c[name] for name in HISTORY_LOG_COLUMNS]).where(
+                source.c.site_name.in_(site_names),
+                source.c.timestamp.between(start, end),
+            ).order_by(source.c.site_name, source.c.timestamp).execution_options(yield_per=HISTORY_FETCH_SIZE)
+        )
+        for row in rows:
+            results[row.site_name].append(row)
+    return {site: (logs, history_stats.log_arrays(logs)) for site, logs in results.items()}
@@ -0,0 +1,158 @@
+# web-monitor/app/history_format.py
+"""
+/api/history 的响应编码。
+
+rows（默认，兼容旧客户端）：时间线每段为 [开始毫秒, 结束毫秒, 状态码, 服务端渲染的 HTML 提示文本]，
+响应时间点同时带格式化时间字符串与毫秒时间戳。
+compact：列式结构，时间戳差分编码（首项为绝对值，其余为与前一项的差），时间线只传状态码、时长、原因与平均响应，
+提示文本由前端渲染，响应时间点不再附带格式化时间。
+
+两种格式都优先用 orjson 序列化（可选依赖，未安装时回退到标准库 json），
+客户端支持时按 br（需安装 brotli）或 gzip 压缩响应体。
+"""
+import gzip
+import json
+from collections import namedtuple
+from typing import Dict, List, Optional
+
+import numpy as np
+from flask import current_app
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # 可选依赖
+    brotli = None
+
+FORMATS = ('rows', 'compact')
+NO_DATA_TEXT = "该时间段内无数据"
+STATUS_KEYS = {1: 'up', 2: 'slow', 3: 'down'}
+# 小于该字节数的响应不压缩
+MIN_COMPRESS_BYTES = 1024
+
+# duration 为精确时长（timedelta），只用于服务端渲染提示文本；availability / resolution 只在聚合数据中出现
+TimelineEntry = namedtuple(
+    'TimelineEntry',
+    ['start_ms', 'end_ms', 'status_code', 'duration', 'reason', 'avg_response', 'availability', 'resolution'],
+)
+
+
+def timeline_entry(start_time, end_time, status_code, reason=None, avg_response=None, availability=None, resolution=None):
+    """由带时区的开始 / 结束时间构建时间线分段；status_code 为 0 表示该时间段内无数据。"""
+    return TimelineEntry(
+        int(start_time.timestamp() * 1000),
+        int(end_time.timestamp() * 1000),
+        status_code,
+        end_time - start_time,
+        reason,
+        avg_response,
+        availability,
+        resolution,
+    )
+
+
+def timeline_details(entry: TimelineEntry) -> str:
+    """时间线分段的 HTML 提示文本（rows 格式），与 static/js/utils.js 的 renderTimelineDetails 保持一致。"""
+    if entry.status_code == 0:
+        return NO_DATA_TEXT
+    status_key = STATUS_KEYS[entry.status_code]
+    duration_str = str(entry.duration).split('.')[0]
+    details = f"状态: {status_key.upper()}<br>持续: {duration_str}<br>"
+    if entry.availability is not None:
+        details += f"可用率: {entry.availability:.2f}%<br>"
+        details += f"平均响应: {entry.avg_response:.3f}s" if entry.avg_response is not None else "平均响应: N/A"
+        details += f"<br>数据粒度: {entry.resolution}"
+    elif status_key == 'down':
+        details += f"原因: {entry.reason or '未知错误'}"
+    elif entry.avg_response is not None:
+        # 先消除求和顺序带来的浮点尾差，保证不同计算路径在 .xxx5 这类边界值上取整一致
+        details += f"平均响应: {round(entry.avg_response, 9):.3f}s"
+    else:
+        # 如果一个分段里全是None（理论上不太可能，但做个保护）
+        details += "平均响应: N/A"
+    return details
+
+
+def timeline_rows(entries: List[TimelineEntry]) -> List[list]:
+    return [[entry.start_ms, entry.end_ms, entry.status_code, timeline_details(entry)] for entry in entries]
+
+
+def delta_encode(values) -> List[int]:
+    return np.diff(np.asarray(values, dtype=np.int64), prepend=0).tolist()
+
+
+def _optional_round(value, digits):
+    return None if value is None else round(value, digits)
+
+
+def timeline_columns(entries: List[TimelineEntry]) -> Dict[str, list]:
+    columns = {
+        'start_ms': delta_encode([entry.start_ms for entry in entries]),
+        'duration_ms': [entry.end_ms - entry.start_ms for entry in entries],
+        'status': [entry.status_code for entry in entries],
+        'reason': [entry.reason for entry in entries],
+        'avg_response': [_optional_round(entry.avg_response, 6) for entry in entries],
+    }
+    if any(entry.availability is not None for entry in entries):
+        columns['availability'] = [_optional_round(entry.availability, 4) for entry in entries]
+        columns['resolution'] = next(entry.resolution for entry in entries if entry.resolution)
+    return columns
+
+
+def encode(results: Dict[str, dict], fmt: str) -> Dict[str, dict]:
+    """把 _build_site_history / _build_rollup_history 的结果转换为指定格式。"""
+    encoded = {}
+    for site, site_data in results.items():
+        site_result = {key: value for key, value in site_data.items() if key not in ('timeline_data', 'response_times')}
+        response_times = site_data['response_times']
+        if fmt == 'compact':
+            site_result['timeline'] = timeline_columns(site_data['timeline_data'])
+            site_result['response_times'] = {
+                'timestamps_ms': delta_encode(response_times['timestamps_ms']),
+                'times': response_times['times'],
+            }
+        else:
+            site_result['timeline_data'] = timeline_rows(site_data['timeline_data'])
+            site_result['response_times'] = response_times
+        encoded[site] = site_result
+    return encoded
+
+
+def dumps(payload) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def negotiate_encoding(request) -> Optional[str]:
+    """按请求的 Accept-Encoding 选择压缩方式，None 表示不压缩。"""
+    if not current_app.config.get('HISTORY_COMPRESSION', True):
+        return None
+    if brotli is not None and request.accept_encodings['br']:
+        return 'br'
+    if request.accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(body: bytes, encoding: Optional[str]) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def json_response(payload, encoding: Optional[str] = None):
+    body = dumps(payload)
+    response = current_app.response_class(mimetype='application/json')
+    if encoding and len(body) >= MIN_COMPRESS_BYTES:
+        body = compress(body, encoding)
+        response.headers['Content-Encoding'] = encoding
+    response.set_data(body)
+    response.vary.add('Accept-Encoding')
+    return response
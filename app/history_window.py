@@ -0,0 +1,310 @@
+# web-monitor/app/history_window.py
+"""
+/api/history 增量模式（since）的数据读取与统计。
+
+增量请求不再读取整个时间范围：统计值（可用率、平均值、P95/P99、今日/本周/本月 SLA）由各站点的窗口累计量得到，
+窗口起点前移时减去滑出的日志，新日志到达时只读取并加上新增的部分；时间线与事件只需要 since 之后的日志，
+以及 since 时刻仍在持续的状态段（连续相同简化状态的日志，最后一段时间线与事件要从它的第一条日志重新计算）。
+稳定刷新时数据库读取与计算量只与新增数据相关，与时间范围的长度无关。
+
+累计量保存在进程内、按行数（HISTORY_CACHE_MAX_ROWS）限制的 LRU 中。窗口向前扩展、结束时间早于已统计的数据、
+站点日志被删除或缓存被淘汰时，用 history_cache 读取整个范围重建一次（整块数据通常已在块缓存中）。
+平均响应时间由累加和增减得到，可能与完整计算在最后几位上不同；其余统计值与完整计算完全一致。
+"""
+import datetime
+import threading
+from collections import OrderedDict, namedtuple
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import sqlalchemy as sa
+from flask import current_app
+
+from . import history_cache, history_stats, log_store
+from .extensions import db
+
+_INITIAL_CAPACITY = 1024
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+# count 为窗口内日志条数；overall 与 history_stats.overall_stats 的返回值一致；sla 为各区间起点对应的可用率
+WindowSummary = namedtuple('WindowSummary', ['count', 'overall', 'sla', 'first_timestamp', 'last_timestamp'])
+
+
+class SiteWindow:
+    """单个站点窗口 [start, 最后一条日志] 内日志的累计量。
+
+    时间戳、响应时间与可用条数的前缀和按时间顺序保存在预留容量的数组中：窗口起点前移只移动 offset，
+    新日志写入预留空间，容量不足时翻倍并丢弃已滑出的部分。有效响应时间另存一份升序数组，
+    增删时用二分查找定位，P95/P99 按名次直接读取。
+    """
+
+    def __init__(self, start_us: int):
+        self.start_us = start_us
+        self.last_timestamp: Optional[datetime.datetime] = None
+        self.offset = 0
+        self.size = 0
+        self.ts_us = np.empty(_INITIAL_CAPACITY, np.int64)
+        self.response_times = np.empty(_INITIAL_CAPACITY, np.float64)
+        # up_prefix[i] 为缓冲区前 i 条日志中可用（正常或访问过慢）的条数
+        self.up_prefix = np.zeros(_INITIAL_CAPACITY + 1, np.int64)
+        self.sorted_times = np.empty(0, np.float64)
+        self.response_sum = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        return self.size - self.offset
+
+    def _grow(self, needed: int):
+        capacity = max(_INITIAL_CAPACITY, needed * 2)
+        count = self.count
+        ts_us = np.empty(capacity, np.int64)
+        ts_us[:count] = self.ts_us[self.offset:self.size]
+        response_times = np.empty(capacity, np.float64)
+        response_times[:count] = self.response_times[self.offset:self.size]
+        up_prefix = np.zeros(capacity + 1, np.int64)
+        up_prefix[:count + 1] = self.up_prefix[self.offset:self.size + 1] - self.up_prefix[self.offset]
+        self.ts_us, self.response_times, self.up_prefix = ts_us, response_times, up_prefix
+        self.offset, self.size = 0, count
+
+    def append(self, arrays: history_stats.LogArrays, last_timestamp: datetime.datetime):
+        """追加时间晚于窗口内最后一条的日志。"""
+        added = arrays.ts_us.size
+        if added == 0:
+            return
+        if self.size + added > self.ts_us.size:
+            self._grow(self.count + added)
+        end = self.size + added
+        self.ts_us[self.size:end] = arrays.ts_us
+        self.response_times[self.size:end] = arrays.response_times
+        self.up_prefix[self.size + 1:end + 1] = self.up_prefix[self.size] + np.cumsum(
+            arrays.status <= history_stats.STATUS_SLOW
+        )
+        self.size = end
+        valid = arrays.response_times[~np.isnan(arrays.response_times)]
+        if valid.size:
+            self.response_sum = sum(valid.tolist(), self.response_sum)
+            valid = np.sort(valid)
+            self.sorted_times = np.insert(self.sorted_times, np.searchsorted(self.sorted_times, valid), valid)
+        self.last_timestamp = last_timestamp
+
+    def trim(self, start_us: int):
+        """窗口起点前移到 start_us，减去滑出窗口的日志。"""
+        self.start_us = start_us
+        removed_end = self.offset + int(np.searchsorted(self.ts_us[self.offset:self.size], start_us, side='left'))
+        if removed_end == self.offset:
+            return
+        removed = self.response_times[self.offset:removed_end]
+        removed = np.sort(removed[~np.isnan(removed)])
+        self.offset = removed_end
+        if removed.size:
+            # 相同的值在升序数组中相邻：第 i 个重复值删除该值首次出现位置之后的第 i 个元素
+            positions = (
+                np.searchsorted(self.sorted_times, removed, side='left')
+                + np.arange(removed.size) - np.searchsorted(removed, removed, side='left')
+            )
+            self.sorted_times = np.delete(self.sorted_times, positions)
+            self.response_sum = self.response_sum - sum(removed.tolist()) if self.sorted_times.size else 0.0
+
+    def _availability(self, left: int, right: int) -> float:
+        return float(int(self.up_prefix[right] - self.up_prefix[left]) / (right - left) * 100)
+
+    def summary(self, period_starts_us: Iterable[int], now_us: int) -> WindowSummary:
+        count = self.count
+        if count == 0:
+            return WindowSummary(0, (0, 0, 0, 0), [0 for _ in period_starts_us], None, None)
+        availability = self._availability(self.offset, self.size)
+        valid = self.sorted_times.size
+        if valid:
+            k95 = min(int(valid * 0.95), valid - 1)
+            k99 = min(int(valid * 0.99), valid - 1)
+            overall = (
+                availability, self.response_sum / valid, float(self.sorted_times[k95]), float(self.sorted_times[k99])
+            )
+        else:
+            overall = (availability, 0, 0, 0)
+        # 与 history_stats.period_availability 相同：区间内无数据时取整体可用率
+        ts_us = self.ts_us[self.offset:self.size]
+        right = self.offset + int(np.searchsorted(ts_us, now_us, side='right'))
+        sla = []
+        for period_start_us in period_starts_us:
+            left = self.offset + int(np.searchsorted(ts_us, period_start_us, side='left'))
+            sla.append(self._availability(left, right) if right > left else availability)
+        first_timestamp = _EPOCH + datetime.timedelta(microseconds=int(ts_us[0]))
+        return WindowSummary(count, overall, sla, first_timestamp, self.last_timestamp)
+
+
+class WindowCache:
+    """按 (站点, 时间范围长度) 保存 SiteWindow 的 LRU，容量以各窗口内的日志总条数计。
+    不同长度的相对时间范围（如最近 6 小时与最近 7 天）各自维护窗口，互不覆盖。
+    """
+
+    def __init__(self, max_rows: int):
+        self.max_rows = max_rows
+        self._items: 'OrderedDict[Tuple[str, int], SiteWindow]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[SiteWindow]:
+        with self._lock:
+            window = self._items.get(key)
+            if window is not None:
+                self._items.move_to_end(key)
+            return window
+
+    def put(self, key, window: SiteWindow) -> None:
+        with self._lock:
+            self._items[key] = window
+            self._items.move_to_end(key)
+            self._evict()
+
+    def evict(self) -> None:
+        """窗口追加新日志后重新检查容量。"""
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        rows = sum(window.count for window in self._items.values())
+        while rows > self.max_rows and len(self._items) > 1:
+            _, evicted = self._items.popitem(last=False)
+            rows -= evicted.count
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+_cache: Optional[WindowCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> WindowCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = WindowCache(int(current_app.config.get('HISTORY_CACHE_MAX_ROWS', 1_000_000)))
+        return _cache
+
+
+def _build_window(site_name, start, end, latest) -> SiteWindow:
+    logs, arrays = history_cache.load_history_logs([site_name], start, end, {site_name: latest})[site_name]
+    window = SiteWindow(history_stats.to_epoch_us(start))
+    if logs:
+        window.append(arrays, logs[-1].timestamp)
+    return window
+
+
+def window_summaries(
+    site_names: Iterable[str], start, end, latest: Dict[str, datetime.datetime], period_starts, now, span_seconds=None
+) -> Dict[str, WindowSummary]:
+    """返回各站点 [start, end] 内日志的统计值；已有窗口只读取其最后一条之后的新日志。
+    latest 为各站点最新日志时间（log_store.latest_log_times）；period_starts 为 SLA 各区间的起点，区间均结束于 now；
+    span_seconds 为客户端请求的时间范围长度（按最早数据时间调整 start 之前），用于区分不同长度的相对时间范围。
+    """
+    site_names = list(dict.fromkeys(site_names))
+    start = log_store.to_naive_utc(start)
+    end = log_store.to_naive_utc(end)
+    start_us = history_stats.to_epoch_us(start)
+    if span_seconds is None:
+        span_seconds = (end - start).total_seconds()
+    span_key = int(round(span_seconds / 60))
+    cache = get_cache() if current_app.config.get('HISTORY_CACHE_ENABLED', True) else None
+
+    windows: Dict[str, SiteWindow] = {}
+    appends: Dict[str, datetime.datetime] = {}
+    for site in site_names:
+        window = cache.get((site, span_key)) if cache is not None else None
+        site_latest = latest.get(site)
+        if window is not None and window.last_timestamp is None:
+            # 空窗口：没有新日志时仍可直接使用
+            stale = site_latest is not None or start_us < window.start_us
+        else:
+            stale = window is None or start_us < window.start_us or window.last_timestamp > end or (
+                site_latest is None or site_latest < window.last_timestamp
+            )
+        if stale:
+            window = _build_window(site, start, end, site_latest)
+            if cache is not None:
+                cache.put((site, span_key), window)
+        elif site_latest is not None and site_latest > window.last_timestamp:
+            appends[site] = window.last_timestamp
+        windows[site] = window
+
+    new_logs = load_logs_after(appends, end, inclusive=False) if appends else {}
+    period_starts_us = [history_stats.to_epoch_us(value) for value in period_starts]
+    now_us = history_stats.to_epoch_us(now)
+    summaries = {}
+    for site, window in windows.items():
+        with window.lock:
+            if start_us < window.start_us:
+                # 并发请求已把窗口起点移到本次范围之后，本次单独计算
+                window = _build_window(site, start, end, latest.get(site))
+            elif site in new_logs:
+                logs, arrays = new_logs[site]
+                # 并发请求可能已追加了其中一部分日志
+                skip = int(np.searchsorted(arrays.ts_us, history_stats.to_epoch_us(window.last_timestamp), side='right'))
+                if skip < len(logs):
+                    window.append(history_stats.take(arrays, np.arange(skip, len(logs))), logs[-1].timestamp)
+            if start_us > window.start_us:
+                window.trim(start_us)
+            summaries[site] = window.summary(period_starts_us, now_us)
+    if cache is not None and appends:
+        cache.evict()
+    return summaries
+
+
+def _status_differs(column, status):
+    if status == '无法访问':
+        return column != '无法访问'
+    if status == '访问过慢':
+        return column != '访问过慢'
+    return column.in_(('无法访问', '访问过慢'))
+
+
+def status_run_start(site_name: str, start, since) -> datetime.datetime:
+    """since 时刻（含）所在状态段之前的最后一条日志时间，不存在时为 start。
+    从这条日志开始重新计算，得到的时间线与事件中结束于 since 之后的部分与整个范围计算的结果一致。
+    """
+    start = log_store.to_naive_utc(start)
+    since = log_store.to_naive_utc(since)
+    source = log_store.log_source(start, since, [site_name])
+    in_range = sa.and_(
+        source.c.site_name == site_name, source.c.timestamp >= start, source.c.timestamp <= since
+    )
+    last_status = db.session.execute(
+        sa.select(source.c.status).where(in_range).order_by(source.c.timestamp.desc()).limit(1)
+    ).scalar()
+    if last_status is None:
+        return start
+    boundary = db.session.execute(
+        sa.select(source.c.timestamp).where(in_range, _status_differs(source.c.status, last_status))
+        .order_by(source.c.timestamp.desc()).limit(1)
+    ).scalar()
+    return start if boundary is None else boundary
+
+
+def load_logs_after(
+    lower_bounds: Dict[str, datetime.datetime], end, inclusive: bool = True
+) -> Dict[str, Tuple[List, history_stats.LogArrays]]:
+    """一次查询读取各站点 (或 [) lower_bounds[站点], end] 内按时间升序的日志及对应的列数组。"""
+    results: Dict[str, List] = {site: [] for site in lower_bounds}
+    if lower_bounds:
+        end = log_store.to_naive_utc(end)
+        lower_bounds = {site: log_store.to_naive_utc(value) for site, value in lower_bounds.items()}
+        source = log_store.log_source(min(lower_bounds.values()), end, lower_bounds)
+        clauses = [
+            sa.and_(
+                source.c.site_name == site,
+                source.c.timestamp >= lower if inclusive else source.c.timestamp > lower,
+                source.c.timestamp <= end,
+            )
+            for site, lower in lower_bounds.items()
+        ]
+        rows = db.session.execute(
+            sa.select(*[source.c[name] for name in history_cache.HISTORY_LOG_COLUMNS])
+            .where(sa.or_(*clauses))
+            .order_by(source.c.site_name, source.c.timestamp)
+            .execution_options(yield_per=history_cache.HISTORY_FETCH_SIZE)
+        )
+        for row in rows:
+            results[row.site_name].append(row)
+    return {site: (logs, history_stats.log_arrays(logs)) for site, logs in results.items()}
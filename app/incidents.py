@@ -0,0 +1,219 @@
+# web-monitor/app/incidents.py
+"""
+宕机 / 慢响应事件表的维护与查询。
+
+健康检查任务每写入一批日志，就为进入异常状态的站点打开事件、为恢复或切换状态的站点关闭事件，
+并记录原因、峰值响应时间以及期间是否发出过告警。仪表盘的告警历史直接按索引读取该表，
+跨越查询范围边界的事件也能得到完整的开始 / 结束时间。
+
+事件按每次检查的原始状态打开与关闭，而不是按告警状态（连续失败 / 窗口阈值）：这与区间表、
+日志回退路径（routes._build_incidents_from_logs）以及 rebuild_incidents 按日志补全的结果一致，
+未达到告警阈值的短暂异常也会记为事件。是否发出过告警记录在 notification_sent 中，
+只关心已告警的事件时按该列过滤（list_incidents(notified_only=True)、/api/incidents?notified_only=true）。
+"""
+import datetime
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import sqlalchemy as sa
+
+from . import log_store
+from .extensions import db
+from .models import Incident
+
+STATUS_KEYS = {'无法访问': 'down', '访问过慢': 'slow'}
+MAX_REASONS = 20
+BACKFILL_FLUSH_SIZE = 1000
+
+_incident_table = Incident.__table__
+
+
+def incident_reason(row) -> Optional[str]:
+    if row.get('error_detail'):
+        return row['error_detail']
+    http_status_code = row.get('http_status_code')
+    if http_status_code and http_status_code >= 400:
+        return f"HTTP {http_status_code}"
+    if row.get('status') == '访问过慢' and row.get('response_time_seconds') is not None:
+        return f"响应时间 {row['response_time_seconds']:.3f}s"
+    return None
+
+
+def _new_incident(row: Dict[str, Any], status_key: str) -> Dict[str, Any]:
+    reason = incident_reason(row)
+    return {
+        'site_name': row['site_name'],
+        'status': status_key,
+        'start_time': row['timestamp'],
+        'end_time': None,
+        'last_seen': row['timestamp'],
+        'check_count': 1,
+        'reasons': [reason] if reason else [],
+        'http_status_code': row.get('http_status_code') or None,
+        'peak_response_time': row.get('response_time_seconds'),
+        'notification_sent': False,
+    }
+
+
+def _extend(incident: Dict[str, Any], row: Dict[str, Any]) -> None:
+    incident['last_seen'] = row['timestamp']
+    incident['check_count'] += 1
+    reason = incident_reason(row)
+    if reason and reason not in incident['reasons'] and len(incident['reasons']) < MAX_REASONS:
+        incident['reasons'].append(reason)
+    if row.get('http_status_code') and not incident['http_status_code']:
+        incident['http_status_code'] = row['http_status_code']
+    response_time = row.get('response_time_seconds')
+    if response_time is not None and (incident['peak_response_time'] is None or response_time > incident['peak_response_time']):
+        incident['peak_response_time'] = response_time
+
+
+def _apply_check(incident, row, alerted_status=None) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """根据一次检查结果推进站点的事件状态，返回 (仍在持续的事件, 本次关闭的事件)。"""
+    status_key = STATUS_KEYS.get(row['status'])
+    closed = None
+    if incident is not None and incident['status'] != status_key:
+        incident['end_time'] = row['timestamp']
+        closed, incident = incident, None
+    if status_key is None:
+        return None, closed
+    if incident is None:
+        incident = _new_incident(row, status_key)
+    else:
+        _extend(incident, row)
+    if alerted_status == status_key:
+        incident['notification_sent'] = True
+    return incident, closed
+
+
+def _to_columns(incident: Dict[str, Any]) -> Dict[str, Any]:
+    values = {key: value for key, value in incident.items() if key != 'id'}
+    values['reasons'] = json.dumps(incident['reasons'], ensure_ascii=False) if incident['reasons'] else None
+    return values
+
+
+def _from_row(row) -> Dict[str, Any]:
+    incident = dict(row)
+    incident['reasons'] = json.loads(incident['reasons']) if incident.get('reasons') else []
+    return incident
+
+
+def open_incidents(site_names: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    site_names = list(site_names)
+    if not site_names:
+        return {}
+    rows = db.session.execute(
+        sa.select(_incident_table).where(
+            _incident_table.c.site_name.in_(site_names),
+            _incident_table.c.end_time.is_(None),
+        ).order_by(_incident_table.c.start_time)
+    ).mappings().all()
+    return {row['site_name']: _from_row(row) for row in rows}
+
+
+def record_checks(rows: List[Dict[str, Any]], alerted: Optional[Dict[str, str]] = None) -> None:
+    """在当前会话中用一批检查结果更新事件表（由调用方提交）。
+    alerted 为本轮检查中发出告警的站点及告警类型（'down' | 'slow'）。
+    """
+    if not rows:
+        return
+    alerted = alerted or {}
+    current = open_incidents({row['site_name'] for row in rows})
+    changed: Dict[int, Dict[str, Any]] = {}
+    created: List[Dict[str, Any]] = []
+    for row in sorted(rows, key=lambda item: item['timestamp']):
+        incident, closed = _apply_check(current.get(row['site_name']), row, alerted.get(row['site_name']))
+        for item in (closed, incident):
+            if item is None:
+                continue
+            if item.get('id') is not None:
+                changed[item['id']] = item
+            elif not any(item is pending for pending in created):
+                created.append(item)
+        current[row['site_name']] = incident
+    for incident in changed.values():
+        db.session.execute(
+            sa.update(_incident_table).where(_incident_table.c.id == incident['id']).values(**_to_columns(incident))
+        )
+    if created:
+        db.session.execute(sa.insert(_incident_table), [_to_columns(incident) for incident in created])
+
+
+def incidents_between(site_name: str, start: datetime.datetime, end: datetime.datetime) -> List[Dict[str, Any]]:
+    """返回与 [start, end] 有重叠的事件（包括开始于范围之前、仍在持续的事件），按开始时间升序。"""
+    start = log_store.to_naive_utc(start)
+    end = log_store.to_naive_utc(end)
+    rows = db.session.execute(
+        sa.select(_incident_table).where(
+            _incident_table.c.site_name == site_name,
+            _incident_table.c.start_time <= end,
+            sa.or_(_incident_table.c.end_time.is_(None), _incident_table.c.end_time >= start),
+        ).order_by(_incident_table.c.start_time)
+    ).mappings().all()
+    return [_from_row(row) for row in rows]
+
+
+def list_incidents(limit=50, before=None, site_names=None, status=None, notified_only=False) -> List[Dict[str, Any]]:
+    """按开始时间倒序分页读取事件，before 为上一页最后一条的 (start_time, id)；notified_only 只返回发出过告警的事件。"""
+    stmt = sa.select(_incident_table)
+    if before:
+        before_time, before_id = before
+        stmt = stmt.where(sa.or_(
+            _incident_table.c.start_time < before_time,
+            sa.and_(_incident_table.c.start_time == before_time, _incident_table.c.id < before_id),
+        ))
+    if site_names:
+        stmt = stmt.where(_incident_table.c.site_name.in_(list(site_names)))
+    if status:
+        stmt = stmt.where(_incident_table.c.status == status)
+    if notified_only:
+        stmt = stmt.where(_incident_table.c.notification_sent.is_(True))
+    stmt = stmt.order_by(_incident_table.c.start_time.desc(), _incident_table.c.id.desc()).limit(limit)
+    return [_from_row(row) for row in db.session.execute(stmt).mappings().all()]
+
+
+def rebuild_incidents(site_names: Optional[Iterable[str]] = None) -> int:
+    """根据现有日志重建事件表（无法还原历史告警是否发送），返回生成的事件数。"""
+    delete_stmt = sa.delete(_incident_table)
+    if site_names is not None:
+        site_names = list(site_names)
+        delete_stmt = delete_stmt.where(_incident_table.c.site_name.in_(site_names))
+    db.session.execute(delete_stmt)
+
+    source = log_store.log_source(site_names=site_names)
+    stmt = sa.select(
+        source.c.site_name,
+        source.c.timestamp,
+        source.c.status,
+        source.c.response_time_seconds,
+        source.c.http_status_code,
+        source.c.error_detail,
+    ).where(source.c.timestamp.isnot(None))
+    if site_names is not None:
+        stmt = stmt.where(source.c.site_name.in_(site_names))
+    stmt = stmt.order_by(source.c.site_name, source.c.timestamp).execution_options(yield_per=5000)
+
+    total = 0
+    pending: List[Dict[str, Any]] = []
+    incident = None
+    current_site = None
+    for row in db.session.execute(stmt).mappings():
+        if row['site_name'] != current_site:
+            if incident is not None:
+                pending.append(incident)
+            incident = None
+            current_site = row['site_name']
+        incident, closed = _apply_check(incident, row)
+        if closed is not None:
+            pending.append(closed)
+        if len(pending) >= BACKFILL_FLUSH_SIZE:
+            db.session.execute(sa.insert(_incident_table), [_to_columns(item) for item in pending])
+            total += len(pending)
+            pending = []
+    if incident is not None:
+        pending.append(incident)
+    if pending:
+        db.session.execute(sa.insert(_incident_table), [_to_columns(item) for item in pending])
+        total += len(pending)
+    db.session.commit()
+    return total
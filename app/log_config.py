@@ -0,0 +1,91 @@
+# web-monitor/app/log_config.py
+"""
+应用日志：经队列交给后台线程输出，可按级别过滤，可选 JSON 格式。
+
+create_app 为 app 包的 logger（即 Flask 的 app.logger，services 等模块的 logger 是它的子 logger）
+挂一个 QueueHandler：调用方只把日志记录放入队列，格式化与写入 stderr 都在 QueueListener 的后台线程中完成，
+检查循环不再为每个站点同步格式化并写一行输出。
+
+    LOG_LEVEL=INFO    每轮检查一行汇总、告警与错误（默认）
+    LOG_LEVEL=DEBUG   另外输出每个站点每次检查的明细
+    LOG_FORMAT=json   每条日志输出为一行 JSON，extra 传入的字段（site、status、duration_ms 等）作为顶层字段
+"""
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+from typing import Optional
+
+from flask.logging import default_handler
+
+APP_LOGGER_NAME = __name__.rpartition('.')[0]
+TEXT_FORMAT = '%(asctime)s %(levelname)s [%(name)s] %(message)s'
+
+# LogRecord 自带的属性，其余属性来自 extra
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """同一进程内的队列不需要序列化日志记录，直接入队，消息的格式化推迟到后台线程。"""
+
+    def prepare(self, record):
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        payload = {
+            'time': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        # 输出队列中剩余的日志后停止后台线程
+        _listener.stop()
+        _listener = None
+
+
+def configure_logging(config) -> logging.Logger:
+    """按 LOG_LEVEL / LOG_FORMAT 配置 app 包的 logger；替换之前的配置与 Flask 默认的 handler。"""
+    global _listener
+    logger = logging.getLogger(APP_LOGGER_NAME)
+    level = logging.getLevelName(str(config.get('LOG_LEVEL') or 'INFO').upper())
+    logger.setLevel(level if isinstance(level, int) else logging.INFO)
+
+    _stop_listener()
+    for handler in list(logger.handlers):
+        if isinstance(handler, DeferredQueueHandler) or handler is default_handler:
+            logger.removeHandler(handler)
+
+    output = logging.StreamHandler()
+    if str(config.get('LOG_FORMAT') or 'text').lower() == 'json':
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(DeferredQueueHandler(log_queue))
+    # 已由队列输出，不再交给根 logger 重复输出
+    logger.propagate = False
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    return logger
+
+
+atexit.register(_stop_listener)
@@ -0,0 +1,433 @@
+# web-monitor/app/log_store.py
+"""
+健康检查日志的存储路由层。
+
+默认所有日志写入 health_check_log 单表；配置 LOG_PARTITIONING = 'month' | 'day' 后，
+新日志按时间写入独立的分区表（health_check_log_p202510 / health_check_log_p20251019），
+查询时只合并与时间范围重叠的分区，过期数据通过整表 DROP 清理。
+开启分区前写入 health_check_log 的历史数据仍会参与查询，并按原方式逐批清理；
+LOG_PARTITIONING 只决定新日志写入哪里，关闭分区后已有的分区表仍参与查询与清理。
+
+各分区表的自增 id 互相独立，跨表排序与分页游标使用 (timestamp, table_index, id)：table_index 为 0
+表示 health_check_log，1 表示分区表。分区之间时间不重叠，同一时间戳最多同时出现在 health_check_log
+与一个分区中，因此该三元组全局唯一。
+"""
+import calendar
+import datetime
+import heapq
+import itertools
+import threading
+import time
+from collections import namedtuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import sqlalchemy as sa
+from flask import current_app
+from sqlalchemy import inspect as sa_inspect
+
+from .extensions import db
+from .models import HealthCheckLog
+
+PARTITION_PREFIX = 'health_check_log_p'
+PARTITION_CACHE_SECONDS = 60
+LOG_COLUMNS = (
+    'id',
+    'site_name',
+    'timestamp',
+    'status',
+    'response_time_seconds',
+    'http_status_code',
+    'error_detail',
+)
+
+BASE_TABLE_INDEX = 0
+PARTITION_TABLE_INDEX = 1
+# 导出与分页返回的行在 LOG_COLUMNS 之后附带 table_index，用于构造游标
+CURSOR_COLUMNS = LOG_COLUMNS + ('table_index',)
+
+Partition = namedtuple('Partition', ['name', 'start', 'end', 'table'])
+
+# 分区表使用独立的 MetaData，避免被 db.create_all() 与迁移脚本当作固定表结构管理
+_partition_metadata = sa.MetaData()
+_partition_lock = threading.Lock()
+_partitions: Dict[str, Partition] = {}
+_partitions_loaded_at = 0.0
+
+
+def partitioning_mode() -> Optional[str]:
+    mode = (current_app.config.get('LOG_PARTITIONING') or '').strip().lower()
+    return mode if mode in ('month', 'day') else None
+
+
+def _partition_range(timestamp, mode):
+    if mode == 'day':
+        start = datetime.datetime(timestamp.year, timestamp.month, timestamp.day)
+        return start, start + datetime.timedelta(days=1), start.strftime('%Y%m%d')
+    start = datetime.datetime(timestamp.year, timestamp.month, 1)
+    days_in_month = calendar.monthrange(timestamp.year, timestamp.month)[1]
+    return start, start + datetime.timedelta(days=days_in_month), start.strftime('%Y%m')
+
+
+def _parse_partition_name(name):
+    suffix = name[len(PARTITION_PREFIX):]
+    try:
+        if len(suffix) == 8:
+            return _partition_range(datetime.datetime.strptime(suffix, '%Y%m%d'), 'day')[:2]
+        if len(suffix) == 6:
+            return _partition_range(datetime.datetime.strptime(suffix, '%Y%m'), 'month')[:2]
+    except ValueError:
+        return None
+    return None
+
+
+def _partition_table(name):
+    table = _partition_metadata.tables.get(name)
+    if table is None:
+        table = sa.Table(
+            name,
+            _partition_metadata,
+            sa.Column('id', sa.Integer, primary_key=True, autoincrement=True),
+            sa.Column('site_name', sa.String, nullable=False),
+            sa.Column('timestamp', sa.DateTime, nullable=False),
+            sa.Column('status', sa.String, nullable=False),
+            sa.Column('response_time_seconds', sa.Float),
+            sa.Column('http_status_code', sa.Integer, nullable=True),
+            sa.Column('error_detail', sa.String(500), nullable=True),
+            sa.Index(f'ix_{name}_site_timestamp', 'site_name', 'timestamp'),
+            sa.Index(f'ix_{name}_timestamp', 'timestamp'),
+        )
+    return table
+
+
+def _load_partitions(force=False):
+    global _partitions_loaded_at
+    with _partition_lock:
+        if not force and _partitions_loaded_at and time.monotonic() - _partitions_loaded_at < PARTITION_CACHE_SECONDS:
+            return
+        found = {}
+        for name in sa_inspect(db.engine).get_table_names():
+            if not name.startswith(PARTITION_PREFIX):
+                continue
+            bounds = _parse_partition_name(name)
+            if bounds:
+                found[name] = Partition(name, bounds[0], bounds[1], _partition_table(name))
+        _partitions.clear()
+        _partitions.update(found)
+        _partitions_loaded_at = time.monotonic()
+
+
+def list_partitions(start=None, end=None) -> List[Partition]:
+    """按时间升序返回与 [start, end] 重叠的分区（时间为 UTC naive）；关闭分区后已有的分区仍会返回。"""
+    start = to_naive_utc(start)
+    end = to_naive_utc(end)
+    # 开启分区时，查询范围超出已知的最新分区则强制刷新，以发现其他进程新建的分区
+    _load_partitions(
+        force=bool(partitioning_mode()) and end is not None and not any(p.end > end for p in _partitions.values())
+    )
+    return sorted(
+        (
+            p for p in _partitions.values()
+            if (start is None or p.end > start) and (end is None or p.start <= end)
+        ),
+        key=lambda p: p.start,
+    )
+
+
+def _ensure_partition(timestamp) -> Partition:
+    start, end, suffix = _partition_range(timestamp, partitioning_mode())
+    name = f'{PARTITION_PREFIX}{suffix}'
+    partition = _partitions.get(name)
+    if partition is not None:
+        return partition
+    table = _partition_table(name)
+    try:
+        table.create(bind=db.session.connection(), checkfirst=True)
+    except sa.exc.OperationalError:
+        # 其他进程可能已同时创建了同一分区；SQLite 中单条语句失败不会中断当前事务
+        pass
+    partition = Partition(name, start, end, table)
+    with _partition_lock:
+        _partitions[name] = partition
+    return partition
+
+
+def drop_partition(partition: Partition) -> None:
+    partition.table.drop(bind=db.engine, checkfirst=True)
+    with _partition_lock:
+        _partitions.pop(partition.name, None)
+
+
+def to_naive_utc(value):
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def log_tables(start=None, end=None) -> List[sa.Table]:
+    """返回可能包含 [start, end] 范围内日志的物理表，包含未分区的 health_check_log。"""
+    return [HealthCheckLog.__table__] + [p.table for p in list_partitions(start, end)]
+
+
+def log_source(start=None, end=None, site_names: Optional[Iterable[str]] = None):
+    """返回日志查询的 FROM 源，字段与 health_check_log 一致。
+
+    没有分区表时直接返回 health_check_log；否则返回只包含重叠分区的 UNION ALL 子查询，
+    时间与站点条件会下推到每个分区内部（调用方仍应在外层附加自己的过滤条件）。
+    """
+    tables = log_tables(start, end)
+    if len(tables) == 1:
+        return tables[0]
+    start = to_naive_utc(start)
+    end = to_naive_utc(end)
+    site_names = list(site_names) if site_names is not None else None
+    selects = []
+    for table in tables:
+        stmt = sa.select(*[table.c[name] for name in LOG_COLUMNS])
+        if start is not None:
+            stmt = stmt.where(table.c.timestamp >= start)
+        if end is not None:
+            stmt = stmt.where(table.c.timestamp <= end)
+        if site_names is not None:
+            stmt = stmt.where(table.c.site_name.in_(site_names))
+        selects.append(stmt)
+    return sa.union_all(*selects).subquery('health_check_log_all')
+
+
+def write_logs(rows: List[Dict[str, Any]]) -> None:
+    """在当前会话中写入一批检查日志（随会话一起提交）。"""
+    if not rows:
+        return
+    if not partitioning_mode():
+        db.session.execute(sa.insert(HealthCheckLog.__table__), rows)
+        return
+    grouped: Dict[str, List[Dict[str, Any]]] = {}
+    tables = {}
+    for row in rows:
+        partition = _ensure_partition(row['timestamp'])
+        grouped.setdefault(partition.name, []).append(row)
+        tables[partition.name] = partition.table
+    for name, partition_rows in grouped.items():
+        db.session.execute(sa.insert(tables[name]), partition_rows)
+
+
+def table_index(table) -> int:
+    return BASE_TABLE_INDEX if table is HealthCheckLog.__table__ else PARTITION_TABLE_INDEX
+
+
+def cursor_key(row):
+    """跨表排序与分页游标的键：(timestamp, table_index, id)。"""
+    return row.timestamp, row.table_index, row.id
+
+
+def _cursor_select(table):
+    return sa.select(*[table.c[name] for name in LOG_COLUMNS], sa.literal(table_index(table)).label('table_index'))
+
+
+def earliest_log_time(site_names: Iterable[str]):
+    site_names = list(site_names)
+    earliest = None
+    for table in log_tables():
+        value = db.session.execute(
+            sa.select(sa.func.min(table.c.timestamp)).where(table.c.site_name.in_(site_names))
+        ).scalar()
+        if value is not None and (earliest is None or value < earliest):
+            earliest = value
+        if earliest is not None and table is not HealthCheckLog.__table__:
+            # 分区按时间升序排列，第一个有数据的分区即为最早数据
+            break
+    return earliest
+
+
+def latest_logs(site_names: Iterable[str]) -> Dict[str, Any]:
+    """返回每个站点最新的一条日志（Row 对象），用于启动时预热状态。"""
+    site_names = list(site_names)
+    latest: Dict[str, Any] = {}
+    tables = [HealthCheckLog.__table__] + [p.table for p in reversed(list_partitions())]
+    found_in_partition = set()
+    for table in tables:
+        # health_check_log 中的数据可能早于任意分区，只有在分区中找到的站点才无需再查更旧的分区
+        pending = [name for name in site_names if name not in found_in_partition]
+        if not pending:
+            break
+        subquery = sa.select(
+            table.c.site_name,
+            sa.func.max(table.c.timestamp).label('max_timestamp'),
+        ).where(table.c.site_name.in_(pending)).group_by(table.c.site_name).subquery()
+        rows = db.session.execute(
+            sa.select(table).join(
+                subquery,
+                sa.and_(
+                    table.c.site_name == subquery.c.site_name,
+                    table.c.timestamp == subquery.c.max_timestamp,
+                ),
+            )
+        ).all()
+        for row in rows:
+            current = latest.get(row.site_name)
+            if current is None or row.timestamp > current.timestamp:
+                latest[row.site_name] = row
+            if table is not HealthCheckLog.__table__:
+                found_in_partition.add(row.site_name)
+    return latest
+
+
+def recent_logs_by_site(site_names: Iterable[str], limit: int, since=None) -> Dict[str, List[Any]]:
+    """返回每个站点最近 limit 条日志（按时间倒序），用于启动时重建滑动窗口。
+
+    每张表只执行一次 ROW_NUMBER() OVER (PARTITION BY site_name ORDER BY timestamp DESC) 查询
+    （需要支持窗口函数的数据库，见 timeline_sql.supported）。since 限定读取范围，
+    窗口函数只需要为范围内的日志编号，耗时与表的总行数无关。health_check_log 的时间范围可能与任意分区重叠，
+    总是读取；分区从最新的向前查找，直到每个站点从分区中取满，最后按 (timestamp, table_index, id) 合并。
+    """
+    site_names = list(site_names)
+    since = to_naive_utc(since)
+    candidates: Dict[str, List[Any]] = {name: [] for name in site_names}
+    from_partitions = dict.fromkeys(site_names, 0)
+    tables = [HealthCheckLog.__table__] + [p.table for p in reversed(list_partitions(since))]
+    for table in tables:
+        pending = [name for name in site_names if from_partitions[name] < limit]
+        if not pending:
+            break
+        row_number = sa.func.row_number().over(
+            partition_by=table.c.site_name,
+            order_by=table.c.timestamp.desc(),
+        ).label('row_number')
+        stmt = _cursor_select(table).add_columns(row_number).where(table.c.site_name.in_(pending))
+        if since is not None:
+            stmt = stmt.where(table.c.timestamp >= since)
+        ranked = stmt.subquery()
+        rows = db.session.execute(
+            sa.select(*[ranked.c[name] for name in CURSOR_COLUMNS]).where(ranked.c.row_number <= limit)
+        ).all()
+        for row in rows:
+            candidates[row.site_name].append(row)
+            if table is not HealthCheckLog.__table__:
+                from_partitions[row.site_name] += 1
+    return {
+        name: sorted(rows, key=cursor_key, reverse=True)[:limit]
+        for name, rows in candidates.items()
+    }
+
+
+def latest_log_times(site_names: Iterable[str]) -> Dict[str, datetime.datetime]:
+    """返回每个站点最新一条日志的时间（只走 (site_name, timestamp) 索引，不读取整行）。"""
+    site_names = list(site_names)
+    latest: Dict[str, datetime.datetime] = {}
+    tables = [HealthCheckLog.__table__] + [p.table for p in reversed(list_partitions())]
+    found_in_partition = set()
+    for table in tables:
+        pending = [name for name in site_names if name not in found_in_partition]
+        if not pending:
+            break
+        rows = db.session.execute(
+            sa.select(table.c.site_name, sa.func.max(table.c.timestamp))
+            .where(table.c.site_name.in_(pending))
+            .group_by(table.c.site_name)
+        ).all()
+        for site_name, timestamp in rows:
+            if timestamp is None:
+                continue
+            if site_name not in latest or timestamp > latest[site_name]:
+                latest[site_name] = timestamp
+            if table is not HealthCheckLog.__table__:
+                # 分区从新到旧遍历，站点在较新的分区中出现后无需再查更旧的分区
+                found_in_partition.add(site_name)
+    return latest
+
+
+def _before_cursor(table, before):
+    """table 中按 (timestamp, table_index, id) 排在游标 before 之前的行。"""
+    before_ts, before_index, before_id = before
+    index = table_index(table)
+    if index > before_index:
+        return table.c.timestamp < before_ts
+    if index < before_index:
+        return table.c.timestamp <= before_ts
+    return sa.or_(table.c.timestamp < before_ts, sa.and_(table.c.timestamp == before_ts, table.c.id < before_id))
+
+
+def _after_cursor(table, after):
+    """table 中按 (timestamp, table_index, id) 排在游标 after 之后的行。"""
+    after_ts, after_index, after_id = after
+    index = table_index(table)
+    # 前导的 timestamp 范围条件让查询可以沿时间索引做范围扫描
+    if index < after_index:
+        return table.c.timestamp > after_ts
+    if index > after_index:
+        return table.c.timestamp >= after_ts
+    return sa.and_(table.c.timestamp >= after_ts, sa.or_(table.c.timestamp > after_ts, table.c.id > after_id))
+
+
+def recent_logs(limit=50, before=None, site_name=None, status=None) -> List[Any]:
+    """按时间倒序分页读取日志，before 为上一页最后一条的 (timestamp, table_index, id)。
+    health_check_log 与从最新开始的分区逐个读取，分区凑满一页即停止，开销与页大小而不是总行数相关。
+    """
+    results: List[Any] = []
+    partitions = list_partitions(end=before[0] if before else None)
+    from_partitions = 0
+    for table in [HealthCheckLog.__table__] + [p.table for p in reversed(partitions)]:
+        if from_partitions >= limit:
+            break
+        stmt = _cursor_select(table)
+        if before:
+            stmt = stmt.where(_before_cursor(table, before))
+        if site_name:
+            stmt = stmt.where(table.c.site_name == site_name)
+        if status:
+            stmt = stmt.where(table.c.status == status)
+        rows = db.session.execute(stmt.order_by(table.c.timestamp.desc(), table.c.id.desc()).limit(limit)).all()
+        results.extend(rows)
+        if table is not HealthCheckLog.__table__:
+            from_partitions += len(rows)
+    results.sort(key=cursor_key, reverse=True)
+    return results[:limit]
+
+
+EXPORT_BATCH_SIZE = 5000
+
+
+def _iter_table_logs(table, site_names, start, end, after, batch_size):
+    """按 (timestamp, id) 升序分批读取单张表，每批是一次独立的键集分页查询，不长时间占用读事务。"""
+    while True:
+        stmt = _cursor_select(table)
+        if site_names is not None:
+            stmt = stmt.where(table.c.site_name.in_(site_names))
+        if start is not None:
+            stmt = stmt.where(table.c.timestamp >= start)
+        if end is not None:
+            stmt = stmt.where(table.c.timestamp <= end)
+        if after is not None:
+            stmt = stmt.where(_after_cursor(table, after))
+        rows = db.session.execute(stmt.order_by(table.c.timestamp, table.c.id).limit(batch_size)).all()
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        after = cursor_key(rows[-1])
+
+
+def iter_logs(site_names: Optional[Iterable[str]] = None, start=None, end=None, after=None,
+              batch_size=EXPORT_BATCH_SIZE) -> Iterator[Any]:
+    """按 (timestamp, table_index, id) 升序逐条返回日志（LOG_COLUMNS 之后附带 table_index），用于流式导出；
+    after 为已导出的最后一条的 (timestamp, table_index, id)。内存占用只与 batch_size 相关。
+    分区之间时间不重叠，依次读取；health_check_log 中的数据可能与任意分区重叠，两路按游标键归并。
+    """
+    site_names = list(site_names) if site_names is not None else None
+    start = to_naive_utc(start)
+    end = to_naive_utc(end)
+    lower = start
+    if after is not None and (lower is None or after[0] > lower):
+        lower = after[0]
+    partitions = list_partitions(lower, end)
+    base_rows = _iter_table_logs(HealthCheckLog.__table__, site_names, start, end, after, batch_size)
+    if not partitions:
+        return base_rows
+    partition_rows = itertools.chain.from_iterable(
+        _iter_table_logs(p.table, site_names, start, end, after, batch_size) for p in partitions
+    )
+    return heapq.merge(base_rows, partition_rows, key=cursor_key)
+
+
+def expired_partitions(cutoff) -> List[Partition]:
+    """整个时间范围都早于 cutoff 的分区，可直接 DROP。"""
+    _load_partitions(force=True)
+    return [p for p in list_partitions() if p.end <= cutoff]
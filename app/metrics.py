@@ -0,0 +1,300 @@
+# web-monitor/app/metrics.py
+"""
+监控服务自身的运行指标，/metrics 以 Prometheus 文本格式输出。
+
+指标在模块加载时定义，标签取值固定（检查结果、阶段、数据库操作等），已知标签组合预先创建，
+记录一次只是一次 bisect 与几次加法；站点级序列（site 标签）默认关闭，设置 METRICS_SITE_SERIES=true 后
+才按站点记录，避免站点很多时序列数膨胀。队列深度等瞬时值在输出时通过回调读取，不在热路径上维护。
+
+使用独立检查进程时，检查相关指标由检查进程在每轮检查后写入 METRICS_PATH，Web 进程输出该文件的内容
+与自身的实时推送指标。
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CYCLE_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+LOCK_BUCKETS = (1e-6, 1e-5, 1e-4, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5)
+
+_registry: List['_Metric'] = []
+site_series_enabled = False
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 preset: Iterable[Tuple] = (), checker: bool = True):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # checker=True：由执行检查的进程记录（独立检查进程模式下写入共享文件）
+        self.checker = checker
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple, object] = {}
+        for labels in preset:
+            self._children[tuple(labels)] = self._new_child()
+        _registry.append(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _child(self, labels: Tuple):
+        child = self._children.get(labels)
+        if child is None:
+            child = self._children.setdefault(labels, self._new_child())
+        return child
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        with self._lock:
+            lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def _new_child(self):
+        return [0]
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._child(labels)[0] += amount
+
+    def _samples(self):
+        return [
+            f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(child[0])}'
+            for labels, child in self._children.items()
+        ]
+
+
+class Gauge(_Metric):
+    """瞬时值；指定 callback 时在输出时调用，返回 {标签取值元组: 数值}。"""
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), preset=(), checker=True,
+                 callback: Optional[Callable[[], Dict[Tuple, float]]] = None):
+        self.callback = callback
+        super().__init__(name, documentation, labelnames, preset, checker)
+
+    def _new_child(self):
+        return [0]
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._child(labels)[0] = value
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._child(labels)[0] += amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def _samples(self):
+        if self.callback is not None:
+            try:
+                values = self.callback()
+            except Exception:
+                values = {}
+        else:
+            values = {labels: child[0] for labels, child in self._children.items()}
+        return [
+            f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+            for labels, value in values.items()
+        ]
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, preset=(), checker=True):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, preset, checker)
+
+    def _new_child(self):
+        # 各桶（最后一个为 +Inf）的非累计计数与观测值之和
+        return [[0] * (len(self.buckets) + 1), 0.0]
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._child(labels)
+            child[0][index] += 1
+            child[1] += value
+
+    def _samples(self):
+        lines = []
+        for labels, (counts, total) in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}')
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_text} {_format_value(total)}')
+            lines.append(f'{self.name}_count{label_text} {cumulative}')
+        return lines
+
+
+class TimedLock:
+    """threading.Lock 的包装，记录获取锁的等待时间与持有时间（只支持 with 用法）。"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._acquired_at = 0.0
+
+    def __enter__(self):
+        started = time.perf_counter()
+        self._lock.acquire()
+        self._acquired_at = acquired = time.perf_counter()
+        LOCK_WAIT.observe(acquired - started, self.name)
+        return self
+
+    def __exit__(self, *exc_info):
+        held = time.perf_counter() - self._acquired_at
+        self._lock.release()
+        LOCK_HOLD.observe(held, self.name)
+        return False
+
+
+PROBE_RESULTS = ('ok', 'slow', 'http_error', 'timeout', 'connection_error', 'other')
+PROBE_PHASES = ('headers', 'total')
+DB_OPERATIONS = ('logs', 'segments', 'alert_state')
+
+CHECK_CYCLE_DURATION = Histogram(
+    'webmonitor_check_cycle_duration_seconds', '一轮健康检查的耗时', buckets=CYCLE_BUCKETS, preset=[()],
+)
+CHECK_CYCLE_SITES = Gauge('webmonitor_check_cycle_sites', '最近一轮检查的站点数')
+PROBE_DURATION = Histogram(
+    'webmonitor_probe_duration_seconds',
+    '单次 HTTP 检查的耗时（headers: 收到响应头，total: 读取完整响应）',
+    ['phase'], preset=[(phase,) for phase in PROBE_PHASES],
+)
+PROBE_RESULTS_TOTAL = Counter(
+    'webmonitor_probe_results_total', '检查结果（含快速重试后的最终结果）',
+    ['result'], preset=[(result,) for result in PROBE_RESULTS],
+)
+SITE_PROBE_DURATION = Histogram(
+    'webmonitor_site_probe_duration_seconds', '各站点 HTTP 检查的耗时（METRICS_SITE_SERIES=true 时记录）',
+    ['site', 'phase'],
+)
+SITE_PROBE_RESULTS_TOTAL = Counter(
+    'webmonitor_site_probe_results_total', '各站点的检查结果（METRICS_SITE_SERIES=true 时记录）', ['site', 'result'],
+)
+QUICK_RETRIES_TOTAL = Counter(
+    'webmonitor_quick_retries_total', '检查失败后的快速重试次数', ['result'], preset=[('success',), ('failure',)],
+)
+NOTIFICATION_DURATION = Histogram(
+    'webmonitor_notification_duration_seconds', '通知渠道发送耗时', ['channel', 'type'],
+)
+NOTIFICATION_RESULTS_TOTAL = Counter(
+    'webmonitor_notification_results_total', '通知渠道发送结果', ['channel', 'type', 'result'],
+)
+NOTIFICATIONS_IN_FLIGHT = Gauge('webmonitor_notifications_in_flight', '正在发送的通知数', preset=[()])
+LOCK_WAIT = Histogram(
+    'webmonitor_lock_wait_seconds', '等待获取锁的时间', ['lock'], buckets=LOCK_BUCKETS, preset=[('status_lock',)],
+)
+LOCK_HOLD = Histogram(
+    'webmonitor_lock_hold_seconds', '持有锁的时间', ['lock'], buckets=LOCK_BUCKETS, preset=[('status_lock',)],
+)
+DB_FLUSH_DURATION = Histogram(
+    'webmonitor_db_flush_duration_seconds', '每轮检查写入数据库（含提交）的耗时',
+    ['operation'], preset=[(operation,) for operation in DB_OPERATIONS],
+)
+DB_FLUSH_FAILURES_TOTAL = Counter(
+    'webmonitor_db_flush_failures_total', '每轮检查写入数据库失败（已回滚）的次数',
+    ['operation'], preset=[(operation,) for operation in DB_OPERATIONS],
+)
+
+
+def _stream_queue_depths():
+    from .status_stream import hub
+
+    subscribers, queued, deepest = hub.queue_depths()
+    return {('subscribers',): subscribers, ('queued_events',): queued, ('max_queued_events',): deepest}
+
+
+STREAM_QUEUES = Gauge(
+    'webmonitor_stream_queue', '/stream/status 的连接数与待发送事件数', ['kind'],
+    checker=False, callback=_stream_queue_depths,
+)
+
+
+def configure(config):
+    global site_series_enabled
+    site_series_enabled = bool(config.get('METRICS_SITE_SERIES', False))
+
+
+def observe_probe(site_name: Optional[str], headers_seconds: float, total_seconds: float):
+    """记录一次收到响应的 HTTP 检查（含快速重试）的各阶段耗时。"""
+    PROBE_DURATION.observe(headers_seconds, 'headers')
+    PROBE_DURATION.observe(total_seconds, 'total')
+    if site_series_enabled and site_name is not None:
+        SITE_PROBE_DURATION.observe(headers_seconds, site_name, 'headers')
+        SITE_PROBE_DURATION.observe(total_seconds, site_name, 'total')
+
+
+def count_probe_result(site_name: str, result: str):
+    """记录一个站点本轮检查的最终结果（PROBE_RESULTS 之一）。"""
+    PROBE_RESULTS_TOTAL.inc(result)
+    if site_series_enabled:
+        SITE_PROBE_RESULTS_TOTAL.inc(site_name, result)
+
+
+def render(checker: bool = True, web: bool = True) -> str:
+    lines = []
+    for metric in _registry:
+        if (checker and metric.checker) or (web and not metric.checker):
+            lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def write_file(path: str):
+    """独立检查进程：把检查相关指标原子地写入文件，供 Web 进程的 /metrics 输出。"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(render(checker=True, web=False))
+        os.replace(temp_path, path)
+    except OSError as e:
+        logger.exception("写入指标文件失败: %s", e)
+
+
+def read_file(path: str) -> str:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        return ''
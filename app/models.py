@@ -50,10 +50,127 @@ class HealthCheckLog(db.Model):
     http_status_code = db.Column(db.Integer, nullable=True)
     error_detail = db.Column(db.String(500), nullable=True)
 
+    __table_args__ = (
+        # 历史查询按 (站点, 时间) 排序读取
+        db.Index('ix_health_check_log_site_timestamp', 'site_name', 'timestamp'),
+    )
+
     def __repr__(self):
         return f'<HealthCheckLog {self.site_name} at {self.timestamp}>'
 
 
+class HealthCheckRollup(db.Model):
+    """按固定时间桶聚合的检查结果，原始日志过期后用于长期统计。"""
+    __tablename__ = 'health_check_rollup'
+
+    RESOLUTION_MINUTE = 60
+    RESOLUTION_HOUR = 3600
+    RESOLUTION_DAY = 86400
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    site_name = db.Column(db.String, nullable=False)
+    bucket_seconds = db.Column(db.Integer, nullable=False)
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    total_count = db.Column(db.Integer, nullable=False, default=0)
+    up_count = db.Column(db.Integer, nullable=False, default=0)
+    slow_count = db.Column(db.Integer, nullable=False, default=0)
+    down_count = db.Column(db.Integer, nullable=False, default=0)
+    response_time_sum = db.Column(db.Float, nullable=False, default=0.0)
+    response_time_count = db.Column(db.Integer, nullable=False, default=0)
+    response_time_min = db.Column(db.Float, nullable=True)
+    response_time_max = db.Column(db.Float, nullable=True)
+    # 桶内响应时间的分位数草图（见 app/sketches.py），可合并计算任意范围的 P95/P99
+    latency_sketch = db.Column(db.LargeBinary, nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('site_name', 'bucket_seconds', 'bucket_start', name='uq_health_check_rollup_bucket'),
+        db.Index('ix_health_check_rollup_resolution_bucket', 'bucket_seconds', 'bucket_start'),
+    )
+
+    def __repr__(self):
+        return f'<HealthCheckRollup {self.site_name} {self.bucket_seconds}s at {self.bucket_start}>'
+
+
+class StatusSegment(db.Model):
+    """站点连续保持同一状态的区间（游程），由健康检查任务实时延长或切换。
+    end_time 为该区间最后一次检查的时间，检查间隔超过阈值时也会开始新的区间。
+    """
+    __tablename__ = 'status_segment'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    site_name = db.Column(db.String, nullable=False)
+    status = db.Column(db.String, nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False)
+    check_count = db.Column(db.Integer, nullable=False, default=1)
+    first_reason = db.Column(db.String(500), nullable=True)
+    http_status_code = db.Column(db.Integer, nullable=True)
+    response_time_sum = db.Column(db.Float, nullable=False, default=0.0)
+    response_time_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_status_segment_site_start', 'site_name', 'start_time'),
+        db.Index('ix_status_segment_site_end', 'site_name', 'end_time'),
+    )
+
+    def __repr__(self):
+        return f'<StatusSegment {self.site_name} {self.status} {self.start_time} - {self.end_time}>'
+
+
+class Incident(db.Model):
+    """宕机 / 慢响应事件，由健康检查任务在状态进入异常时创建、恢复时关闭。
+    end_time 为空表示事件仍在持续。
+    """
+    __tablename__ = 'incident'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    site_name = db.Column(db.String, nullable=False)
+    status = db.Column(db.String(16), nullable=False)  # 'down' | 'slow'
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=True)
+    last_seen = db.Column(db.DateTime, nullable=False)
+    check_count = db.Column(db.Integer, nullable=False, default=1)
+    reasons = db.Column(db.Text, nullable=True)  # JSON 数组，按出现顺序去重
+    http_status_code = db.Column(db.Integer, nullable=True)
+    peak_response_time = db.Column(db.Float, nullable=True)
+    notification_sent = db.Column(db.Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        db.Index('ix_incident_site_start', 'site_name', 'start_time'),
+        db.Index('ix_incident_site_end', 'site_name', 'end_time'),
+        db.Index('ix_incident_start', 'start_time'),
+    )
+
+    def __repr__(self):
+        return f'<Incident {self.site_name} {self.status} {self.start_time} - {self.end_time or "ongoing"}>'
+
+
+class SiteAlertState(db.Model):
+    """站点告警判定状态的检查点（连续计数、滑动窗口、通知标记与告警降噪时间），
+    由健康检查任务每轮增量写入，服务启动时读回，见 app/alert_state.py。
+    """
+    __tablename__ = 'site_alert_state'
+
+    site_name = db.Column(db.String, primary_key=True)
+    state = db.Column(db.Text, nullable=False)  # JSON，与 site_statuses 中的条目结构一致
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SiteAlertState {self.site_name} at {self.updated_at}>'
+
+
+class AppBootstrap(db.Model):
+    """启动初始化标记（单行），见 app/startup.py。"""
+    __tablename__ = 'app_bootstrap'
+
+    id = db.Column(db.Integer, primary_key=True)
+    marker = db.Column(db.String(64), nullable=False)
+    completed_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f'<AppBootstrap {self.marker[:12]} at {self.completed_at}>'
+
+
 class PasswordResetToken(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
@@ -0,0 +1,213 @@
+# web-monitor/app/profiling.py
+"""
+按需开启的性能分析：健康检查周期（check_cycle）与 /api/history 请求（history）。
+
+PROFILING_ENABLED=true 后两种触发方式可单独或同时使用：
+
+- 抽样：PROFILE_EVERY_N=N 时每 N 次执行用 cProfile 完整分析一次，保存为 .prof（pstats 格式，
+  可用 `python -m pstats`、snakeviz 等查看）；
+- 慢执行捕获：PROFILE_CYCLE_SLOW_SECONDS / PROFILE_HISTORY_SLOW_SECONDS 大于 0 时，每次执行期间由一个
+  共享的后台线程每 PROFILE_SAMPLE_INTERVAL_MS 毫秒采样一次调用栈（开销远小于 cProfile），耗时超过阈值时
+  保存为 .collapsed（折叠栈格式，可直接交给 flamegraph.pl 或 speedscope 生成火焰图），未超过则丢弃。
+
+文件写入 PROFILE_DIR（默认 instance/profiles），每个分析对象只保留最新的 PROFILE_KEEP 个，
+后台“系统设置 → 性能分析”页面可查看与下载。只分析执行该任务的线程，并发发送通知的线程不在其中，
+等待通知发送完成的时间体现在 _dispatch_notifications 中。
+"""
+import cProfile
+import datetime
+import functools
+import itertools
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# 分析对象 -> 慢执行阈值的配置项
+TARGETS = {
+    'check_cycle': 'PROFILE_CYCLE_SLOW_SECONDS',
+    'history': 'PROFILE_HISTORY_SLOW_SECONDS',
+}
+TARGET_LABELS = {'check_cycle': '健康检查周期', 'history': '/api/history 请求'}
+REASON_LABELS = {'sampled': '抽样', 'slow': '慢执行'}
+FILENAME_PATTERN = re.compile(
+    r'^(?P<stamp>\d{8}-\d{6}-\d{6})_(?P<target>[a-z_]+)_(?P<ms>\d+)ms_(?P<reason>sampled|slow)\.(?P<ext>prof|collapsed)$'
+)
+MAX_STACK_DEPTH = 200
+
+_counters: Dict[str, itertools.count] = {target: itertools.count(1) for target in TARGETS}
+
+
+def _frame_label(code) -> str:
+    path = code.co_filename.replace('\\', '/').split('/')
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> str:
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class _StackSampler:
+    """共享的调用栈采样线程：只在有线程登记时采样，登记的线程各自累计 {折叠栈: 次数}。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stacks: Dict[int, Counter] = {}
+        self._thread: Optional[threading.Thread] = None
+        self.interval = 0.01
+
+    def register(self, thread_id: int, interval: float):
+        with self._lock:
+            self._stacks[thread_id] = Counter()
+            self.interval = interval
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def unregister(self, thread_id: int) -> Counter:
+        with self._lock:
+            return self._stacks.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            with self._lock:
+                active = bool(self._stacks)
+                if not active:
+                    self._wakeup.clear()
+            if not active:
+                self._wakeup.wait()
+                continue
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, stacks in self._stacks.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[_collapse(frame)] += 1
+
+
+_sampler = _StackSampler()
+
+
+def profile_dir(config) -> str:
+    return config.get('PROFILE_DIR') or os.path.join(current_app.instance_path, 'profiles')
+
+
+def _write(config, target: str, reason: str, seconds: float, ext: str, write):
+    directory = profile_dir(config)
+    stamp = datetime.datetime.utcnow().strftime('%Y%m%d-%H%M%S-%f')
+    filename = f"{stamp}_{target}_{int(seconds * 1000)}ms_{reason}.{ext}"
+    try:
+        os.makedirs(directory, exist_ok=True)
+        write(os.path.join(directory, filename))
+        _rotate(directory, target, int(config.get('PROFILE_KEEP', 20)))
+    except OSError as e:
+        logger.exception("写入性能分析文件失败: %s", e)
+
+
+def _write_collapsed(stacks: Counter):
+    def write(path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(stacks.items()):
+                f.write(f"{stack} {count}\n")
+    return write
+
+
+def _rotate(directory: str, target: str, keep: int):
+    files = [profile for profile in list_profiles(directory) if profile['target'] == target]
+    for profile in files[max(keep, 1):]:
+        try:
+            os.remove(os.path.join(directory, profile['filename']))
+        except OSError:
+            pass
+
+
+@contextmanager
+def capture(target: str, config):
+    """分析一次 target 的执行（未开启或本次不需要分析时直接执行）。"""
+    if not config.get('PROFILING_ENABLED'):
+        yield
+        return
+    every = int(config.get('PROFILE_EVERY_N', 0) or 0)
+    slow_seconds = float(config.get(TARGETS[target], 0) or 0)
+    sampled = every > 0 and next(_counters[target]) % every == 0
+
+    profiler = None
+    thread_id = None
+    if sampled:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # 当前线程已有其他分析器
+            profiler = None
+    elif slow_seconds > 0:
+        thread_id = threading.get_ident()
+        _sampler.register(thread_id, max(float(config.get('PROFILE_SAMPLE_INTERVAL_MS', 10)), 1.0) / 1000)
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        if profiler is not None:
+            profiler.disable()
+            _write(config, target, 'sampled', seconds, 'prof', profiler.dump_stats)
+        elif thread_id is not None:
+            stacks = _sampler.unregister(thread_id)
+            if seconds >= slow_seconds and stacks:
+                _write(config, target, 'slow', seconds, 'collapsed', _write_collapsed(stacks))
+
+
+def profiled(target: str):
+    """视图函数装饰器：按当前应用的配置分析请求。"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            with capture(target, current_app.config):
+                return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def list_profiles(directory: str) -> List[dict]:
+    """目录中的分析文件，按时间从新到旧排列。"""
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    profiles = []
+    for name in names:
+        match = FILENAME_PATTERN.match(name)
+        if not match:
+            continue
+        try:
+            size = os.path.getsize(os.path.join(directory, name))
+        except OSError:
+            continue
+        profiles.append({
+            'filename': name,
+            'created_at': datetime.datetime.strptime(match.group('stamp'), '%Y%m%d-%H%M%S-%f'),
+            'target': match.group('target'),
+            'duration_ms': int(match.group('ms')),
+            'reason': match.group('reason'),
+            'format': match.group('ext'),
+            'size': size,
+        })
+    profiles.sort(key=lambda profile: profile['filename'], reverse=True)
+    return profiles
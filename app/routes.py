@@ -1,14 +1,38 @@
 # web-monitor/app/routes.py
+import csv
 import datetime
+import hashlib
+import io
+import itertools
 import json
+import math
 from datetime import timezone
-from flask import Blueprint, jsonify, render_template, current_app, flash, url_for, session, redirect, request
+from flask import (
+    Blueprint, abort, jsonify, render_template, current_app, flash, url_for, session, redirect, request,
+    send_from_directory, stream_with_context
+)
 from flask_admin import AdminIndexView, BaseView, expose
 from flask_admin.menu import MenuLink
 from flask_admin.contrib.sqla import ModelView
 from flask_login import current_user, login_user, logout_user, login_required
+import sqlalchemy as sa
 from sqlalchemy import inspect as sa_inspect
 
+from . import (
+    archive,
+    config_sync,
+    history_cache,
+    history_format,
+    history_stats,
+    history_window,
+    log_store,
+    metrics,
+    profiling,
+    segments,
+    status_snapshot,
+    status_stream,
+    timeline_sql,
+)
 from .extensions import db, scheduler
 from .forms import (
     ChangePasswordForm,
@@ -18,15 +42,22 @@ from .forms import (
     NotificationChannelForm,
     PasswordResetForm,
 )
+from .incidents import incident_reason, incidents_between, list_incidents
 from .models import (
     HealthCheckLog,
+    HealthCheckRollup,
     MonitoringConfig,
     MonitoredSite,
     NotificationChannel,
     PasswordResetToken,
     User,
 )
-from .services import site_statuses, status_lock, send_management_notification
+from .services import (
+    history_max_days,
+    select_history_resolution,
+    send_management_notification,
+)
+from .sketches import RELATIVE_ACCURACY, merge_blobs
 
 from .utils import to_gmt8
 
@@ -233,6 +264,7 @@ class MonitoringSettingsView(BaseView):
                 flash('保存监控参数失败，请稍后重试。', 'danger')
             else:
                 config_record.apply_to_config(current_app.config)
+                config_sync.mark_applied(current_app, config_record)
                 try:
                     job = scheduler.get_job('check_health_job')
                     if job:
@@ -504,6 +536,116 @@ class HealthCheckLogView(SecureModelView):
     # 【可选但推荐】让后台日志按时间倒序排列，最新的在最前面
     column_default_sort = ('timestamp', True)
 
+
+def _split_log_cursor(cursor: str):
+    """日志游标 "<timestamp>_<table_index>_<id>" -> (时间字符串, table_index, id)，见 log_store。
+    兼容旧格式 "<timestamp>_<id>"，按 health_check_log 中的行处理。"""
+    parts = cursor.rsplit('_', 2)
+    if len(parts) == 2:
+        return parts[0], log_store.BASE_TABLE_INDEX, int(parts[1])
+    timestamp_str, index_str, id_str = parts
+    return timestamp_str, int(index_str), int(id_str)
+
+
+class PartitionedHealthCheckLogView(BaseView):
+    """开启日志分区后使用的只读日志列表：按 (时间, id) 游标翻页，只读取当前页涉及的分区。"""
+    menu_icon_type = 'fa'
+    menu_icon_value = 'fa-history'
+    page_size = 50
+    status_choices = ['正常', '访问过慢', '无法访问']
+
+    def is_accessible(self):
+        return current_user.is_authenticated
+
+    def inaccessible_callback(self, name, **kwargs):
+        return redirect(url_for('admin.login', next=request.url))
+
+    @expose('/')
+    def index(self):
+        site_name = (request.args.get('site') or '').strip() or None
+        status = request.args.get('status') or None
+        if status not in self.status_choices:
+            status = None
+        before = None
+        cursor = request.args.get('before')
+        if cursor:
+            try:
+                timestamp_str, index, log_id = _split_log_cursor(cursor)
+                before = (datetime.datetime.fromisoformat(timestamp_str), index, log_id)
+            except ValueError:
+                flash('翻页参数无效，已返回第一页。', 'warning')
+        logs = log_store.recent_logs(
+            limit=self.page_size + 1, before=before, site_name=site_name, status=status
+        )
+        next_cursor = None
+        if len(logs) > self.page_size:
+            logs = logs[:self.page_size]
+            last = logs[-1]
+            next_cursor = f"{last.timestamp.isoformat()}_{last.table_index}_{last.id}"
+        site_names = [site.name for site in MonitoredSite.query.order_by(MonitoredSite.name).all()]
+        return self.render(
+            'admin/partitioned_logs.html',
+            logs=[
+                {
+                    'site_name': log.site_name,
+                    'timestamp': to_gmt8(log.timestamp).strftime('%Y-%m-%d %H:%M:%S'),
+                    'status': log.status,
+                    'response_time_seconds': log.response_time_seconds,
+                    'http_status_code': log.http_status_code,
+                    'error_detail': log.error_detail,
+                }
+                for log in logs
+            ],
+            site_names=site_names,
+            status_choices=self.status_choices,
+            selected_site=site_name,
+            selected_status=status,
+            is_first_page=before is None,
+            next_cursor=next_cursor,
+            partitions=log_store.list_partitions(),
+        )
+
+
+class ProfilesView(BaseView):
+    """性能分析文件列表与下载（见 app/profiling.py）。"""
+    menu_icon_type = 'fa'
+    menu_icon_value = 'fa-tachometer'
+
+    def is_accessible(self):
+        return current_user.is_authenticated
+
+    def inaccessible_callback(self, name, **kwargs):
+        return redirect(url_for('admin.login', next=request.url))
+
+    @expose('/')
+    def index(self):
+        config = current_app.config
+        profiles = [
+            dict(
+                profile,
+                created_at=to_gmt8(profile['created_at']).strftime('%Y-%m-%d %H:%M:%S'),
+                target_label=profiling.TARGET_LABELS.get(profile['target'], profile['target']),
+                reason_label=profiling.REASON_LABELS.get(profile['reason'], profile['reason']),
+            )
+            for profile in profiling.list_profiles(profiling.profile_dir(config))
+        ]
+        return self.render(
+            'admin/profiles.html',
+            profiles=profiles,
+            enabled=config.get('PROFILING_ENABLED'),
+            every_n=config.get('PROFILE_EVERY_N'),
+            cycle_slow_seconds=config.get('PROFILE_CYCLE_SLOW_SECONDS'),
+            history_slow_seconds=config.get('PROFILE_HISTORY_SLOW_SECONDS'),
+            keep=config.get('PROFILE_KEEP'),
+        )
+
+    @expose('/download/<filename>')
+    def download(self, filename):
+        # 只允许下载分析任务生成的文件名，防止读取目录外的文件
+        if not profiling.FILENAME_PATTERN.match(filename):
+            abort(404)
+        return send_from_directory(profiling.profile_dir(current_app.config), filename, as_attachment=True)
+
     # 只在认证后才显示的链接类
 class AuthenticatedMenuLink(MenuLink):
     def is_accessible(self):
@@ -516,22 +658,100 @@ def dashboard():
     site_objects = MonitoredSite.query.filter_by(is_active=True).all()
     site_names = [site.name for site in site_objects]
     current_year = datetime.datetime.now().year
-    with status_lock:
-        # 使用 json.dumps 将 python 字典转换为 JSON 字符串
-        initial_statuses_json = json.dumps(site_statuses)
+    # 检查线程发布的状态快照已预先序列化，无需加锁
+    snapshot = status_snapshot.current()
     return render_template(
         'dashboard.html',
         sites=site_names,
         current_year=current_year,
         DATA_RETENTION_DAYS=current_app.config['DATA_RETENTION_DAYS'],
-        initial_statuses_json=initial_statuses_json
+        HISTORY_MAX_DAYS=history_max_days(current_app.config),
+        initial_statuses_json=snapshot.body,
+        initial_status_version=snapshot.version,
     )
 @main_bp.route('/health', methods=['GET'])
 def get_health_status():
-    with status_lock:
-        return jsonify(site_statuses)
+    """
+    站点当前状态（只含公开字段），读取检查线程发布的快照，不获取 status_lock。
+    默认返回 {站点: 状态}；带 since_version 时返回 {"version", "full", "sites", "removed"}，
+    sites 只包含该版本之后变化的站点，版本号无效时 full 为 true 并返回全部站点。
+    """
+    snapshot = status_snapshot.current()
+    since_version = request.args.get('since_version')
+    if since_version is None:
+        etag = f"status-{snapshot.version}"
+    else:
+        try:
+            since_version = int(since_version)
+        except ValueError:
+            return jsonify({"error": "无效的 since_version 参数"}), 400
+        etag = f"status-{snapshot.version}-{since_version}"
+
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+    elif since_version is None:
+        response = current_app.response_class(snapshot.body, mimetype='application/json')
+    else:
+        response = current_app.response_class(
+            status_snapshot.delta_body(snapshot, since_version), mimetype='application/json'
+        )
+    response.set_etag(etag)
+    response.headers['X-Status-Version'] = str(snapshot.version)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@main_bp.route('/stream/status', methods=['GET'])
+def stream_status():
+    """
+    站点状态实时推送（Server-Sent Events）：check（每次检查）、status（状态变化）、alert（发送告警）与 reset 事件。
+    断线重连时浏览器自动附带 Last-Event-ID（也可用 last_event_id 参数），服务端从最近事件缓冲中补发。
+    """
+    config = current_app.config
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    status_stream.hub.resize(config.get('STREAM_REPLAY_EVENTS', 1000))
+    if status_snapshot.is_shared_reader():
+        # 事件由独立检查进程产生，先同步一次再订阅，之后由跟随线程定期转发
+        status_stream.sync_shared()
+        status_stream.start_follower(config.get('STREAM_FOLLOW_SECONDS', 1))
+    subscription = status_stream.hub.subscribe(
+        config.get('STREAM_CLIENT_BUFFER', 256), last_event_id, max_subscribers=config.get('STREAM_MAX_CLIENTS', 100)
+    )
+    if subscription is None:
+        response = jsonify({"error": "实时推送连接数已达上限，请改用 /health 轮询"})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    subscriber, backlog = subscription
+    response = current_app.response_class(
+        status_stream.stream(subscriber, backlog, config.get('STREAM_HEARTBEAT_SECONDS', 15)),
+        mimetype='text/event-stream',
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@main_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    监控服务自身的运行指标（Prometheus 文本格式）。使用独立检查进程时，检查相关指标读取检查进程写入的 METRICS_PATH。
+    """
+    if not current_app.config.get('METRICS_ENABLED', True):
+        abort(404)
+    if status_snapshot.is_shared_reader():
+        body = metrics.read_file(current_app.config['METRICS_PATH']) + metrics.render(checker=False)
+    else:
+        body = metrics.render()
+    response = current_app.response_class(body, content_type=metrics.CONTENT_TYPE)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @main_bp.route('/api/history', methods=['GET'])
+@profiling.profiled('history')
 def get_history():
     """
     提供历史监控数据的 API (最终版 v3.4: 在 Tooltip 中显示详细错误)
@@ -546,14 +766,47 @@ def get_history():
         end_time_utc = end_time_naive.astimezone(timezone.utc)
     except (ValueError, TypeError):
         return jsonify({"error": "无效的时间格式或参数缺失"}), 400
+    # 响应时间曲线的点数上限（前端按图表宽度传入），0 表示返回全部原始点
+    try:
+        max_points = int(request.args.get('max_points', current_app.config.get('HISTORY_MAX_POINTS', 2000)))
+    except (TypeError, ValueError):
+        return jsonify({"error": "max_points 必须为整数"}), 400
+    max_points = min(max(max_points, 0), HISTORY_MAX_POINTS_LIMIT)
+    # 响应格式：rows（默认，行式）或 compact（列式，提示文本由前端渲染），见 history_format
+    response_format = request.args.get('format', 'rows')
+    if response_format not in history_format.FORMATS:
+        return jsonify({"error": "format 必须为 rows 或 compact"}), 400
+    content_encoding = history_format.negotiate_encoding(request)
+    # 增量模式：since 为客户端已有数据的游标（上次响应中各站点 cursor 的最小值），只返回其后的变化
+    since_str = request.args.get('since')
+    since_utc = None
+    if since_str:
+        try:
+            since_utc = datetime.datetime.fromisoformat(since_str).astimezone(timezone.utc)
+        except ValueError:
+            return jsonify({"error": "无效的 since 参数"}), 400
+    # 原始日志已过期的范围改为读取覆盖该范围的聚合层（聚合数据不支持增量，忽略 since 返回完整结果）
+    bucket_seconds = select_history_resolution(start_time_utc, current_app.config, site_names=selected_sites)
+    if bucket_seconds:
+        # 聚合数据由后台任务原地刷新，按响应内容计算 ETag
+        response = history_format.json_response(
+            history_format.encode(
+                _build_rollup_history(selected_sites, start_time_utc, end_time_utc, bucket_seconds, max_points),
+                response_format,
+            ),
+            content_encoding,
+        )
+        response.add_etag()
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+    # 客户端请求的范围长度（按最早数据时间调整之前），增量模式按它区分不同长度的相对时间范围
+    requested_span_seconds = (end_time_utc - start_time_utc).total_seconds()
     #查询所选站点中最早的数据时间
     if selected_sites:
-        earliest_log = db.session.query(HealthCheckLog).filter(
-            HealthCheckLog.site_name.in_(selected_sites)
-        ).order_by(HealthCheckLog.timestamp.asc()).first()
+        earliest_timestamp = log_store.earliest_log_time(selected_sites)
 
-        if earliest_log:
-            earliest_data_time = earliest_log.timestamp.replace(tzinfo=timezone.utc)
+        if earliest_timestamp:
+            earliest_data_time = earliest_timestamp.replace(tzinfo=timezone.utc)
             # 如果查询开始时间早于最早数据时间，自动调整
             if start_time_utc < earliest_data_time:
                 original_start = start_time_utc
@@ -564,171 +817,761 @@ def get_history():
                 )
     results = {}
     monitor_interval = datetime.timedelta(seconds=current_app.config.get('MONITOR_INTERVAL_SECONDS', 60))
+    timeline_source = current_app.config.get('HISTORY_TIMELINE_SOURCE', 'segments')
+
+    # 数据版本：各站点最新日志时间。版本与参数都未变化时直接返回 304，无需重新计算
+    latest_times = log_store.latest_log_times(selected_sites) if selected_sites else {}
+    etag = _history_etag(latest_times, monitor_interval, timeline_source, content_encoding)
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    if since_utc is not None:
+        results = _build_history_delta(
+            selected_sites, start_time_utc, end_time_utc, since_utc, latest_times, monitor_interval, timeline_source,
+            max_points=max_points, labels=response_format == 'rows', span_seconds=requested_span_seconds,
+        )
+    else:
+        site_runs = None
+        if selected_sites and timeline_source == 'sql' and timeline_sql.supported():
+            # 时间线分段在数据库中用窗口函数完成，每个分段只返回一行
+            site_runs = timeline_sql.timeline_runs(
+                selected_sites, start_time_utc, end_time_utc, monitor_interval.total_seconds()
+            )
+
+        # 已封闭的整点块取自缓存，其余部分与缺失的块合并为一次查询读取
+        site_logs = history_cache.load_history_logs(selected_sites, start_time_utc, end_time_utc, latest_times)
+        for site, (logs, arrays) in site_logs.items():
+            results[site] = _build_site_history(
+                site, logs, start_time_utc, end_time_utc, monitor_interval, timeline_source,
+                runs=site_runs.get(site, []) if site_runs is not None else None, max_points=max_points, arrays=arrays,
+                labels=response_format == 'rows',
+            )
+    response = history_format.json_response(history_format.encode(results, response_format), content_encoding)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _history_etag(latest_times, monitor_interval, timeline_source, content_encoding=None):
+    """由请求参数、各站点最新日志时间、影响计算的配置、响应压缩方式与当前分钟（SLA 与原始数据保留期随时间滑动）生成 ETag。"""
+    payload = json.dumps([
+        sorted(request.args.items(multi=True)),
+        content_encoding,
+        sorted((site, timestamp.isoformat()) for site, timestamp in latest_times.items()),
+        monitor_interval.total_seconds(),
+        timeline_source,
+        datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M'),
+    ], ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+HISTORY_MAX_POINTS_LIMIT = 20000
+
+
+def _build_site_history(
+    site, logs, start_time_utc, end_time_utc, monitor_interval, timeline_source, runs=None, max_points=0, arrays=None,
+    labels=True,
+):
+    """根据单个站点按时间升序排列的日志构建时间线、事件与统计数据。
+    runs 为数据库中预先计算好的时间线分段（HISTORY_TIMELINE_SOURCE = 'sql'）；
+    max_points 大于 0 时响应时间曲线用 LTTB 降采样到不超过该点数（统计值仍基于全部日志）。
+    时间线分段为 history_format.TimelineEntry，由 history_format.encode 转换为响应格式；labels 为 False 时不生成格式化时间。
+    增量请求（since）由 _build_history_delta 处理。
+    """
+    timeline_data = []
+    incidents = []
+    if arrays is None:
+        arrays = history_stats.log_arrays(logs)
+
+    if not logs:
+        timeline_data.append(history_format.timeline_entry(start_time_utc, end_time_utc, 0))
+    elif runs is not None:
+        timeline_data.extend(_build_timeline_from_runs(runs, end_time_utc))
+        incidents.extend(_build_incidents_from_logs(logs, end_time_utc))
+    elif _segments_cover(site, timeline_source, logs[0].timestamp):
+        timeline_data.extend(_build_timeline_from_segments(
+            segments.segments_between(site, start_time_utc, end_time_utc), start_time_utc, end_time_utc
+        ))
+        incidents.extend(
+            _serialize_incident(incident, end_time_utc)
+            for incident in incidents_between(site, start_time_utc, end_time_utc)
+        )
+    else:
+        # 区间表与事件表尚未覆盖该范围（如刚升级、尚未执行 flask rebuild-segments）时回退为逐条日志计算
+        timeline_data.extend(_build_timeline_from_logs(logs, arrays, end_time_utc, monitor_interval))
+        incidents.extend(_build_incidents_from_logs(logs, end_time_utc))
+
+    # --- 为其他图表准备数据（在 numpy 数组上向量化计算） ---
+    overall = history_stats.overall_stats(arrays)
+    point_indices = history_stats.lttb_indices(arrays.ts_us, arrays.response_times, max_points)
+
+    # 计算 SLA 统计（今日、近7天、近30天）
+    now_utc = datetime.datetime.now(timezone.utc)
+    now_us = history_stats.to_epoch_us(now_utc)
+    sla = [
+        history_stats.period_availability(arrays, history_stats.to_epoch_us(period_start), now_us, overall[0])
+        for period_start in _sla_period_starts(now_utc)
+    ]
+    return _history_result(
+        False, logs[-1].timestamp if logs else None, timeline_data, overall,
+        _response_times(logs, arrays, point_indices, labels), incidents, sla,
+    )
 
-    for site in selected_sites:
-        logs = db.session.query(HealthCheckLog).filter(
-            HealthCheckLog.site_name == site,
-            HealthCheckLog.timestamp.between(start_time_utc, end_time_utc)
-        ).order_by(HealthCheckLog.timestamp.asc()).all()
 
-        timeline_data = []
-        incidents = []
+def _segments_cover(site, timeline_source, first_log_time):
+    """区间表与事件表是否覆盖从 first_log_time 开始的范围（HISTORY_TIMELINE_SOURCE = 'segments'）。"""
+    if timeline_source != 'segments':
+        return False
+    earliest_segment = segments.earliest_segment_time(site)
+    return earliest_segment is not None and earliest_segment <= first_log_time
 
-        def get_simple_status(log):
-            if log.status == '无法访问': return 'down'
-            if log.status == '访问过慢': return 'slow'
-            return 'up'
-
-        def extract_incident_reason(log):
-            if log.error_detail:
-                return log.error_detail
-            if log.http_status_code and log.http_status_code >= 400:
-                return f"HTTP {log.http_status_code}"
-            if log.status == '访问过慢' and log.response_time_seconds is not None:
-                return f"响应时间 {log.response_time_seconds:.3f}s"
-            return None
-
-        status_label_map = {'down': '宕机', 'slow': '访问过慢'}
-        current_incident = None
-
-        def finalize_incident(incident, closure_time, resolved):
-            if not incident:
-                return
-            resolved_time = min(closure_time, end_time_utc)
-            if resolved_time < incident['start']:
-                resolved_time = incident['start']
-            duration_ms = max(0, int((resolved_time - incident['start']).total_seconds() * 1000))
-            reason = next((candidate for candidate in incident.get('reasons', []) if candidate), None)
-            incidents.append({
-                "status_key": incident['status'],
-                "status_label": status_label_map.get(incident['status'], incident['status']),
-                "start_ts": int(incident['start'].timestamp() * 1000),
-                "end_ts": int(resolved_time.timestamp() * 1000),
-                "duration_ms": duration_ms,
-                "resolved": resolved,
-                "reason": reason,
-                "http_status_code": incident.get('http_status_code'),
-            })
-
-        if not logs:
-            timeline_data.append([
-                int(start_time_utc.timestamp() * 1000),
-                int(end_time_utc.timestamp() * 1000),
-                0,
-                "该时间段内无数据"
-            ])
+
+def _sla_period_starts(now_utc):
+    """今日、近 7 天与近 30 天 SLA 区间的起点，区间均结束于 now_utc。"""
+    return (
+        datetime.datetime.combine(now_utc.date(), datetime.time.min, tzinfo=timezone.utc),
+        now_utc - datetime.timedelta(days=7),
+        now_utc - datetime.timedelta(days=30),
+    )
+
+
+def _response_times(logs, arrays, point_indices, labels):
+    times = [logs[index].response_time_seconds for index in point_indices.tolist()]
+    if not labels:
+        return {"timestamps_ms": (arrays.ts_us[point_indices] // 1000).tolist(), "times": times}
+    response_labels, response_timestamps_ms = history_stats.response_points(history_stats.take(arrays, point_indices))
+    return {"timestamps": response_labels, "timestamps_ms": response_timestamps_ms, "times": times}
+
+
+def _history_result(delta, last_log_time, timeline_data, overall, response_times, incidents, sla):
+    availability, avg_response_time, p95_response_time, p99_response_time = overall
+    sla_today, sla_week, sla_month = sla
+    return {
+        "delta": delta,
+        # 本次结果包含的最后一条日志时间（UTC），作为下次增量请求的 since
+        "cursor": last_log_time.replace(tzinfo=timezone.utc).isoformat() if last_log_time else None,
+        "timeline_data": timeline_data,
+        "overall_stats": {
+            "availability": availability,
+            "avg_response_time": avg_response_time,
+            "p95_response_time": p95_response_time,
+            "p99_response_time": p99_response_time
+        },
+        "response_times": response_times,
+        "incidents": incidents,
+        "sla_stats": {
+            "today": sla_today,
+            "week": sla_week,
+            "month": sla_month
+        }
+    }
+
+
+def _build_history_delta(
+    selected_sites, start_time_utc, end_time_utc, since_utc, latest_times, monitor_interval, timeline_source,
+    max_points=0, labels=True, span_seconds=None,
+):
+    """增量请求（since）：返回各站点 delta 为 true 的结果，客户端用其替换本地数据中对应的部分。
+
+    只包含 since 之后的响应时间点、结束于 since 之后的时间线分段与 since 之后有变化的事件；
+    统计值与 SLA 仍是整个范围的结果，由 history_window 的窗口累计量增量得到，不读取整个范围的日志。
+    时间线与事件取自区间表与事件表时只读取 since 之后的日志；否则从 since 所在状态段之前的最后一条日志开始读取并重新计算，
+    结束于 since 之后的部分与整个范围计算的结果一致。范围内没有日志的站点返回完整结果。
+    """
+    now_utc = datetime.datetime.now(timezone.utc)
+    summaries = history_window.window_summaries(
+        selected_sites, start_time_utc, end_time_utc, latest_times, _sla_period_starts(now_utc), now_utc,
+        span_seconds=span_seconds,
+    )
+    since_utc = max(since_utc, start_time_utc)
+    lower_bounds = {}
+    from_segments = set()
+    for site, summary in summaries.items():
+        if not summary.count:
+            continue
+        if _segments_cover(site, timeline_source, summary.first_timestamp):
+            from_segments.add(site)
+            lower_bounds[site] = since_utc
         else:
-            for log in logs:
-                status_key = get_simple_status(log)
-                log_time = log.timestamp.replace(tzinfo=timezone.utc)
-                reason = extract_incident_reason(log)
-
-                if status_key in ('down', 'slow'):
-                    if current_incident and current_incident['status'] == status_key:
-                        current_incident['last_seen'] = log_time
-                        if reason and reason not in current_incident['reasons']:
-                            current_incident['reasons'].append(reason)
-                        if log.http_status_code and not current_incident.get('http_status_code'):
-                            current_incident['http_status_code'] = log.http_status_code
-                    else:
-                        if current_incident:
-                            finalize_incident(current_incident, log_time, True)
-                        current_incident = {
-                            "status": status_key,
-                            "start": log_time,
-                            "last_seen": log_time,
-                            "reasons": [reason] if reason else [],
-                            "http_status_code": log.http_status_code if log.http_status_code else None,
-                        }
-                else:
-                    if current_incident:
-                        finalize_incident(current_incident, log_time, True)
-                        current_incident = None
+            lower_bounds[site] = history_window.status_run_start(site, start_time_utc, since_utc)
+    tail_logs = history_window.load_logs_after(lower_bounds, end_time_utc)
+
+    site_runs = None
+    replay_sites = [site for site in lower_bounds if site not in from_segments]
+    if replay_sites and timeline_source == 'sql' and timeline_sql.supported():
+        # 从最早的状态段起点开始分段：各站点之后的分段与从各自起点开始计算的结果相同
+        site_runs = timeline_sql.timeline_runs(
+            replay_sites, min(lower_bounds[site] for site in replay_sites), end_time_utc,
+            monitor_interval.total_seconds(),
+        )
 
+    since_ms = int(since_utc.timestamp() * 1000)
+    since_us = history_stats.to_epoch_us(since_utc)
+    results = {}
+    for site, summary in summaries.items():
+        if not summary.count:
+            results[site] = _build_site_history(
+                site, [], start_time_utc, end_time_utc, monitor_interval, timeline_source, labels=labels
+            )
+            continue
+        logs, arrays = tail_logs[site]
+        if site in from_segments:
+            timeline_data = _build_timeline_from_segments(
+                segments.segments_between(site, since_utc, end_time_utc), start_time_utc, end_time_utc
+            )
+            incidents = [
+                _serialize_incident(incident, end_time_utc)
+                for incident in incidents_between(site, since_utc, end_time_utc)
+            ]
+        elif site_runs is not None:
+            timeline_data = _build_timeline_from_runs(site_runs.get(site, []), end_time_utc)
+            incidents = _build_incidents_from_logs(logs, end_time_utc)
+        else:
+            timeline_data = _build_timeline_from_logs(logs, arrays, end_time_utc, monitor_interval) if logs else []
+            incidents = _build_incidents_from_logs(logs, end_time_utc)
+        timeline_data = [segment for segment in timeline_data if segment.end_ms > since_ms]
+        incidents = [incident for incident in incidents if not incident['resolved'] or incident['end_ts'] > since_ms]
+        point_indices = history_stats.tail_indices(arrays, since_us, max_points)
+        results[site] = _history_result(
+            True, summary.last_timestamp, timeline_data, summary.overall,
+            _response_times(logs, arrays, point_indices, labels), incidents, summary.sla,
+        )
+    return results
+
+
+TIMELINE_STATUS_CODES = {'up': 1, 'slow': 2, 'down': 3}
+
+
+def _simple_status(status):
+    if status == '无法访问':
+        return 'down'
+    if status == '访问过慢':
+        return 'slow'
+    return 'up'
+
+
+def _build_timeline_from_logs(logs, arrays, end_time_utc, monitor_interval):
+    """合并连续相同状态的日志，检查间隔超过 1.5 倍监控周期时断开；分段与统计在数组上向量化完成。"""
+    gap_us = int(monitor_interval.total_seconds() * 1.5 * 1_000_000)
+    starts, ends = history_stats.timeline_segments(arrays, gap_us)
+    averages = history_stats.segment_response_means(arrays, starts, ends)
+    error_indices = history_stats.first_error_indices(arrays, starts, ends)
+    timeline_data = []
+    for start_index, end_index, avg_resp, error_index in zip(
+        starts.tolist(), ends.tolist(), averages.tolist(), error_indices.tolist()
+    ):
+        current_status = history_stats.SIMPLE_STATUS_KEYS[int(arrays.status[start_index])]
+        start_time = logs[start_index].timestamp.replace(tzinfo=timezone.utc)
+        next_event_time = logs[end_index].timestamp if end_index < len(logs) else end_time_utc
+        end_time = next_event_time.replace(tzinfo=timezone.utc)
+        reason = None
+        if current_status == 'down':
+            # 这段故障期间的第一个具体原因
+            first_error_log = logs[error_index]
+            if first_error_log.http_status_code and first_error_log.http_status_code >= 400:
+                reason = f"HTTP {first_error_log.http_status_code}"
+            elif first_error_log.error_detail:
+                reason = first_error_log.error_detail
+        timeline_data.append(history_format.timeline_entry(
+            start_time, end_time, TIMELINE_STATUS_CODES[current_status], reason,
+            None if math.isnan(avg_resp) else avg_resp,
+        ))
+    return timeline_data
+
+
+def _build_timeline_from_runs(runs, end_time_utc):
+    """基于数据库窗口函数返回的分段构建时间线，结果与逐条日志计算一致。"""
+    timeline_data = []
+    for run in runs:
+        start_time = run.start_time.replace(tzinfo=timezone.utc)
+        end_time = (run.next_start_time or end_time_utc).replace(tzinfo=timezone.utc)
+        reason = None
+        if run.status_key == 'down':
+            if run.http_status_code and run.http_status_code >= 400:
+                reason = f"HTTP {run.http_status_code}"
+            elif run.error_detail:
+                reason = run.error_detail
+        timeline_data.append(history_format.timeline_entry(
+            start_time, end_time, TIMELINE_STATUS_CODES[run.status_key], reason, run.avg_response_time
+        ))
+    return timeline_data
+
+
+def _build_timeline_from_segments(segment_rows, start_time_utc, end_time_utc):
+    """基于状态区间表构建时间线，结果与逐条日志计算一致，开销只与状态切换次数相关。"""
+    timeline_data = []
+    for index, segment in enumerate(segment_rows):
+        segment_start = segment.start_time.replace(tzinfo=timezone.utc)
+        segment_last = segment.end_time.replace(tzinfo=timezone.utc)
+        if segment_last < start_time_utc:
+            continue
+        if index + 1 < len(segment_rows):
+            end_time = segment_rows[index + 1].start_time.replace(tzinfo=timezone.utc)
+        else:
+            end_time = end_time_utc
+        start_time = max(segment_start, start_time_utc)
+        end_time = min(end_time, end_time_utc)
+        status_key = _simple_status(segment.status)
+        avg_resp = (
+            segment.response_time_sum / segment.response_time_count if segment.response_time_count else None
+        )
+        timeline_data.append(history_format.timeline_entry(
+            start_time, end_time, TIMELINE_STATUS_CODES[status_key], segment.first_reason, avg_resp
+        ))
+    return timeline_data
+
+
+INCIDENT_STATUS_LABELS = {'down': '宕机', 'slow': '访问过慢'}
+
+
+def _build_incidents_from_logs(logs, end_time_utc):
+    """逐条日志合并连续的宕机 / 慢响应记录为事件（范围边界处的事件会被截断）。"""
+    incidents = []
+    current_incident = None
+
+    def finalize_incident(incident, closure_time, resolved):
+        if not incident:
+            return
+        resolved_time = min(closure_time, end_time_utc)
+        if resolved_time < incident['start']:
+            resolved_time = incident['start']
+        duration_ms = max(0, int((resolved_time - incident['start']).total_seconds() * 1000))
+        reason = next((candidate for candidate in incident.get('reasons', []) if candidate), None)
+        incidents.append({
+            "status_key": incident['status'],
+            "status_label": INCIDENT_STATUS_LABELS.get(incident['status'], incident['status']),
+            "start_ts": int(incident['start'].timestamp() * 1000),
+            "end_ts": int(resolved_time.timestamp() * 1000),
+            "duration_ms": duration_ms,
+            "resolved": resolved,
+            "reason": reason,
+            "http_status_code": incident.get('http_status_code'),
+        })
+
+    for log in logs:
+        status_key = _simple_status(log.status)
+        log_time = log.timestamp.replace(tzinfo=timezone.utc)
+        reason = incident_reason(log._mapping)
+
+        if status_key in ('down', 'slow'):
+            if current_incident and current_incident['status'] == status_key:
+                current_incident['last_seen'] = log_time
+                if reason and reason not in current_incident['reasons']:
+                    current_incident['reasons'].append(reason)
+                if log.http_status_code and not current_incident.get('http_status_code'):
+                    current_incident['http_status_code'] = log.http_status_code
+            else:
+                if current_incident:
+                    finalize_incident(current_incident, log_time, True)
+                current_incident = {
+                    "status": status_key,
+                    "start": log_time,
+                    "last_seen": log_time,
+                    "reasons": [reason] if reason else [],
+                    "http_status_code": log.http_status_code if log.http_status_code else None,
+                }
+        else:
             if current_incident:
-                finalize_incident(current_incident, end_time_utc, False)
-
-            i = 0
-            while i < len(logs):
-                current_log = logs[i]
-                current_status = get_simple_status(current_log)
-
-                j = i
-                while j < len(logs) and get_simple_status(logs[j]) == current_status:
-                    if j > i and (logs[j].timestamp - logs[j - 1].timestamp) > monitor_interval * 1.5:
-                        break
-                    j += 1
-                segment_logs = logs[i:j]
-                start_log = segment_logs[0]
-                next_event_time = logs[j].timestamp if j < len(logs) else end_time_utc
-                end_time = next_event_time.replace(tzinfo=timezone.utc)
-                start_ts = int(start_log.timestamp.replace(tzinfo=timezone.utc).timestamp() * 1000)
-                end_ts = int(end_time.timestamp() * 1000)
-                status_map = {'up': 1, 'slow': 2, 'down': 3}
-                duration = end_time - start_log.timestamp.replace(tzinfo=timezone.utc)
-                duration_str = str(duration).split('.')[0]
-                details = f"状态: {current_status.upper()}<br>持续: {duration_str}<br>"
-                if current_status == 'down':
-                    # 找到这段故障期间的第一个具体原因
-                    reason = "未知错误"
-                    first_error_log = next((l for l in segment_logs if
-                                            l.error_detail or (l.http_status_code and l.http_status_code >= 400)),
-                                           segment_logs[0])
-                    if first_error_log.http_status_code and first_error_log.http_status_code >= 400:
-                        reason = f"HTTP {first_error_log.http_status_code}"
-                    elif first_error_log.error_detail:
-                        reason = first_error_log.error_detail
-                    details += f"原因: {reason}"
-                else:  # 'up' or 'slow'
-                    valid_logs = [l for l in segment_logs if l.response_time_seconds is not None]
-                    if valid_logs:
-                        avg_resp = sum(l.response_time_seconds for l in valid_logs) / len(valid_logs)
-                        details += f"平均响应: {avg_resp:.3f}s"
-                    else:
-                        # 如果一个分段里全是None（理论上不太可能，但做个保护）
-                        details += "平均响应: N/A"
-                timeline_data.append([start_ts, end_ts, status_map[current_status], details])
-                i = j
-
-        # --- 为其他图表准备数据 ---
-        up_count = sum(1 for log in logs if log.status in ['正常', '访问过慢'])
-        availability = (up_count / len(logs) * 100) if logs else 0
-        valid_times = [log.response_time_seconds for log in logs if log.response_time_seconds is not None]
-        avg_response_time = sum(valid_times) / len(valid_times) if valid_times else 0
-
-        # 计算 P95 和 P99
+                finalize_incident(current_incident, log_time, True)
+                current_incident = None
+
+    if current_incident:
+        finalize_incident(current_incident, end_time_utc, False)
+    return incidents
+
+
+def _serialize_incident(incident, end_time_utc=None):
+    """将事件表记录转换为前端使用的结构；持续中的事件以 end_time_utc（默认当前时间）作为结束。"""
+    start_time = incident['start_time'].replace(tzinfo=timezone.utc)
+    resolved = incident['end_time'] is not None
+    if resolved:
+        end_time = incident['end_time'].replace(tzinfo=timezone.utc)
+    else:
+        end_time = end_time_utc or datetime.datetime.now(timezone.utc)
+    return {
+        "id": incident['id'],
+        "status_key": incident['status'],
+        "status_label": INCIDENT_STATUS_LABELS.get(incident['status'], incident['status']),
+        "start_ts": int(start_time.timestamp() * 1000),
+        "end_ts": int(end_time.timestamp() * 1000),
+        "duration_ms": max(0, int((end_time - start_time).total_seconds() * 1000)),
+        "resolved": resolved,
+        "reason": next((candidate for candidate in incident['reasons'] if candidate), None),
+        "reasons": incident['reasons'],
+        "http_status_code": incident['http_status_code'],
+        "peak_response_time": incident['peak_response_time'],
+        "check_count": incident['check_count'],
+        "notification_sent": bool(incident['notification_sent']),
+    }
+
+
+@main_bp.route('/api/incidents', methods=['GET'])
+def get_incidents():
+    """
+    事件列表 API：按开始时间倒序，使用游标分页（cursor 为上一页返回的 next_cursor）。
+    可选参数：sites（可重复）、status=down|slow、limit（默认 50，最大 200）、
+    notified_only=true（只返回发出过告警的事件；默认包含未达到告警阈值的短暂异常，与仪表盘告警历史一致）。
+    """
+    selected_sites = request.args.getlist('sites')
+    status = request.args.get('status') or None
+    notified_only = request.args.get('notified_only', 'false').lower() in ('1', 'true', 'yes')
+    if status is not None and status not in INCIDENT_STATUS_LABELS:
+        return jsonify({"error": "status 仅支持 down、slow"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 200)
+    except ValueError:
+        return jsonify({"error": "limit 必须为整数"}), 400
+    before = None
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            start_ms, incident_id = cursor.split('_', 1)
+            before = (
+                datetime.datetime.fromtimestamp(int(start_ms) / 1000, tz=timezone.utc).replace(tzinfo=None),
+                int(incident_id),
+            )
+        except ValueError:
+            return jsonify({"error": "无效的分页游标"}), 400
+    rows = list_incidents(
+        limit=limit + 1, before=before, site_names=selected_sites, status=status, notified_only=notified_only
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = f"{int(last['start_time'].replace(tzinfo=timezone.utc).timestamp() * 1000)}_{last['id']}"
+    items = []
+    for row in rows:
+        item = _serialize_incident(row)
+        item['site_name'] = row['site_name']
+        items.append(item)
+    return jsonify({"incidents": items, "next_cursor": next_cursor})
+
+
+EXPORT_MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+# 每凑满这么多行向客户端输出一次
+EXPORT_CHUNK_ROWS = 1000
+
+
+def _parse_utc(value):
+    return datetime.datetime.fromisoformat(value).astimezone(timezone.utc)
+
+
+def _optional_time_arg(name):
+    value = request.args.get(name)
+    return _parse_utc(value) if value else None
+
+
+def _export_record(row):
+    record = dict(zip(log_store.CURSOR_COLUMNS, row))
+    record['timestamp'] = row.timestamp.isoformat() + '+00:00'
+    return record
+
+
+def _export_ndjson(rows):
+    for chunk in iter(lambda: list(itertools.islice(rows, EXPORT_CHUNK_ROWS)), []):
+        yield b''.join(history_format.dumps(_export_record(row)) + b'\n' for row in chunk)
+
+
+def _export_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=log_store.CURSOR_COLUMNS)
+    writer.writeheader()
+    for chunk in iter(lambda: list(itertools.islice(rows, EXPORT_CHUNK_ROWS)), []):
+        writer.writerows(_export_record(row) for row in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+@main_bp.route('/api/logs/export', methods=['GET'])
+@login_required
+def export_logs():
+    """
+    流式导出原始检查日志（需登录），按 (timestamp, table_index, id) 升序输出，内存占用与导出总行数无关。
+    可选参数：sites（可重复，默认全部站点）、start_time / end_time、format=ndjson|csv（默认 ndjson）、
+    limit（本次最多导出的条数）、after（断点续传游标：已收到的最后一行的 "<timestamp>_<table_index>_<id>"）。
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_MIMETYPES:
+        return jsonify({"error": "format 仅支持 ndjson、csv"}), 400
+    selected_sites = request.args.getlist('sites') or None
+    try:
+        start_time_utc = _optional_time_arg('start_time')
+        end_time_utc = _optional_time_arg('end_time')
+    except ValueError:
+        return jsonify({"error": "无效的时间格式"}), 400
+    try:
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+    except ValueError:
+        return jsonify({"error": "limit 必须为整数"}), 400
+    after = None
+    cursor = request.args.get('after')
+    if cursor:
+        try:
+            timestamp_str, index, log_id = _split_log_cursor(cursor)
+            after = (log_store.to_naive_utc(_parse_utc(timestamp_str)), index, log_id)
+        except ValueError:
+            return jsonify({"error": "无效的导出游标"}), 400
+
+    rows = log_store.iter_logs(selected_sites, start_time_utc, end_time_utc, after)
+    if limit is not None:
+        rows = itertools.islice(rows, max(limit, 0))
+    generator = _export_ndjson(rows) if export_format == 'ndjson' else _export_csv(rows)
+    response = current_app.response_class(stream_with_context(generator), mimetype=EXPORT_MIMETYPES[export_format])
+    response.headers['Content-Disposition'] = f'attachment; filename=health_check_logs.{export_format}'
+    # 禁止反向代理缓冲整个响应
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+ARCHIVE_BUCKET_SECONDS = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+
+
+@main_bp.route('/api/archive/summary', methods=['GET'])
+def get_archive_summary():
+    """
+    基于冷归档文件的长期统计（如同比图表），参数与 /api/history 一致，另支持 bucket=hour|day|week。
+    """
+    selected_sites = request.args.getlist('sites')
+    bucket = request.args.get('bucket', 'day')
+    try:
+        start_time_utc = datetime.datetime.fromisoformat(request.args.get('start_time')).astimezone(timezone.utc)
+        end_time_utc = datetime.datetime.fromisoformat(request.args.get('end_time')).astimezone(timezone.utc)
+    except (ValueError, TypeError):
+        return jsonify({"error": "无效的时间格式或参数缺失"}), 400
+    if bucket not in ARCHIVE_BUCKET_SECONDS:
+        return jsonify({"error": "bucket 仅支持 hour、day、week"}), 400
+    if end_time_utc <= start_time_utc:
+        return jsonify({"error": "结束时间必须晚于开始时间"}), 400
+    results = archive.summarize(selected_sites, start_time_utc, end_time_utc, ARCHIVE_BUCKET_SECONDS[bucket])
+    for site_result in results.values():
+        site_result['buckets']['times'] = [
+            to_gmt8(datetime.datetime.fromtimestamp(ms / 1000, tz=timezone.utc)).strftime('%Y-%m-%d %H:%M')
+            for ms in site_result['buckets']['start_ms']
+        ]
+    return jsonify(results)
+
+
+DEFAULT_PERCENTILES = (0.5, 0.95, 0.99)
+
+
+def _percentile_key(q):
+    return f"p{q * 100:g}"
+
+
+@main_bp.route('/api/percentiles', methods=['GET'])
+def get_percentiles():
+    """
+    合并聚合层的分位数草图，计算任意时间范围内各站点及所选站点整体的响应时间分位数。
+    参数：sites（可重复）、start_time、end_time，可选 q（逗号分隔的 0~1 小数，默认 0.5,0.95,0.99）。
+    估计值与真实值的相对误差不超过 relative_accuracy；范围两端按所在聚合桶整体计入。
+    """
+    selected_sites = request.args.getlist('sites')
+    try:
+        start_time_utc = datetime.datetime.fromisoformat(request.args.get('start_time')).astimezone(timezone.utc)
+        end_time_utc = datetime.datetime.fromisoformat(request.args.get('end_time')).astimezone(timezone.utc)
+    except (ValueError, TypeError):
+        return jsonify({"error": "无效的时间格式或参数缺失"}), 400
+    if end_time_utc <= start_time_utc:
+        return jsonify({"error": "结束时间必须晚于开始时间"}), 400
+    try:
+        quantiles = [float(value) for value in request.args.get('q', '').split(',') if value.strip()]
+    except ValueError:
+        return jsonify({"error": "q 必须为逗号分隔的小数"}), 400
+    quantiles = quantiles or list(DEFAULT_PERCENTILES)
+    if not all(0 < q < 1 for q in quantiles):
+        return jsonify({"error": "q 必须在 0 与 1 之间"}), 400
+
+    # 原始日志保留期内同样读取分钟级聚合（由聚合任务持续刷新），更早的范围使用能覆盖起点的最细聚合层
+    bucket_seconds = select_history_resolution(start_time_utc, current_app.config) or HealthCheckRollup.RESOLUTION_MINUTE
+    start = log_store.to_naive_utc(start_time_utc)
+    end = log_store.to_naive_utc(end_time_utc)
+    rollup_table = HealthCheckRollup.__table__
+    rows = db.session.execute(
+        sa.select(rollup_table.c.site_name, rollup_table.c.latency_sketch).where(
+            rollup_table.c.bucket_seconds == bucket_seconds,
+            rollup_table.c.site_name.in_(selected_sites),
+            rollup_table.c.bucket_start > start - datetime.timedelta(seconds=bucket_seconds),
+            rollup_table.c.bucket_start <= end,
+            rollup_table.c.latency_sketch.isnot(None),
+        )
+    ).all()
+
+    def summarize(sketch):
+        result = {"count": sketch.count}
+        for q in quantiles:
+            result[_percentile_key(q)] = sketch.quantile(q)
+        return result
+
+    by_site = {site: [] for site in selected_sites}
+    for site_name, blob in rows:
+        by_site[site_name].append(blob)
+    return jsonify({
+        "sites": {site: summarize(merge_blobs(blobs)) for site, blobs in by_site.items()},
+        "combined": summarize(merge_blobs(blob for _, blob in rows)),
+        "resolution_seconds": bucket_seconds,
+        "relative_accuracy": RELATIVE_ACCURACY,
+    })
+
+
+ROLLUP_RESOLUTION_LABELS = {
+    HealthCheckRollup.RESOLUTION_MINUTE: '1分钟',
+    HealthCheckRollup.RESOLUTION_HOUR: '1小时',
+    HealthCheckRollup.RESOLUTION_DAY: '1天',
+}
+
+
+def _rollup_simple_status(bucket):
+    """按多数原则确定聚合桶的状态，票数相同时取更严重的状态。"""
+    counts = [(bucket.down_count, 3, 'down'), (bucket.slow_count, 2, 'slow'), (bucket.up_count, 1, 'up')]
+    return max(counts)[2]
+
+
+def _build_rollup_history(selected_sites, start_time_utc, end_time_utc, bucket_seconds, max_points=0):
+    """基于聚合数据构建与原始日志路径结构一致的历史数据。"""
+    resolution_label = ROLLUP_RESOLUTION_LABELS.get(bucket_seconds, f"{bucket_seconds}秒")
+    if selected_sites:
+        earliest_bucket = db.session.query(db.func.min(HealthCheckRollup.bucket_start)).filter(
+            HealthCheckRollup.bucket_seconds == bucket_seconds,
+            HealthCheckRollup.site_name.in_(selected_sites),
+        ).scalar()
+        if earliest_bucket:
+            earliest_data_time = earliest_bucket.replace(tzinfo=timezone.utc)
+            if start_time_utc < earliest_data_time:
+                start_time_utc = earliest_data_time
+
+    status_map = {'up': 1, 'slow': 2, 'down': 3}
+    status_label_map = {'down': '宕机', 'slow': '访问过慢'}
+    bucket_span = datetime.timedelta(seconds=bucket_seconds)
+    # 与原始日志、状态区间相同的断开规则：相邻数据间隔超过 1.5 倍（聚合粒度与监控周期中较大者）
+    monitor_interval = datetime.timedelta(seconds=current_app.config.get('MONITOR_INTERVAL_SECONDS', 60))
+    gap_threshold = max(bucket_span, monitor_interval) * 1.5
+    now_utc = datetime.datetime.now(timezone.utc)
+    sla_periods = {
+        'today': datetime.datetime.combine(now_utc.date(), datetime.time.min, tzinfo=timezone.utc),
+        'week': now_utc - datetime.timedelta(days=7),
+        'month': now_utc - datetime.timedelta(days=30),
+    }
+    results = {}
+
+    # 一次查询读取全部站点所需的列，按站点分组
+    rollup_table = HealthCheckRollup.__table__
+    rows = db.session.execute(
+        sa.select(
+            rollup_table.c.site_name,
+            rollup_table.c.bucket_start,
+            rollup_table.c.total_count,
+            rollup_table.c.up_count,
+            rollup_table.c.slow_count,
+            rollup_table.c.down_count,
+            rollup_table.c.response_time_sum,
+            rollup_table.c.response_time_count,
+            rollup_table.c.latency_sketch,
+        ).where(
+            rollup_table.c.bucket_seconds == bucket_seconds,
+            rollup_table.c.site_name.in_(selected_sites),
+            rollup_table.c.bucket_start >= log_store.to_naive_utc(start_time_utc - bucket_span),
+            rollup_table.c.bucket_start <= log_store.to_naive_utc(end_time_utc),
+        ).order_by(rollup_table.c.site_name, rollup_table.c.bucket_start)
+    ).all()
+    buckets_by_site = {
+        site: list(site_rows) for site, site_rows in itertools.groupby(rows, key=lambda row: row.site_name)
+    }
+
+    for site in selected_sites:
+        buckets = buckets_by_site.get(site, [])
+
+        timeline_data = []
+        incidents = []
+        if not buckets:
+            timeline_data.append(history_format.timeline_entry(start_time_utc, end_time_utc, 0))
+
+        i = 0
+        while i < len(buckets):
+            current_status = _rollup_simple_status(buckets[i])
+            j = i
+            while j < len(buckets) and _rollup_simple_status(buckets[j]) == current_status:
+                if j > i and (buckets[j].bucket_start - buckets[j - 1].bucket_start) > gap_threshold:
+                    break
+                j += 1
+            segment = buckets[i:j]
+            segment_start = max(segment[0].bucket_start.replace(tzinfo=timezone.utc), start_time_utc)
+            segment_end = buckets[j].bucket_start.replace(tzinfo=timezone.utc) if j < len(buckets) else end_time_utc
+            total = sum(b.total_count for b in segment)
+            up_total = sum(b.up_count + b.slow_count for b in segment)
+            rt_count = sum(b.response_time_count for b in segment)
+            rt_sum = sum(b.response_time_sum for b in segment)
+            timeline_data.append(history_format.timeline_entry(
+                segment_start, segment_end, status_map[current_status],
+                avg_response=rt_sum / rt_count if rt_count else None,
+                availability=(up_total / total * 100) if total else 0,
+                resolution=resolution_label,
+            ))
+            if current_status in ('down', 'slow'):
+                affected = sum(b.down_count if current_status == 'down' else b.slow_count for b in segment)
+                reason = f"{affected} 次检查失败" if current_status == 'down' else f"{affected} 次慢响应"
+                incidents.append({
+                    "status_key": current_status,
+                    "status_label": status_label_map[current_status],
+                    "start_ts": int(segment_start.timestamp() * 1000),
+                    "end_ts": int(segment_end.timestamp() * 1000),
+                    "duration_ms": max(0, int((segment_end - segment_start).total_seconds() * 1000)),
+                    "resolved": j < len(buckets),
+                    "reason": f"{reason}（{resolution_label}聚合）",
+                    "http_status_code": None,
+                })
+            i = j
+
+        total_checks = sum(b.total_count for b in buckets)
+        up_checks = sum(b.up_count + b.slow_count for b in buckets)
+        availability = (up_checks / total_checks * 100) if total_checks else 0
+        rt_count = sum(b.response_time_count for b in buckets)
+        avg_response_time = sum(b.response_time_sum for b in buckets) / rt_count if rt_count else 0
+
         p95_response_time = 0
         p99_response_time = 0
-        if valid_times:
-            sorted_times = sorted(valid_times)
-            p95_index = int(len(sorted_times) * 0.95)
-            p99_index = int(len(sorted_times) * 0.99)
-            p95_response_time = sorted_times[min(p95_index, len(sorted_times) - 1)]
-            p99_response_time = sorted_times[min(p99_index, len(sorted_times) - 1)]
+        if all(b.latency_sketch or not b.response_time_count for b in buckets):
+            # 合并各时间桶的分位数草图，相对误差不超过 sketches.RELATIVE_ACCURACY
+            sketch = merge_blobs(b.latency_sketch for b in buckets)
+            if sketch.count:
+                p95_response_time = sketch.quantile(0.95)
+                p99_response_time = sketch.quantile(0.99)
+        else:
+            # 升级前生成的聚合数据没有草图，P95/P99 以各时间桶平均值近似
+            bucket_averages = sorted(
+                b.response_time_sum / b.response_time_count for b in buckets if b.response_time_count
+            )
+            if bucket_averages:
+                p95_response_time = bucket_averages[min(int(len(bucket_averages) * 0.95), len(bucket_averages) - 1)]
+                p99_response_time = bucket_averages[min(int(len(bucket_averages) * 0.99), len(bucket_averages) - 1)]
 
         response_points = []
-        for log in logs:
-            gmt8_timestamp = to_gmt8(log.timestamp)
-            timestamp_str = gmt8_timestamp.strftime('%Y-%m-%d %H:%M') if gmt8_timestamp else ''
-            timestamp_ms = int(gmt8_timestamp.timestamp() * 1000) if gmt8_timestamp else None
-            response_points.append((timestamp_str, timestamp_ms, log.response_time_seconds))
-
-        # 计算 SLA 统计（今日、近7天、近30天）
-        now_utc = datetime.datetime.now(timezone.utc)
-        today_start = datetime.datetime.combine(now_utc.date(), datetime.time.min, tzinfo=timezone.utc)
-        week_start = now_utc - datetime.timedelta(days=7)
-        month_start = now_utc - datetime.timedelta(days=30)
-
-        def calc_availability_for_period(period_start, period_end):
-            period_logs = [log for log in logs if period_start <= log.timestamp.replace(tzinfo=timezone.utc) <= period_end]
-            if not period_logs:
-                return availability  # 如果没有数据，返回整体可用率
-            period_up_count = sum(1 for log in period_logs if log.status in ['正常', '访问过慢'])
-            return (period_up_count / len(period_logs) * 100) if period_logs else 0
-
-        sla_today = calc_availability_for_period(today_start, now_utc)
-        sla_week = calc_availability_for_period(week_start, now_utc)
-        sla_month = calc_availability_for_period(month_start, now_utc)
+        point_indices = history_stats.series_indices(
+            [b.bucket_start for b in buckets],
+            [b.response_time_sum / b.response_time_count if b.response_time_count else None for b in buckets],
+            max_points,
+        )
+        for b in (buckets[index] for index in point_indices.tolist()):
+            gmt8_timestamp = to_gmt8(b.bucket_start)
+            response_points.append((
+                gmt8_timestamp.strftime('%Y-%m-%d %H:%M'),
+                int(gmt8_timestamp.timestamp() * 1000),
+                (b.response_time_sum / b.response_time_count) if b.response_time_count else None,
+            ))
+
+        sla_stats = {}
+        for period, period_start in sla_periods.items():
+            period_buckets = [b for b in buckets if b.bucket_start.replace(tzinfo=timezone.utc) >= period_start]
+            period_total = sum(b.total_count for b in period_buckets)
+            if not period_total:
+                sla_stats[period] = availability
+            else:
+                sla_stats[period] = sum(b.up_count + b.slow_count for b in period_buckets) / period_total * 100
 
         results[site] = {
             "timeline_data": timeline_data,
@@ -744,10 +1587,7 @@ def get_history():
                 "times": [point[2] for point in response_points]
             },
             "incidents": incidents,
-            "sla_stats": {
-                "today": sla_today,
-                "week": sla_week,
-                "month": sla_month
-            }
+            "sla_stats": sla_stats,
+            "resolution_seconds": bucket_seconds,
         }
-    return jsonify(results)
+    return results
@@ -0,0 +1,195 @@
+# web-monitor/app/segments.py
+"""
+状态区间（游程）表的维护与查询。
+
+健康检查任务每写入一批日志，就把每个站点的最新区间延长到本次检查时间，
+状态变化或检查间隔超过阈值时开始新的区间。历史时间线只需读取与查询范围重叠的区间，
+开销与状态切换次数相关，而与检查频率无关。
+"""
+import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import sqlalchemy as sa
+
+from . import log_store
+from .extensions import db
+from .models import StatusSegment
+
+SEGMENT_GAP_FACTOR = 1.5
+BACKFILL_FLUSH_SIZE = 1000
+
+_segment_table = StatusSegment.__table__
+
+
+def gap_seconds(monitor_interval_seconds) -> float:
+    """相邻两次检查的间隔超过该值时，视为监控中断并开始新的区间（与时间线的断档判断一致）。"""
+    return monitor_interval_seconds * SEGMENT_GAP_FACTOR
+
+
+def failure_reason(row) -> Optional[str]:
+    http_status_code = row.get('http_status_code')
+    if http_status_code and http_status_code >= 400:
+        return f"HTTP {http_status_code}"
+    return row.get('error_detail') or None
+
+
+def _new_segment(row: Dict[str, Any]) -> Dict[str, Any]:
+    response_time = row.get('response_time_seconds')
+    reason = failure_reason(row)
+    return {
+        'site_name': row['site_name'],
+        'status': row['status'],
+        'start_time': row['timestamp'],
+        'end_time': row['timestamp'],
+        'check_count': 1,
+        'first_reason': reason,
+        'http_status_code': row.get('http_status_code') if reason else None,
+        'response_time_sum': response_time or 0.0,
+        'response_time_count': 1 if response_time is not None else 0,
+    }
+
+
+def _extends(segment: Optional[Dict[str, Any]], row: Dict[str, Any], gap: float) -> bool:
+    if segment is None or segment['status'] != row['status']:
+        return False
+    elapsed = (row['timestamp'] - segment['end_time']).total_seconds()
+    return 0 <= elapsed <= gap
+
+
+def _extend(segment: Dict[str, Any], row: Dict[str, Any]) -> None:
+    segment['end_time'] = row['timestamp']
+    segment['check_count'] += 1
+    if row.get('response_time_seconds') is not None:
+        segment['response_time_sum'] += row['response_time_seconds']
+        segment['response_time_count'] += 1
+    if not segment['first_reason']:
+        reason = failure_reason(row)
+        if reason:
+            segment['first_reason'] = reason
+            segment['http_status_code'] = row.get('http_status_code')
+
+
+def open_segments(site_names: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """每个站点最新的区间（以字典形式返回，包含 id）。"""
+    site_names = list(site_names)
+    if not site_names:
+        return {}
+    latest = sa.select(
+        _segment_table.c.site_name,
+        sa.func.max(_segment_table.c.start_time).label('max_start'),
+    ).where(_segment_table.c.site_name.in_(site_names)).group_by(_segment_table.c.site_name).subquery()
+    rows = db.session.execute(
+        sa.select(_segment_table).join(
+            latest,
+            sa.and_(
+                _segment_table.c.site_name == latest.c.site_name,
+                _segment_table.c.start_time == latest.c.max_start,
+            ),
+        )
+    ).mappings().all()
+    return {row['site_name']: dict(row) for row in rows}
+
+
+def record_checks(rows: List[Dict[str, Any]], monitor_interval_seconds) -> None:
+    """在当前会话中用一批检查结果更新区间表（由调用方提交）。"""
+    if not rows:
+        return
+    gap = gap_seconds(monitor_interval_seconds)
+    current = open_segments({row['site_name'] for row in rows})
+    changed: Dict[int, Dict[str, Any]] = {}
+    created: List[Dict[str, Any]] = []
+    for row in sorted(rows, key=lambda item: item['timestamp']):
+        segment = current.get(row['site_name'])
+        if _extends(segment, row, gap):
+            _extend(segment, row)
+            if segment.get('id') is not None:
+                changed[segment['id']] = segment
+        else:
+            segment = _new_segment(row)
+            current[row['site_name']] = segment
+            created.append(segment)
+    for segment in changed.values():
+        db.session.execute(
+            sa.update(_segment_table).where(_segment_table.c.id == segment['id']).values(
+                end_time=segment['end_time'],
+                check_count=segment['check_count'],
+                first_reason=segment['first_reason'],
+                http_status_code=segment['http_status_code'],
+                response_time_sum=segment['response_time_sum'],
+                response_time_count=segment['response_time_count'],
+            )
+        )
+    if created:
+        db.session.execute(sa.insert(_segment_table), created)
+
+
+def segments_between(site_name: str, start: datetime.datetime, end: datetime.datetime) -> List[Any]:
+    """按开始时间升序返回与 [start, end] 重叠的区间。"""
+    start = log_store.to_naive_utc(start)
+    end = log_store.to_naive_utc(end)
+    # 区间的实际结束以下一个区间的开始为准，因此额外取开始于 start 之前的最后一个区间
+    previous = db.session.execute(
+        sa.select(_segment_table).where(
+            _segment_table.c.site_name == site_name,
+            _segment_table.c.start_time < start,
+        ).order_by(_segment_table.c.start_time.desc()).limit(1)
+    ).all()
+    rows = db.session.execute(
+        sa.select(_segment_table).where(
+            _segment_table.c.site_name == site_name,
+            _segment_table.c.start_time >= start,
+            _segment_table.c.start_time <= end,
+        ).order_by(_segment_table.c.start_time.asc())
+    ).all()
+    return previous + rows
+
+
+def earliest_segment_time(site_name: str):
+    return db.session.execute(
+        sa.select(sa.func.min(_segment_table.c.start_time)).where(_segment_table.c.site_name == site_name)
+    ).scalar()
+
+
+def rebuild_segments(monitor_interval_seconds, site_names: Optional[Iterable[str]] = None) -> int:
+    """根据现有日志重建区间表（用于首次启用或修复），返回生成的区间数。"""
+    gap = gap_seconds(monitor_interval_seconds)
+    delete_stmt = sa.delete(_segment_table)
+    if site_names is not None:
+        site_names = list(site_names)
+        delete_stmt = delete_stmt.where(_segment_table.c.site_name.in_(site_names))
+    db.session.execute(delete_stmt)
+
+    source = log_store.log_source(site_names=site_names)
+    stmt = sa.select(
+        source.c.site_name,
+        source.c.timestamp,
+        source.c.status,
+        source.c.response_time_seconds,
+        source.c.http_status_code,
+        source.c.error_detail,
+    ).where(source.c.timestamp.isnot(None))
+    if site_names is not None:
+        stmt = stmt.where(source.c.site_name.in_(site_names))
+    stmt = stmt.order_by(source.c.site_name, source.c.timestamp).execution_options(yield_per=5000)
+
+    total = 0
+    pending: List[Dict[str, Any]] = []
+    segment = None
+    for row in db.session.execute(stmt).mappings():
+        if segment is not None and segment['site_name'] == row['site_name'] and _extends(segment, row, gap):
+            _extend(segment, row)
+            continue
+        if segment is not None:
+            pending.append(segment)
+        segment = _new_segment(row)
+        if len(pending) >= BACKFILL_FLUSH_SIZE:
+            db.session.execute(sa.insert(_segment_table), pending)
+            total += len(pending)
+            pending = []
+    if segment is not None:
+        pending.append(segment)
+    if pending:
+        db.session.execute(sa.insert(_segment_table), pending)
+        total += len(pending)
+    db.session.commit()
+    return total
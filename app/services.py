@@ -3,18 +3,45 @@ import requests
 import json
 import time
 import datetime
+import logging
 import threading
 from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from flask import current_app
+import sqlalchemy as sa
+from sqlalchemy import func, text
+
+from . import (
+    alert_state,
+    archive,
+    incidents,
+    log_store,
+    metrics,
+    profiling,
+    segments,
+    status_snapshot,
+    status_stream,
+    timeline_sql,
+)
+from .sketches import LatencySketch
 from .extensions import db
-from .models import HealthCheckLog, MonitoredSite, NotificationChannel
+from .models import HealthCheckRollup, Incident, MonitoredSite, NotificationChannel, StatusSegment
 from .utils import to_gmt8
 
+logger = logging.getLogger(__name__)
+
 # --- 全局状态变量 ---
 site_statuses = {}
-status_lock = threading.Lock()
+# 记录等待与持有时间（/metrics），用法与 threading.Lock 相同
+status_lock = metrics.TimedLock('status_lock')
+# 健康检查周期空闲标记：清理任务在每个批次前等待检查周期结束，避免抢占写锁
+check_cycle_idle = threading.Event()
+check_cycle_idle.set()
+# 最近一次数据清理的进度与耗时统计
+last_cleanup_stats: Dict[str, Any] = {}
+# 启动预热只读取最近 (窗口条数 × 检查间隔 × 该倍数) 内的日志；不足窗口条数的站点再不限时间范围读取一次
+WARMUP_LOOKBACK_FACTOR = 3
 
 
 # --- 服务启动时的状态初始化函数 ---
@@ -23,26 +50,21 @@ def initialize_site_statuses(app):
     在服务启动时从数据库恢复站点的最新状态，预热 site_statuses 字典。
     """
     with app.app_context():
-        print("正在从数据库初始化站点状态...")
+        logger.info("正在从数据库初始化站点状态...")
         try:
             active_sites = MonitoredSite.query.filter_by(is_active=True).all()
             site_names = [site.name for site in active_sites]
             if not site_names:
-                print("没有活动的监控站点，初始化完成。")
+                logger.info("没有活动的监控站点，初始化完成。")
                 return
-            # 使用 SQL 子查询找到每个站点的最新日志记录
-            from sqlalchemy import func
-            subquery = db.session.query(
-                HealthCheckLog.site_name,
-                func.max(HealthCheckLog.timestamp).label('max_timestamp')
-            ).filter(HealthCheckLog.site_name.in_(site_names)).group_by(HealthCheckLog.site_name).subquery()
-            latest_logs = db.session.query(HealthCheckLog).join(
-                subquery,
-                db.and_(
-                    HealthCheckLog.site_name == subquery.c.site_name,
-                    HealthCheckLog.timestamp == subquery.c.max_timestamp
-                )
-            ).all()
+            # 上次运行保存的告警判定状态（一次查询读回）
+            counter_cap = alert_state.counter_cap(app.config)
+            saved_states = alert_state.store.load(counter_cap)
+            window_size = app.config.get('FAILURE_WINDOW_SIZE', 5)
+            slow_window_size = app.config.get('SLOW_RESPONSE_WINDOW_SIZE', 5)
+            recent_logs = _load_recent_logs(app, site_names, max(window_size, slow_window_size, counter_cap))
+            restored = 0
+            rebuilt = 0
             with status_lock:
                 for site in active_sites:
                     # 为每个站点设置一个默认的未知状态
@@ -63,20 +85,128 @@ def initialize_site_statuses(app):
                         "slow_since": None,
                         "last_notifications": {},
                     }
-
-                # 用数据库中的最新日志更新状态
-                for log in latest_logs:
-                    if log.site_name in site_statuses:
-                        site_statuses[log.site_name].update({
-                            "status": log.status,
-                            "last_checked": to_gmt8(log.timestamp).strftime(
-                                '%Y-%m-%d %H:%M:%S') if log.timestamp else 'N/A',
-                            "response_time_seconds": log.response_time_seconds,
+                    saved_state = saved_states.get(site.name)
+                    logs = recent_logs.get(site.name)
+                    if saved_state:
+                        site_statuses[site.name].update(saved_state)
+                        restored += 1
+                    elif logs:
+                        # 没有检查点：按最近的日志重放滑动窗口、连续计数与故障/减速开始时间
+                        site_statuses[site.name].update(_replay_recent_logs(logs, window_size, slow_window_size))
+                        rebuilt += 1
+                    if logs:
+                        # 用数据库中的最新日志更新状态
+                        latest_log = logs[0]
+                        site_statuses[site.name].update({
+                            "status": latest_log.status,
+                            "last_checked": _format_log_time(latest_log.timestamp) or 'N/A',
+                            "response_time_seconds": latest_log.response_time_seconds,
                         })
 
-            print(f"成功初始化 {len(latest_logs)} 个站点的状态。")
+            publish_status_snapshot()
+            logger.info(
+                "成功初始化 %d 个站点的状态，恢复 %d 个站点的告警状态，按最近日志重建 %d 个站点的滑动窗口。",
+                sum(1 for logs in recent_logs.values() if logs), restored, rebuilt,
+            )
         except Exception as e:
-            print(f"初始化站点状态失败: {e}")
+            logger.exception("初始化站点状态失败: %s", e)
+
+
+def _load_recent_logs(app, site_names: List[str], limit: int) -> Dict[str, List[Any]]:
+    """每个站点最近 limit 条日志（按时间倒序）；数据库不支持窗口函数时只读取最新一条。"""
+    if not timeline_sql.supported():
+        return {name: [log] for name, log in log_store.latest_logs(site_names).items()}
+    lookback = limit * app.config.get('MONITOR_INTERVAL_SECONDS', 60) * WARMUP_LOOKBACK_FACTOR
+    since = datetime.datetime.utcnow() - datetime.timedelta(seconds=lookback)
+    recent = log_store.recent_logs_by_site(site_names, limit, since=since)
+    # 新增站点或长时间未检查的站点在时间范围内不足 limit 条，不限范围再读一次
+    short_names = [name for name, logs in recent.items() if len(logs) < limit]
+    if short_names:
+        recent.update(log_store.recent_logs_by_site(short_names, limit))
+    return recent
+
+
+def _format_log_time(timestamp) -> Optional[str]:
+    return to_gmt8(timestamp).strftime('%Y-%m-%d %H:%M:%S') if timestamp else None
+
+
+def _replay_recent_logs(logs: List[Any], window_size: int, slow_window_size: int) -> Dict[str, Any]:
+    """按时间顺序重放最近的日志（logs 按时间倒序），规则与 _core_check_logic 一致。
+
+    连续计数最多为读取的条数；读取的日志全部为故障时，故障开始时间取其中最早一条的时间。
+    """
+    status = None
+    failure_count = success_count = slow_count = 0
+    history: List[int] = []
+    slow_history: List[int] = []
+    down_since = slow_since = None
+    for log in reversed(logs):
+        is_down = log.status == '无法访问'
+        is_slow = log.status == '访问过慢'
+        if is_down:
+            failure_count = failure_count + 1 if status == '无法访问' else 1
+            success_count = 0
+            slow_count = 0
+            slow_history = (slow_history + [0])[-slow_window_size:] if slow_window_size > 0 else []
+            slow_since = None
+            if status != '无法访问':
+                down_since = _format_log_time(log.timestamp)
+        else:
+            failure_count = 0
+            slow_history = (slow_history + [1 if is_slow else 0])[-slow_window_size:] if slow_window_size > 0 else []
+            if is_slow:
+                slow_count = slow_count + 1 if status == '访问过慢' else 1
+                if status != '访问过慢':
+                    slow_since = _format_log_time(log.timestamp)
+            else:
+                slow_count = 0
+                slow_since = None
+            if log.status == '正常':
+                success_count = success_count + 1 if status == '正常' else 1
+            else:
+                success_count = 0
+            down_since = None
+        history = (history + [1 if is_down else 0])[-window_size:] if window_size > 0 else []
+        status = log.status
+    return {
+        "failure_count": failure_count,
+        "success_count": success_count,
+        "slow_count": slow_count,
+        "history": history,
+        "slow_history": slow_history,
+        "down_since": down_since,
+        "slow_since": slow_since,
+    }
+
+
+def _checkpoint_alert_states(site_names: Iterable[str], removed: Iterable[str] = ()):
+    """把指定站点的告警判定状态写入检查点（只写入有变化的站点），并删除已移除站点的检查点。"""
+    removed = list(removed)
+    with status_lock:
+        states = {name: dict(site_statuses[name]) for name in site_names if name in site_statuses}
+    started = time.perf_counter()
+    try:
+        pending = alert_state.store.checkpoint(states, alert_state.counter_cap(current_app.config), removed)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        alert_state.store.invalidate()
+        metrics.DB_FLUSH_FAILURES_TOTAL.inc('alert_state')
+        logger.error("告警状态检查点写入失败: %s", e)
+    else:
+        metrics.DB_FLUSH_DURATION.observe(time.perf_counter() - started, 'alert_state')
+        alert_state.store.confirm(pending, removed)
+
+
+def publish_status_snapshot():
+    """把 site_statuses 的公开字段发布为 /health 读取的不可变快照。"""
+    with status_lock:
+        public = status_snapshot.public_statuses(site_statuses)
+    snapshot = status_snapshot.publish(public)
+    if status_snapshot.is_shared_writer():
+        # 独立检查进程：连同实时推送事件写入共享文件，供 Web 进程读取
+        status_snapshot.write_shared(snapshot, status_stream.hub.replay())
+    return snapshot
 
 
 # --- 通知函数 ---
@@ -330,6 +460,21 @@ def _send_channel_message(channel_cfg: Dict[str, Any], event_key: str, context:
         return False
 
 
+def _send_channel_message_timed(channel_cfg: Dict[str, Any], event_key: str, context: Dict[str, Any], logger) -> bool:
+    """发送并记录各渠道的耗时与结果（/metrics）。"""
+    channel_name = channel_cfg.get('name') or f"Channel#{channel_cfg.get('id') or '-'}"
+    channel_type = channel_cfg.get('channel_type') or 'unknown'
+    metrics.NOTIFICATIONS_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    try:
+        success = _send_channel_message(channel_cfg, event_key, context, logger)
+    finally:
+        metrics.NOTIFICATIONS_IN_FLIGHT.dec()
+    metrics.NOTIFICATION_DURATION.observe(time.perf_counter() - started, channel_name, channel_type)
+    metrics.NOTIFICATION_RESULTS_TOTAL.inc(channel_name, channel_type, 'success' if success else 'failure')
+    return success
+
+
 def _dispatch_notifications(event_key: str, context: Dict[str, Any]) -> None:
     channels = [
         channel.to_message_config()
@@ -350,11 +495,11 @@ def _dispatch_notifications(event_key: str, context: Dict[str, Any]) -> None:
 
     if workers == 1:
         for channel_cfg in channels:
-            _send_channel_message(channel_cfg, event_key, context, logger)
+            _send_channel_message_timed(channel_cfg, event_key, context, logger)
     else:
         with ThreadPoolExecutor(max_workers=workers) as executor:
             futures = [
-                executor.submit(_send_channel_message, channel_cfg, event_key, context, logger)
+                executor.submit(_send_channel_message_timed, channel_cfg, event_key, context, logger)
                 for channel_cfg in channels
             ]
             for future in futures:
@@ -397,6 +542,15 @@ def send_notification(site_name, url, current_status_key, previous_status, *, er
             'previous': previous_status,
         },
     }
+    status_stream.publish('alert', {
+        'site': site_name,
+        'event': current_status_key,
+        'label': meta['status_label'],
+        'previous_status': previous_status,
+        'timestamp': timestamp,
+        'http_code': http_code,
+        'error_detail': error_detail,
+    })
     _dispatch_notifications(current_status_key, payload)
 
 
@@ -450,7 +604,7 @@ def _format_ratio(count, total):
     return f"{count}/-" if not total else f"{count}/{total}"
 
 
-def _single_http_check(url, timeout, slow_threshold):
+def _single_http_check(url, timeout, slow_threshold, site_name=None):
     """执行一次 HTTP 检查，返回 (status, response_time, http_code, error_detail)。
     status: '正常' | '访问过慢' | 抛异常
     """
@@ -461,6 +615,7 @@ def _single_http_check(url, timeout, slow_threshold):
         headers={'User-Agent': 'WebMonitor/1.0'}
     )
     response_time = time.time() - start_time
+    metrics.observe_probe(site_name, response.elapsed.total_seconds(), response_time)
     http_status_code = response.status_code
     response.raise_for_status()
     if response_time > slow_threshold:
@@ -468,12 +623,32 @@ def _single_http_check(url, timeout, slow_threshold):
     return '正常', response_time, http_status_code, None
 
 
+# 检查结果（状态或失败原因）对应的 /metrics 标签
+PROBE_RESULT_LABELS = {
+    '正常': 'ok',
+    '访问过慢': 'slow',
+    '服务器错误': 'http_error',
+    '请求超时': 'timeout',
+    '连接错误': 'connection_error',
+}
+
+
 # --- 核心监控逻辑 ---
 def _core_check_logic():
     """包含核心检查逻辑的内部函数。"""
     sites_to_monitor = MonitoredSite.query.filter_by(is_active=True).all()
+    # 已停用或删除的站点从状态中移除，下一次发布时状态快照与共享状态表的站点索引随之更新
+    active_names = {site.name for site in sites_to_monitor}
+    with status_lock:
+        stale_names = [name for name in site_statuses if name not in active_names]
+        for name in stale_names:
+            del site_statuses[name]
+    if stale_names:
+        publish_status_snapshot()
     if not sites_to_monitor:
-        print("健康检查：数据库中没有活动的监控站点。")
+        if stale_names:
+            _checkpoint_alert_states((), stale_names)
+        logger.info("健康检查：数据库中没有活动的监控站点。")
         return
 
     # 读取配置与默认值
@@ -497,10 +672,20 @@ def _core_check_logic():
         alert_suppression_seconds = 0
     alert_suppression_seconds = max(0, alert_suppression_seconds)
 
-    print(f"开始执行健康检查，共 {len(sites_to_monitor)} 个网站...")
-
+    cycle_started = time.perf_counter()
+    logger.debug("开始执行健康检查，共 %d 个网站...", len(sites_to_monitor))
+    metrics.CHECK_CYCLE_SITES.set(len(sites_to_monitor))
+    debug_enabled = logger.isEnabledFor(logging.DEBUG)
+
+    log_rows = []
+    alerted_sites = {}
+    # 本轮汇总：各状态站点数、发送的告警数与 HTTP 检查累计耗时（含快速重试）
+    status_counts: Dict[str, int] = {}
+    alerts_sent = 0
+    probe_seconds = 0.0
     for site in sites_to_monitor:
         site_name, url = site.name, site.url
+        probe_started = time.perf_counter()
 
         current_status = "未知"
         response_time = None
@@ -508,7 +693,9 @@ def _core_check_logic():
         error_detail = None
 
         try:
-            current_status, response_time, http_status_code, _ = _single_http_check(url, request_timeout, slow_threshold)
+            current_status, response_time, http_status_code, _ = _single_http_check(
+                url, request_timeout, slow_threshold, site_name
+            )
         except requests.exceptions.RequestException as e:
             current_status = '无法访问'
             if isinstance(e, requests.exceptions.HTTPError):
@@ -530,14 +717,20 @@ def _core_check_logic():
                 try:
                     time.sleep(quick_retry_delay)
                     current_status, response_time, http_status_code, _ = _single_http_check(
-                        url, request_timeout, slow_threshold
+                        url, request_timeout, slow_threshold, site_name
                     )
                     retry_succeeded = True
+                    metrics.QUICK_RETRIES_TOTAL.inc('success')
                     break
                 except requests.exceptions.RequestException:
+                    metrics.QUICK_RETRIES_TOTAL.inc('failure')
                     continue
             if retry_succeeded:
                 error_detail = None
+        probe_seconds += time.perf_counter() - probe_started
+        status_counts[current_status] = status_counts.get(current_status, 0) + 1
+        result_label = PROBE_RESULT_LABELS.get(current_status) or PROBE_RESULT_LABELS.get(error_detail, 'other')
+        metrics.count_probe_result(site_name, result_label)
 
         now = datetime.datetime.now()
         now_utc = datetime.datetime.utcnow()
@@ -680,11 +873,14 @@ def _core_check_logic():
                     if not _should_send('down'):
                         _log_suppressed('down')
                     else:
-                        print(
-                            f"[告警触发] 宕机: {site_name} 当前状态={current_status}, 上次状态={prev_status}, "
-                            f"连续失败={failure_count}, 窗口失败={failure_window_display}, HTTP={http_status_code or 'N/A'}, "
-                            f"错误={error_detail or 'N/A'}, 故障开始={down_since_str or '刚刚'}"
+                        logger.warning(
+                            "[告警触发] 宕机: %s 当前状态=%s, 上次状态=%s, 连续失败=%d, 窗口失败=%s, HTTP=%s, "
+                            "错误=%s, 故障开始=%s",
+                            site_name, current_status, prev_status, failure_count, failure_window_display,
+                            http_status_code or 'N/A', error_detail or 'N/A', down_since_str or '刚刚',
+                            extra={'site': site_name, 'event': 'down'},
                         )
+                        alerts_sent += 1
                         context = [
                             ("检测时间", now_str),
                             ("故障开始时间", down_since_str or now_str),
@@ -703,6 +899,7 @@ def _core_check_logic():
                             context=context
                         )
                         _mark_sent('down')
+                        alerted_sites[site_name] = 'down'
                         site_statuses[site_name]["notification_sent"] = True
 
             if site_statuses[site_name]["notification_sent"] and current_status == '正常':
@@ -714,10 +911,12 @@ def _core_check_logic():
                         ("累计检查次数", total_checks),
                         ("最近一次响应时间", response_time_display),
                     ]
-                    print(
-                        f"[告警触发] 恢复: {site_name} 当前状态={current_status}, 上次状态=无法访问, "
-                        f"连续正常={success_count}, 持续时长={recovery_duration or '未知'}"
+                    logger.info(
+                        "[告警触发] 恢复: %s 当前状态=%s, 上次状态=无法访问, 连续正常=%d, 持续时长=%s",
+                        site_name, current_status, success_count, recovery_duration or '未知',
+                        extra={'site': site_name, 'event': 'recovered'},
                     )
+                    alerts_sent += 1
                     send_notification(
                         site_name,
                         url,
@@ -732,10 +931,12 @@ def _core_check_logic():
                     if not _should_send('slow'):
                         _log_suppressed('slow')
                     else:
-                        print(
-                            f"[告警触发] 慢响应: {site_name} 响应时间={response_time_display or 'N/A'}, "
-                            f"连续慢响应={slow_count}, 窗口慢响应={slow_window_display}"
+                        logger.warning(
+                            "[告警触发] 慢响应: %s 响应时间=%s, 连续慢响应=%d, 窗口慢响应=%s",
+                            site_name, response_time_display or 'N/A', slow_count, slow_window_display,
+                            extra={'site': site_name, 'event': 'slow'},
                         )
+                        alerts_sent += 1
                         slow_context = [
                             ("检测时间", now_str),
                             ("访问减速开始时间", slow_since_str or now_str),
@@ -755,6 +956,7 @@ def _core_check_logic():
                             context=slow_context
                         )
                         _mark_sent('slow')
+                        alerted_sites[site_name] = 'slow'
                         site_statuses[site_name]["slow_notification_sent"] = True
 
             if site_statuses[site_name]["slow_notification_sent"] and current_status == '正常':
@@ -766,10 +968,12 @@ def _core_check_logic():
                         ("累计检查次数", total_checks),
                         ("最近一次响应时间", response_time_display),
                     ]
-                    print(
-                        f"[告警触发] 慢响应恢复: {site_name} 当前状态={current_status}, "
-                        f"连续正常={success_count}, 慢响应持续时长={slow_recovery_duration or '未知'}"
+                    logger.info(
+                        "[告警触发] 慢响应恢复: %s 当前状态=%s, 连续正常=%d, 慢响应持续时长=%s",
+                        site_name, current_status, success_count, slow_recovery_duration or '未知',
+                        extra={'site': site_name, 'event': 'slow_recovered'},
                     )
+                    alerts_sent += 1
                     send_notification(
                         site_name,
                         url,
@@ -779,59 +983,507 @@ def _core_check_logic():
                     )
                     site_statuses[site_name]["slow_notification_sent"] = False
 
-        log_entry = HealthCheckLog(
-            site_name=site_name,
-            status=current_status,
-            response_time_seconds=rounded_response_time,
-            http_status_code=http_status_code,
-            error_detail=error_detail
-        )
-        db.session.add(log_entry)
+            # 实时推送本次检查结果，状态变化时另发 status 事件
+            public_status = status_snapshot.public_statuses({site_name: site_statuses[site_name]})[site_name]
+            status_stream.publish('check', {'site': site_name, 'status': public_status})
+            if current_status != prev_status:
+                status_stream.publish(
+                    'status', {'site': site_name, 'status': public_status, 'previous_status': prev_status}
+                )
 
-        print(
-            f"  - {site_name}: {current_status} (HTTP {http_status_code or 'N/A'}), "
-            f"响应时间: {response_time_display or 'N/A'}, 连续失败: {failure_count}, 窗口失败: {failure_window_display}, "
-            f"连续慢响应: {slow_count}, 慢响应窗口: {slow_window_display}, 连续正常: {success_count}, 累计检查: {total_checks}"
-        )
+        log_rows.append({
+            'site_name': site_name,
+            'timestamp': now_utc,
+            'status': current_status,
+            'response_time_seconds': rounded_response_time,
+            'http_status_code': http_status_code,
+            'error_detail': error_detail,
+        })
+
+        # 每个站点的明细只在 DEBUG 级别输出；未开启时不构造日志参数
+        if debug_enabled:
+            logger.debug(
+                "  - %s: %s (HTTP %s), 响应时间: %s, 连续失败: %d, 窗口失败: %s, "
+                "连续慢响应: %d, 慢响应窗口: %s, 连续正常: %d, 累计检查: %d",
+                site_name, current_status, http_status_code or 'N/A', response_time_display or 'N/A',
+                failure_count, failure_window_display, slow_count, slow_window_display, success_count, total_checks,
+                extra={
+                    'site': site_name,
+                    'status': current_status,
+                    'http_status': http_status_code,
+                    'response_time': rounded_response_time,
+                },
+            )
 
+    # 先发布状态快照再写日志，/health 不必等待数据库写入
+    publish_status_snapshot()
+
+    flush_started = started = time.perf_counter()
     try:
+        log_store.write_logs(log_rows)
         db.session.commit()
     except Exception as e:
         db.session.rollback()
-        print(f"健康检查日志提交失败: {e}")
-    print("健康检查完成。")
+        metrics.DB_FLUSH_FAILURES_TOTAL.inc('logs')
+        logger.error("健康检查日志提交失败: %s", e)
+    else:
+        metrics.DB_FLUSH_DURATION.observe(time.perf_counter() - started, 'logs')
+        started = time.perf_counter()
+        try:
+            segments.record_checks(log_rows, current_app.config.get('MONITOR_INTERVAL_SECONDS', 60))
+            incidents.record_checks(log_rows, alerted_sites)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            metrics.DB_FLUSH_FAILURES_TOTAL.inc('segments')
+            logger.error("状态区间与事件更新失败: %s", e)
+        else:
+            metrics.DB_FLUSH_DURATION.observe(time.perf_counter() - started, 'segments')
+    _checkpoint_alert_states(active_names, stale_names)
+    flush_seconds = time.perf_counter() - flush_started
+
+    cycle_seconds = time.perf_counter() - cycle_started
+    logger.info(
+        "健康检查完成：%d 个网站，正常 %d，访问过慢 %d，无法访问 %d，告警 %d 条；"
+        "耗时 %.2f 秒（HTTP 检查 %.2f 秒，写入数据库 %.3f 秒）",
+        len(sites_to_monitor), status_counts.get('正常', 0), status_counts.get('访问过慢', 0),
+        status_counts.get('无法访问', 0), alerts_sent, cycle_seconds, probe_seconds, flush_seconds,
+        extra={
+            'sites': len(sites_to_monitor),
+            'ok': status_counts.get('正常', 0),
+            'slow': status_counts.get('访问过慢', 0),
+            'down': status_counts.get('无法访问', 0),
+            'alerts': alerts_sent,
+            'duration_ms': round(cycle_seconds * 1000, 1),
+            'probe_ms': round(probe_seconds * 1000, 1),
+            'flush_ms': round(flush_seconds * 1000, 1),
+        },
+    )
 
 
 # --- 调度器入口函数 ---
 
 def check_website_health(app=None):
     """健康检查的入口函数，负责处理应用上下文。"""
+    check_cycle_idle.clear()
+    started = time.perf_counter()
+    try:
+        if app:
+            with app.app_context(), profiling.capture('check_cycle', app.config):
+                _core_check_logic()
+        else:
+            # 假设已在上下文中（例如，从 `flask shell` 或首次运行时调用）
+            with profiling.capture('check_cycle', current_app.config):
+                _core_check_logic()
+    finally:
+        metrics.CHECK_CYCLE_DURATION.observe(time.perf_counter() - started)
+        check_cycle_idle.set()
+    if status_snapshot.is_shared_writer():
+        # 独立检查进程：检查相关指标写入共享文件，由 Web 进程的 /metrics 输出
+        metrics.write_file((app or current_app).config['METRICS_PATH'])
+
+
+# --- 分层数据保留：聚合（Rollup） ---
+_EPOCH = datetime.datetime(1970, 1, 1)
+ROLLUP_STATUS_FIELDS = {'正常': 'up_count', '访问过慢': 'slow_count'}
+# 判断查询起点落在哪个数据层时，各层保留截止时间放宽的时长（见 select_history_resolution）
+RETENTION_CUTOFF_SLACK = datetime.timedelta(minutes=5)
+
+
+def rollup_retention_policy(config) -> Dict[int, int]:
+    """返回 {聚合粒度(秒): 保留天数}，按粒度从细到粗排列。"""
+    return {
+        HealthCheckRollup.RESOLUTION_MINUTE: int(config.get('ROLLUP_MINUTE_RETENTION_DAYS', 90)),
+        HealthCheckRollup.RESOLUTION_HOUR: int(config.get('ROLLUP_HOUR_RETENTION_DAYS', 730)),
+        HealthCheckRollup.RESOLUTION_DAY: int(config.get('ROLLUP_DAY_RETENTION_DAYS', 3650)),
+    }
+
+
+def history_max_days(config) -> int:
+    """仪表盘可查询的最长天数：原始记录与各聚合层保留期中的最大值。"""
+    retention_days = [int(config.get('DATA_RETENTION_DAYS', 30))]
+    retention_days.extend(rollup_retention_policy(config).values())
+    return max(retention_days)
+
+
+def select_history_resolution(start_time, config, now=None, site_names=None) -> int:
+    """
+    选择能覆盖查询起点的最细数据层：0 表示原始日志，否则为聚合粒度（秒）。
+
+    客户端在发出请求前计算起点，“最近 N 天”请求的起点总是略早于服务端的 now - N 天，
+    因此各层的保留截止时间放宽 RETENTION_CUTOFF_SLACK。起点仍早于原始日志的截止时间时，
+    给出 site_names 则再查询这些站点最早的原始日志：清理任务每天只运行一次，原始日志实际覆盖起点时仍使用原始日志。
+    """
+    now = now or datetime.datetime.utcnow()
+    if start_time.tzinfo is not None:
+        start_time = start_time.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    raw_cutoff = now - datetime.timedelta(days=int(config.get('DATA_RETENTION_DAYS', 30))) - RETENTION_CUTOFF_SLACK
+    if start_time >= raw_cutoff:
+        return 0
+    if site_names:
+        earliest_log = log_store.earliest_log_time(site_names)
+        if earliest_log is not None and earliest_log <= start_time:
+            return 0
+    policy = rollup_retention_policy(config)
+    for bucket_seconds, retention_days in policy.items():
+        if start_time >= now - datetime.timedelta(days=retention_days) - RETENTION_CUTOFF_SLACK:
+            return bucket_seconds
+    return max(policy)
+
+
+def _floor_to_bucket(value, bucket_seconds):
+    seconds = int((value - _EPOCH).total_seconds())
+    return _EPOCH + datetime.timedelta(seconds=seconds - seconds % bucket_seconds)
+
+
+def _new_rollup_bucket():
+    return {
+        'total_count': 0,
+        'up_count': 0,
+        'slow_count': 0,
+        'down_count': 0,
+        'response_time_sum': 0.0,
+        'response_time_count': 0,
+        'response_time_min': None,
+        'response_time_max': None,
+        'latency_sketch': LatencySketch(),
+    }
+
+
+def _merge_response_range(bucket, low, high):
+    if low is not None and (bucket['response_time_min'] is None or low < bucket['response_time_min']):
+        bucket['response_time_min'] = low
+    if high is not None and (bucket['response_time_max'] is None or high > bucket['response_time_max']):
+        bucket['response_time_max'] = high
+
+
+def _aggregate_raw_logs(since, until, bucket_seconds):
+    buckets = {}
+    source = log_store.log_source(since, until)
+    rows = db.session.execute(
+        sa.select(source.c.site_name, source.c.timestamp, source.c.status, source.c.response_time_seconds).where(
+            source.c.timestamp >= since,
+            source.c.timestamp < until,
+        ).execution_options(yield_per=5000)
+    )
+    for site_name, timestamp, status, response_time in rows:
+        bucket = buckets.setdefault((site_name, _floor_to_bucket(timestamp, bucket_seconds)), _new_rollup_bucket())
+        bucket['total_count'] += 1
+        # 与可用率口径保持一致：正常、访问过慢之外的状态都计为不可用
+        bucket[ROLLUP_STATUS_FIELDS.get(status, 'down_count')] += 1
+        if response_time is not None:
+            bucket['response_time_sum'] += response_time
+            bucket['response_time_count'] += 1
+            _merge_response_range(bucket, response_time, response_time)
+            bucket['latency_sketch'].add(response_time)
+    return buckets
+
+
+def _aggregate_rollups(source_seconds, since, until, bucket_seconds):
+    buckets = {}
+    rows = HealthCheckRollup.query.filter(
+        HealthCheckRollup.bucket_seconds == source_seconds,
+        HealthCheckRollup.bucket_start >= since,
+        HealthCheckRollup.bucket_start < until,
+    ).yield_per(5000)
+    for row in rows:
+        bucket = buckets.setdefault((row.site_name, _floor_to_bucket(row.bucket_start, bucket_seconds)), _new_rollup_bucket())
+        for field in ('total_count', 'up_count', 'slow_count', 'down_count', 'response_time_sum', 'response_time_count'):
+            bucket[field] += getattr(row, field) or 0
+        _merge_response_range(bucket, row.response_time_min, row.response_time_max)
+        if row.latency_sketch:
+            bucket['latency_sketch'].merge(LatencySketch.from_bytes(row.latency_sketch))
+    return buckets
+
+
+def _replace_rollup_buckets(bucket_seconds, since, until, buckets):
+    db.session.query(HealthCheckRollup).filter(
+        HealthCheckRollup.bucket_seconds == bucket_seconds,
+        HealthCheckRollup.bucket_start >= since,
+        HealthCheckRollup.bucket_start < until,
+    ).delete(synchronize_session=False)
+    if buckets:
+        db.session.bulk_insert_mappings(HealthCheckRollup, [
+            dict(
+                values,
+                site_name=site_name,
+                bucket_seconds=bucket_seconds,
+                bucket_start=bucket_start,
+                latency_sketch=values['latency_sketch'].to_bytes() if values['latency_sketch'].count else None,
+            )
+            for (site_name, bucket_start), values in buckets.items()
+        ])
+
+
+def _core_rollup_logic():
+    """逐层刷新聚合数据：原始日志 -> 分钟 -> 小时 -> 天。
+    每层从该层最后一个（可能尚未完整的）时间桶开始重算，保证任务可重复执行。
+    """
+    now = datetime.datetime.utcnow()
+    source_seconds = None
+    written = {}
+    for bucket_seconds in rollup_retention_policy(current_app.config):
+        watermark = db.session.query(func.max(HealthCheckRollup.bucket_start)).filter(
+            HealthCheckRollup.bucket_seconds == bucket_seconds
+        ).scalar()
+        if watermark is None:
+            if source_seconds is None:
+                earliest = [
+                    db.session.execute(sa.select(func.min(table.c.timestamp))).scalar()
+                    for table in log_store.log_tables()
+                ]
+                watermark = min((value for value in earliest if value is not None), default=None)
+            else:
+                watermark = db.session.query(func.min(HealthCheckRollup.bucket_start)).filter(
+                    HealthCheckRollup.bucket_seconds == source_seconds
+                ).scalar()
+        if watermark is not None:
+            # 每批处理的时间窗口是粒度的整数倍，既控制内存，又保证桶边界对齐
+            window = datetime.timedelta(seconds=max(86400, bucket_seconds * 30))
+            since = _floor_to_bucket(watermark, bucket_seconds)
+            count = 0
+            while since <= now:
+                until = since + window
+                if source_seconds is None:
+                    buckets = _aggregate_raw_logs(since, until, bucket_seconds)
+                else:
+                    buckets = _aggregate_rollups(source_seconds, since, until, bucket_seconds)
+                _replace_rollup_buckets(bucket_seconds, since, until, buckets)
+                db.session.commit()
+                count += len(buckets)
+                since = until
+            written[bucket_seconds] = count
+        source_seconds = bucket_seconds
+    return written
+
+
+def rollup_health_logs(app=None):
+    """刷新聚合数据的入口函数，负责处理应用上下文。"""
+
+    def _run():
+        try:
+            written = _core_rollup_logic()
+            summary = ', '.join(f"{seconds}s={count}" for seconds, count in written.items()) or '无数据'
+            logger.info("聚合任务完成：%s", summary)
+        except Exception as e:
+            db.session.rollback()
+            logger.exception("聚合任务失败: %s", e)
+
     if app:
         with app.app_context():
-            _core_check_logic()
+            _run()
     else:
-        # 假设已在上下文中（例如，从 `flask shell` 或首次运行时调用）
-        _core_check_logic()
+        _run()
+
+
+# --- 数据清理：分批删除与增量 VACUUM ---
+def _delete_in_batches(table, criteria, label, stats):
+    """按主键区间分批删除满足条件的记录（table 为 Core Table）。
+    每批单独提交以缩短写锁持有时间，批次之间让出时间片，并等待正在进行的检查周期结束。
+    """
+    config = current_app.config
+    batch_size = max(100, int(config.get('CLEANUP_BATCH_SIZE', 5000)))
+    pause_seconds = max(0.0, float(config.get('CLEANUP_BATCH_PAUSE_SECONDS', 0.1)))
+    duty_cycle = min(1.0, max(0.05, float(config.get('CLEANUP_MAX_DUTY_CYCLE', 0.5))))
+    checker_wait = max(0.0, float(config.get('CLEANUP_CHECKER_WAIT_SECONDS', 30)))
+
+    min_id, max_id = db.session.execute(
+        sa.select(func.min(table.c.id), func.max(table.c.id)).where(*criteria)
+    ).one()
+    db.session.commit()
+    if min_id is None:
+        return 0
+
+    deleted_total = 0
+    batches = 0
+    lower = min_id
+    started = time.perf_counter()
+    while lower <= max_id:
+        upper = lower + batch_size
+        check_cycle_idle.wait(timeout=checker_wait)
+        batch_started = time.perf_counter()
+        deleted = db.session.execute(
+            sa.delete(table).where(table.c.id >= lower, table.c.id < upper, *criteria)
+        ).rowcount
+        db.session.commit()
+        batch_elapsed = time.perf_counter() - batch_started
+        deleted_total += deleted
+        batches += 1
+        lower = upper
+        if batches % 20 == 0:
+            logger.info(
+                "数据库清理任务：%s 已删除 %d 条（%d 批，进度 %.0f%%）",
+                label, deleted_total, batches, min(100.0, (lower - min_id) / max(1, max_id - min_id + 1) * 100),
+            )
+        # 按占空比节流：删除耗时越长，让出的时间越长，保证检查任务始终能拿到写锁
+        time.sleep(max(pause_seconds, batch_elapsed * (1 - duty_cycle) / duty_cycle))
+
+    stats['tables'][label] = {
+        'deleted': deleted_total,
+        'batches': batches,
+        'duration_seconds': round(time.perf_counter() - started, 3),
+    }
+    stats['deleted_total'] += deleted_total
+    return deleted_total
+
+
+def _is_sqlite():
+    return db.engine.dialect.name == 'sqlite'
+
+
+def enable_incremental_vacuum():
+    """将 SQLite 数据库切换为增量 VACUUM 模式（需要一次完整 VACUUM，耗时与库大小成正比）。"""
+    if not _is_sqlite():
+        return False
+    with db.engine.connect() as connection:
+        connection.exec_driver_sql('PRAGMA auto_vacuum = INCREMENTAL')
+        connection.exec_driver_sql('VACUUM')
+    return True
+
+
+def _incremental_vacuum(stats):
+    """回收空闲页，使数据库文件随清理而收缩。仅在 auto_vacuum=INCREMENTAL 时生效。"""
+    if not _is_sqlite():
+        return
+    auto_vacuum = db.session.execute(text('PRAGMA auto_vacuum')).scalar()
+    free_pages = db.session.execute(text('PRAGMA freelist_count')).scalar() or 0
+    db.session.commit()
+    stats['free_pages_before'] = free_pages
+    if auto_vacuum != 2:
+        if free_pages:
+            logger.info(
+                "数据库清理任务：当前有 %d 个空闲页未回收。"
+                "执行 `flask cleanup-data --enable-incremental-vacuum` 可开启增量回收。",
+                free_pages,
+            )
+        return
+    step_pages = max(1, int(current_app.config.get('CLEANUP_VACUUM_STEP_PAGES', 2000)))
+    pause_seconds = max(0.0, float(current_app.config.get('CLEANUP_BATCH_PAUSE_SECONDS', 0.1)))
+    reclaimed = 0
+    while free_pages > 0:
+        check_cycle_idle.wait(timeout=float(current_app.config.get('CLEANUP_CHECKER_WAIT_SECONDS', 30)))
+        # incremental_vacuum 每释放一页产生一行结果，需通过 DBAPI 游标读完结果集才会执行完整批次
+        cursor = db.session.connection().connection.cursor()
+        try:
+            cursor.execute(f'PRAGMA incremental_vacuum({step_pages})')
+            cursor.fetchall()
+        finally:
+            cursor.close()
+        db.session.commit()
+        remaining = db.session.execute(text('PRAGMA freelist_count')).scalar() or 0
+        db.session.commit()
+        if remaining >= free_pages:
+            break
+        reclaimed += free_pages - remaining
+        free_pages = remaining
+        time.sleep(pause_seconds)
+    stats['vacuumed_pages'] = reclaimed
 
 
 def cleanup_old_data(app=None):
-    """清理旧数据的入口函数，负责处理应用上下文。"""
+    """清理旧数据的入口函数，负责处理应用上下文。
+    原始日志与各聚合层分别按自己的保留期清理；清理原始日志前先刷新聚合，避免丢失统计数据。
+    """
 
     def _core_cleanup_logic():
         retention_days = current_app.config['DATA_RETENTION_DAYS']
-        cutoff_date = datetime.datetime.utcnow() - datetime.timedelta(days=retention_days)
+        now = datetime.datetime.utcnow()
+        cutoff_date = now - datetime.timedelta(days=retention_days)
+        stats = {
+            'started_at': now.isoformat(timespec='seconds'),
+            'status': 'running',
+            'tables': {},
+            'deleted_total': 0,
+            'vacuumed_pages': 0,
+        }
+        last_cleanup_stats.clear()
+        last_cleanup_stats.update(stats)
+        started = time.perf_counter()
 
         try:
-            deleted_count = db.session.query(HealthCheckLog).filter(HealthCheckLog.timestamp < cutoff_date).delete(
-                synchronize_session=False)
-            db.session.commit()
-            if deleted_count > 0:
-                print(f"数据库清理任务：已清理 {deleted_count} 条 {retention_days} 天前的旧数据。")
-            else:
-                print("数据库清理任务：没有需要清理的旧数据。")
+            _core_rollup_logic()
         except Exception as e:
             db.session.rollback()
-            print(f"数据库清理任务失败: {e}")
+            logger.exception("数据库清理任务：刷新聚合数据失败，本次跳过原始日志清理: %s", e)
+            last_cleanup_stats.update(status='failed', error=str(e))
+            return
+
+        # 开启冷归档时先把过期日志导出到归档文件，导出失败则保留数据库中的日志等待下次重试
+        archived = True
+        if current_app.config.get('LOG_ARCHIVE_ENABLED'):
+            try:
+                for table in log_store.log_tables(end=cutoff_date):
+                    archive.export_logs(table, cutoff_date, stats)
+                logger.info("数据库清理任务：已归档 %d 条过期日志。", stats.get('archived_total', 0))
+            except Exception as e:
+                db.session.rollback()
+                logger.exception("数据库清理任务：归档过期日志失败，本次跳过原始日志清理: %s", e)
+                stats['error'] = str(e)
+                archived = False
+        if archived:
+            try:
+                deleted_count = 0
+                # 分区模式：整体过期的分区直接 DROP，只有跨越截止时间的分区与旧单表需要逐批删除
+                for partition in log_store.expired_partitions(cutoff_date):
+                    log_store.drop_partition(partition)
+                    stats.setdefault('dropped_partitions', []).append(partition.name)
+                    logger.info("数据库清理任务：已删除过期分区 %s。", partition.name)
+                for table in log_store.log_tables(end=cutoff_date):
+                    deleted_count += _delete_in_batches(
+                        table, [table.c.timestamp < cutoff_date], table.name, stats
+                    )
+                if deleted_count > 0:
+                    logger.info("数据库清理任务：已清理 %d 条 %d 天前的旧数据。", deleted_count, retention_days)
+                else:
+                    logger.info("数据库清理任务：没有需要清理的旧数据。")
+            except Exception as e:
+                db.session.rollback()
+                logger.exception("数据库清理任务失败: %s", e)
+                stats['error'] = str(e)
+
+        # 状态区间与事件与原始日志同步保留，只删除结束时间早于截止时间的记录（持续中的事件保留）
+        for derived_table in (StatusSegment.__table__, Incident.__table__):
+            try:
+                _delete_in_batches(
+                    derived_table, [derived_table.c.end_time < cutoff_date], derived_table.name, stats
+                )
+            except Exception as e:
+                db.session.rollback()
+                logger.exception("数据库清理任务：清理 %s 失败: %s", derived_table.name, e)
+                stats['error'] = str(e)
+
+        for bucket_seconds, tier_days in rollup_retention_policy(current_app.config).items():
+            tier_cutoff = now - datetime.timedelta(days=tier_days)
+            try:
+                rollup_table = HealthCheckRollup.__table__
+                deleted_count = _delete_in_batches(
+                    rollup_table,
+                    [rollup_table.c.bucket_seconds == bucket_seconds, rollup_table.c.bucket_start < tier_cutoff],
+                    f'health_check_rollup[{bucket_seconds}s]',
+                    stats,
+                )
+                if deleted_count > 0:
+                    logger.info("数据库清理任务：已清理 %d 条 %d 天前的 %d 秒聚合数据。", deleted_count, tier_days, bucket_seconds)
+            except Exception as e:
+                db.session.rollback()
+                logger.exception("数据库清理任务：清理 %d 秒聚合数据失败: %s", bucket_seconds, e)
+                stats['error'] = str(e)
+
+        if stats['deleted_total'] > 0:
+            try:
+                _incremental_vacuum(stats)
+            except Exception as e:
+                db.session.rollback()
+                logger.exception("数据库清理任务：增量回收空间失败: %s", e)
+
+        stats['duration_seconds'] = round(time.perf_counter() - started, 3)
+        stats['finished_at'] = datetime.datetime.utcnow().isoformat(timespec='seconds')
+        stats['status'] = 'failed' if stats.get('error') else 'completed'
+        last_cleanup_stats.update(stats)
+        logger.info(
+            "数据库清理任务完成：共删除 %d 条记录，回收 %d 页，耗时 %.1f 秒。",
+            stats['deleted_total'], stats['vacuumed_pages'], stats['duration_seconds'],
+        )
 
     if app:
         with app.app_context():
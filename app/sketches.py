@@ -0,0 +1,148 @@
+# web-monitor/app/sketches.py
+"""
+可合并的响应时间分位数草图（DDSketch 风格的对数分桶直方图）。
+
+响应时间 x 落入下标为 ceil(log_γ(x)) 的桶，γ = (1 + α) / (1 - α)，桶的代表值为 2γ^i / (γ + 1)。
+任意分位数的估计值与排序后同一名次的真实值相对误差不超过 α（RELATIVE_ACCURACY = 1%）；
+小于 MIN_VALUE 的值计入零值桶，按 0 返回。两个草图合并只需把对应桶的计数相加，
+因此聚合任务按 站点 / 时间桶 保存草图，任意时间范围、任意站点组合的 P95/P99 都可以由草图合并得到。
+
+序列化格式（小端）：版本号 uint8、零值计数 uint32、非空桶数 uint32，随后是各桶下标 int16 与计数 uint32。
+"""
+import math
+import struct
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+RELATIVE_ACCURACY = 0.01
+MIN_VALUE = 1e-4
+SKETCH_VERSION = 1
+
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+_HEADER = struct.Struct('<BII')
+# 下标范围覆盖 MIN_VALUE 到 1e4 秒以上，更大的值计入最后一个桶
+_MIN_INDEX = math.ceil(math.log(MIN_VALUE) / _LOG_GAMMA)
+_MAX_INDEX = 32767
+_INDEX_DTYPE = np.dtype('<i2')
+_COUNT_DTYPE = np.dtype('<u4')
+
+
+def _bucket_indices(values: np.ndarray) -> np.ndarray:
+    indices = np.ceil(np.log(values) / _LOG_GAMMA)
+    return np.clip(indices, _MIN_INDEX, _MAX_INDEX).astype(np.int64)
+
+
+def _bucket_value(index: int) -> float:
+    return 2 * _GAMMA ** index / (_GAMMA + 1)
+
+
+class LatencySketch:
+    """稀疏保存各桶计数的分位数草图。"""
+
+    __slots__ = ('zero_count', 'bins')
+
+    def __init__(self):
+        self.zero_count = 0
+        self.bins = {}
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + sum(self.bins.values())
+
+    def add(self, value: Optional[float]) -> None:
+        if value is None or value != value:
+            return
+        if value < MIN_VALUE:
+            self.zero_count += 1
+            return
+        index = min(max(math.ceil(math.log(value) / _LOG_GAMMA), _MIN_INDEX), _MAX_INDEX)
+        self.bins[index] = self.bins.get(index, 0) + 1
+
+    def add_many(self, values: Sequence[float]) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        small = values < MIN_VALUE
+        self.zero_count += int(np.count_nonzero(small))
+        indices, counts = np.unique(_bucket_indices(values[~small]), return_counts=True)
+        for index, count in zip(indices.tolist(), counts.tolist()):
+            self.bins[index] = self.bins.get(index, 0) + count
+
+    def merge(self, other: 'LatencySketch') -> None:
+        self.zero_count += other.zero_count
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+
+    def to_bytes(self) -> bytes:
+        indices = sorted(self.bins)
+        return (
+            _HEADER.pack(SKETCH_VERSION, self.zero_count, len(indices))
+            + np.asarray(indices, dtype=_INDEX_DTYPE).tobytes()
+            + np.asarray([self.bins[index] for index in indices], dtype=_COUNT_DTYPE).tobytes()
+        )
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> 'LatencySketch':
+        sketch = cls()
+        zero_count, indices, counts = _decode(blob)
+        sketch.zero_count = zero_count
+        sketch.bins = dict(zip(indices.tolist(), counts.tolist()))
+        return sketch
+
+    def quantile(self, q: float) -> Optional[float]:
+        """返回排序后第 min(int(n*q), n-1) 个值（与 get_history 的取值方式一致）的估计值。"""
+        return _quantile(self.zero_count, self.bins, q)
+
+
+def _decode(blob: bytes):
+    version, zero_count, size = _HEADER.unpack_from(blob, 0)
+    if version != SKETCH_VERSION:
+        raise ValueError(f'不支持的草图版本: {version}')
+    offset = _HEADER.size
+    indices = np.frombuffer(blob, dtype=_INDEX_DTYPE, count=size, offset=offset)
+    counts = np.frombuffer(blob, dtype=_COUNT_DTYPE, count=size, offset=offset + size * _INDEX_DTYPE.itemsize)
+    return zero_count, indices, counts
+
+
+def _quantile(zero_count: int, bins, q: float) -> Optional[float]:
+    total = zero_count + sum(bins.values())
+    if total == 0:
+        return None
+    rank = min(int(total * q), total - 1)
+    if rank < zero_count:
+        return 0.0
+    seen = zero_count
+    for index in sorted(bins):
+        seen += bins[index]
+        if seen > rank:
+            return _bucket_value(index)
+    return _bucket_value(max(bins))
+
+
+def merge_blobs(blobs: Iterable[Optional[bytes]]) -> LatencySketch:
+    """合并多个序列化的草图（忽略 None）。
+    只切片拼接各草图的下标段与计数段，最后用一次 bincount 累加，合并大量小草图时避免逐个解码。
+    """
+    zero_count = 0
+    index_parts = []
+    count_parts = []
+    for blob in blobs:
+        if not blob:
+            continue
+        version, blob_zero, size = _HEADER.unpack_from(blob, 0)
+        if version != SKETCH_VERSION:
+            raise ValueError(f'不支持的草图版本: {version}')
+        zero_count += blob_zero
+        counts_offset = _HEADER.size + size * _INDEX_DTYPE.itemsize
+        index_parts.append(blob[_HEADER.size:counts_offset])
+        count_parts.append(blob[counts_offset:counts_offset + size * _COUNT_DTYPE.itemsize])
+    sketch = LatencySketch()
+    sketch.zero_count = zero_count
+    indices = np.frombuffer(b''.join(index_parts), dtype=_INDEX_DTYPE).astype(np.int64) - _MIN_INDEX
+    if indices.size:
+        counts = np.frombuffer(b''.join(count_parts), dtype=_COUNT_DTYPE)
+        dense = np.bincount(indices, weights=counts).astype(np.int64)
+        present = np.flatnonzero(dense)
+        sketch.bins = dict(zip((present + _MIN_INDEX).tolist(), dense[present].tolist()))
+    return sketch
@@ -0,0 +1,185 @@
+# web-monitor/app/startup.py
+"""
+应用启动：一次性初始化标记与启动耗时分析。
+
+db.create_all()、旧版通知配置迁移与按配置创建默认通知渠道只需要在数据库结构或相关配置变化后执行。
+执行完成后把标记（BOOTSTRAP_VERSION、各模型表的建表与建索引语句以及相关配置的摘要）写入 app_bootstrap 表，
+之后的启动只读取一次标记，一致时跳过这些步骤；修改模型（表、列或索引）或相关配置时标记变化，自动重新执行。
+需要强制重新执行时递增 BOOTSTRAP_VERSION，或运行 flask init-db。
+
+注意：create_all 只创建缺少的表与其索引，不修改已有的表。给已有的表增删列或索引时必须同时提供
+Alembic 迁移（flask db migrate / flask db upgrade），标记只保证模型变化后重新执行上述步骤。
+
+设置 STARTUP_PROFILE=true 时 create_app 把各阶段耗时写入日志；`python -m app.startup` 在新进程中以
+-X importtime 创建应用，另外按顶层包汇总导入耗时。
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+import sqlalchemy as sa
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from . import config_sync
+from .extensions import db
+from .models import AppBootstrap, MonitoringConfig, NotificationChannel
+
+BOOTSTRAP_VERSION = 1
+# 影响 NotificationChannel.bootstrap_from_config 结果的配置项
+BOOTSTRAP_CONFIG_KEYS = (
+    'QYWECHAT_WEBHOOK_URL',
+    'GENERIC_WEBHOOK_ENABLED',
+    'GENERIC_WEBHOOK_URL',
+    'GENERIC_WEBHOOK_HEADERS',
+    'GENERIC_WEBHOOK_TEMPLATE',
+)
+
+
+class StartupProfile:
+    """记录 create_app 各阶段的耗时。"""
+
+    def __init__(self):
+        self.phases: List[Tuple[str, float]] = []
+
+    def record(self, name: str, seconds: float):
+        self.phases.append((name, seconds))
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(seconds for _, seconds in self.phases)
+
+    def report(self) -> str:
+        lines = ['启动耗时分析:']
+        for name, seconds in self.phases:
+            lines.append(f'  {name:<28} {seconds * 1000:8.1f} ms')
+        lines.append(f"  {'合计':<28} {self.total_seconds * 1000:8.1f} ms")
+        return '\n'.join(lines)
+
+
+def _schema_ddl() -> dict:
+    """{表名: 建表语句与各索引的建索引语句}，按当前数据库方言编译。"""
+    dialect = db.engine.dialect
+    schema = {}
+    for name, table in sorted(db.metadata.tables.items()):
+        statements = [str(CreateTable(table).compile(dialect=dialect)).strip()]
+        statements.extend(
+            str(CreateIndex(index).compile(dialect=dialect)).strip()
+            for index in sorted(table.indexes, key=lambda index: index.name or '')
+        )
+        schema[name] = statements
+    return schema
+
+
+def bootstrap_marker(config) -> str:
+    payload = {
+        'version': BOOTSTRAP_VERSION,
+        'tables': _schema_ddl(),
+        'config': {key: config.get(key) for key in BOOTSTRAP_CONFIG_KEYS},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _stored_marker():
+    try:
+        return db.session.execute(sa.select(AppBootstrap.marker).where(AppBootstrap.id == 1)).scalar()
+    except SQLAlchemyError:
+        # 新数据库或升级前的数据库尚无 app_bootstrap 表
+        db.session.rollback()
+        return None
+
+
+def _store_marker(marker: str):
+    table = AppBootstrap.__table__
+    now = datetime.datetime.utcnow()
+    try:
+        updated = db.session.execute(
+            sa.update(table).where(table.c.id == 1).values(marker=marker, completed_at=now)
+        ).rowcount
+        if not updated:
+            db.session.execute(sa.insert(table).values(id=1, marker=marker, completed_at=now))
+        db.session.commit()
+    except IntegrityError:
+        # 另一个进程同时完成了初始化
+        db.session.rollback()
+
+
+def prepare_database(app) -> bool:
+    """确保数据库与动态配置就绪（需在应用上下文中调用）；返回本次是否执行了一次性初始化。"""
+    marker = bootstrap_marker(app.config)
+    bootstrapped = _stored_marker() != marker
+    if bootstrapped:
+        db.create_all()
+    monitoring_config = MonitoringConfig.ensure(app.config)
+    monitoring_config.apply_to_config(app.config)
+    config_sync.mark_applied(app, monitoring_config)
+    if bootstrapped:
+        NotificationChannel.bootstrap_from_config(app.config)
+        _store_marker(marker)
+    return bootstrapped
+
+
+_IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+
+def summarize_import_times(stderr: str, top: int = 15) -> List[Tuple[str, float, float]]:
+    """解析 -X importtime 输出，按顶层包汇总：[(包名, 自身耗时合计秒, 最大累计耗时秒), ...]。"""
+    packages = {}
+    for line in stderr.splitlines():
+        match = _IMPORT_TIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, _, module = match.groups()
+        package = module.split('.')[0]
+        own, cumulative = packages.get(package, (0, 0))
+        packages[package] = (own + int(self_us), max(cumulative, int(cumulative_us)))
+    ranked = sorted(packages.items(), key=lambda item: item[1][0], reverse=True)[:top]
+    return [(package, own / 1e6, cumulative / 1e6) for package, (own, cumulative) in ranked]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='在新进程中创建应用，输出各阶段与导入模块的耗时。')
+    parser.add_argument('--config', default='config', help='配置对象（默认 config）')
+    parser.add_argument('--no-web', action='store_true', help='按独立检查进程的方式创建应用（不注册后台管理与页面）')
+    parser.add_argument('--top', type=int, default=15, help='列出导入耗时最多的前 N 个顶层包')
+    args = parser.parse_args(argv)
+
+    code = (
+        f'from app import create_app; '
+        f"print(create_app({args.config!r}, web={not args.no_web}).extensions['startup_profile'].report())"
+    )
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+    )
+    elapsed = time.perf_counter() - started
+    print(result.stdout, end='')
+    if result.returncode != 0:
+        print(result.stderr, file=sys.stderr)
+        sys.exit(result.returncode)
+    print('导入耗时最多的顶层包（自身耗时合计 / 最大累计耗时）:')
+    for package, own, cumulative in summarize_import_times(result.stderr, args.top):
+        print(f'  {package:<28} {own * 1000:8.1f} ms {cumulative * 1000:8.1f} ms')
+    print(f'进程总耗时（含解释器启动，-X importtime 本身会增加少量开销）: {elapsed * 1000:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
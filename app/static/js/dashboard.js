@@ -1,5 +1,13 @@
-import { determinePickerLocale, toLocalISOString, setChartEmptyState } from './utils.js';
-import { renderAlertHistory, renderAlertHistoryError, updateSummaryCards, updateStatusWall, filterAndScrollToAlerts } from './ui.js';
+import { determinePickerLocale, toLocalISOString, setChartEmptyState, mergeHistoryDelta, parseDate, decodeCompactHistory } from './utils.js';
+import {
+    renderAlertHistory,
+    renderAlertHistoryError,
+    updateSummaryCards,
+    updateStatusWall,
+    connectStatusStream,
+    isStatusStreamActive,
+    filterAndScrollToAlerts,
+} from './ui.js';
 import { renderUptimeHistory, renderComparisonCharts, renderSLAComparison } from './charts.js';
 
 document.addEventListener('DOMContentLoaded', () => {
@@ -33,9 +41,12 @@ document.addEventListener('DOMContentLoaded', () => {
     const alertTypeFilter = document.getElementById('alert-type-filter');
 
     const initialStatuses = window.INITIAL_STATUSES;
-    const dataRetentionDays = 30;
+    const dataRetentionDays = window.HISTORY_MAX_DAYS || window.DATA_RETENTION_DAYS || 30;
     let currentParams = {};
     let rangePicker;
+    // 相对时间范围（如最近 12 小时）下定期增量刷新历史数据；请求序号用于丢弃被新请求取代的响应
+    const HISTORY_REFRESH_INTERVAL_MS = 60000;
+    let historyRequestSeq = 0;
 
     const uiContext = {
         elements: {
@@ -95,9 +106,31 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
-    async function updateDashboard() {
-        const selectedSites = Array.from(document.querySelectorAll('.status-card.selected'))
+    function getSelectedSites() {
+        return Array.from(document.querySelectorAll('.status-card.selected'))
             .map(card => card.dataset.siteName);
+    }
+
+    function getMaxPoints() {
+        // 响应时间曲线每个物理像素最多一个点，服务端据此降采样
+        const chartWidth = responseTimeChartContainer ? responseTimeChartContainer.clientWidth : 0;
+        return Math.max(200, Math.round(chartWidth * (window.devicePixelRatio || 1)));
+    }
+
+    function renderHistory(data, selectedSites) {
+        uiContext.state.latestHistoryData = data;
+        updateSummaryCards(data, selectedSites, summaryElements);
+        renderUptimeHistory(data, charts, currentParams, (siteName, startTime, endTime, status) => {
+            filterAndScrollToAlerts({ siteName, startTime, endTime, status }, uiContext);
+        });
+        renderComparisonCharts(data, charts, currentParams);
+        renderSLAComparison(data, charts);
+        renderAlertHistory(data, {}, uiContext);
+    }
+
+    async function updateDashboard() {
+        const requestSeq = ++historyRequestSeq;
+        const selectedSites = getSelectedSites();
         updateSummaryCards(null, selectedSites, summaryElements);
         if (selectedSites.length === 0) {
             setChartEmptyState(timelineChart, timelineChartContainer, '请选择至少一个网站以查看历史数据');
@@ -117,19 +150,15 @@ document.addEventListener('DOMContentLoaded', () => {
         const siteParams = selectedSites.map(s => `sites=${encodeURIComponent(s)}`).join('&');
         const timeParams = `start_time=${currentParams.start_iso}&end_time=${currentParams.end_iso}`;
         try {
-            const response = await fetch(`/api/history?${siteParams}&${timeParams}`);
+            const response = await fetch(`/api/history?${siteParams}&${timeParams}&max_points=${getMaxPoints()}&format=compact`);
             if (!response.ok) {
                 throw new Error(`API 请求失败: ${response.status}`);
             }
-            const data = await response.json();
-            uiContext.state.latestHistoryData = data;
-            updateSummaryCards(data, selectedSites, summaryElements);
-            renderUptimeHistory(data, charts, currentParams, (siteName, startTime, endTime, status) => {
-                filterAndScrollToAlerts({ siteName, startTime, endTime, status }, uiContext);
-            });
-            renderComparisonCharts(data, charts, currentParams);
-            renderSLAComparison(data, charts);
-            renderAlertHistory(data, {}, uiContext);
+            const data = decodeCompactHistory(await response.json());
+            if (requestSeq !== historyRequestSeq) {
+                return;
+            }
+            renderHistory(data, selectedSites);
         } catch (error) {
             console.error(error);
             setChartEmptyState(timelineChart, timelineChartContainer, '数据加载失败，请稍后重试');
@@ -143,14 +172,60 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
-    function setAndTriggerUpdate(startDate, endDate) {
+    function setAndTriggerUpdate(startDate, endDate, rangeMs = null) {
         currentParams = {
             start_iso: toLocalISOString(startDate),
-            end_iso: toLocalISOString(endDate)
+            end_iso: toLocalISOString(endDate),
+            rangeMs
         };
         updateDashboard();
     }
 
+    async function refreshHistoryDelta() {
+        const previous = uiContext.state.latestHistoryData;
+        const selectedSites = getSelectedSites();
+        if (!currentParams.rangeMs || !previous || document.hidden || selectedSites.length === 0) {
+            return;
+        }
+        if (selectedSites.some(siteName => !previous[siteName])) {
+            return;
+        }
+        // 以各站点游标中最早的一个作为 since，保证每个站点都不会漏掉数据
+        const cursors = selectedSites.map(siteName => previous[siteName].cursor);
+        let since = null;
+        if (cursors.every(Boolean)) {
+            since = cursors.reduce((earliest, cursor) => (Date.parse(cursor) < Date.parse(earliest) ? cursor : earliest));
+        }
+        const end = new Date();
+        const start = new Date(end.getTime() - currentParams.rangeMs);
+        const params = {
+            start_iso: toLocalISOString(start),
+            end_iso: toLocalISOString(end),
+            rangeMs: currentParams.rangeMs
+        };
+        const requestSeq = ++historyRequestSeq;
+        const siteParams = selectedSites.map(s => `sites=${encodeURIComponent(s)}`).join('&');
+        const sinceParam = since ? `&since=${encodeURIComponent(since)}` : '';
+        try {
+            const response = await fetch(
+                `/api/history?${siteParams}&start_time=${params.start_iso}&end_time=${params.end_iso}&max_points=${getMaxPoints()}&format=compact${sinceParam}`
+            );
+            if (!response.ok) {
+                throw new Error(`API 请求失败: ${response.status}`);
+            }
+            const update = decodeCompactHistory(await response.json());
+            if (requestSeq !== historyRequestSeq) {
+                return;
+            }
+            currentParams = params;
+            const windowStartMs = parseDate(params.start_iso).getTime();
+            const data = since ? mergeHistoryDelta(previous, update, Date.parse(since), windowStartMs) : update;
+            renderHistory(data, selectedSites);
+        } catch (error) {
+            console.error('Failed to refresh history:', error);
+        }
+    }
+
     function initializeControls() {
         const earliestDate = new Date();
         earliestDate.setDate(earliestDate.getDate() - dataRetentionDays);
@@ -219,7 +294,7 @@ document.addEventListener('DOMContentLoaded', () => {
             if (!range) return;
             const end = new Date();
             let start = new Date(end.getTime());
-            const match = range.match(/^(\d+)([mhdwM])$/);
+            const match = range.match(/^(\d+)([mhdwMy])$/);
             if (!match) return;
             const value = parseInt(match[1], 10);
             const unit = match[2];
@@ -239,6 +314,9 @@ document.addEventListener('DOMContentLoaded', () => {
                 case 'M':
                     start.setMonth(start.getMonth() - value);
                     break;
+                case 'y':
+                    start.setFullYear(start.getFullYear() - value);
+                    break;
                 default:
                     break;
             }
@@ -250,7 +328,7 @@ document.addEventListener('DOMContentLoaded', () => {
             rangePicker.clear();
             customRangeEndInput.value = '';
             applyCustomRangeBtn.disabled = true;
-            setAndTriggerUpdate(start, end);
+            setAndTriggerUpdate(start, end, end.getTime() - start.getTime());
         });
         document.getElementById('status-wall').addEventListener('click', (e) => {
             const card = e.target.closest('.status-card');
@@ -272,7 +350,7 @@ document.addEventListener('DOMContentLoaded', () => {
     initializeControls();
     
     const statusWall = document.getElementById('status-wall');
-    updateStatusWall({ wallElement: statusWall, initialData: initialStatuses })
+    updateStatusWall({ wallElement: statusWall, initialData: initialStatuses, initialVersion: window.INITIAL_STATUS_VERSION })
         .then(() => {
             const activeButton = document.querySelector('#time-range-selector button.active');
             if (activeButton) {
@@ -281,14 +359,23 @@ document.addEventListener('DOMContentLoaded', () => {
                 console.warn('No active time button found, defaulting to 12 hours.');
                 const end = new Date();
                 const start = new Date(end.getTime() - 12 * 60 * 60 * 1000);
-                setAndTriggerUpdate(start, end);
+                setAndTriggerUpdate(start, end, 12 * 60 * 60 * 1000);
             }
         })
         .catch(error => console.error('Failed to initialize status wall:', error));
-    
+
+    // 状态墙优先使用实时推送，推送不可用时每 15 秒轮询一次
+    connectStatusStream({ wallElement: statusWall });
     setInterval(() => {
+        if (isStatusStreamActive()) {
+            return;
+        }
         updateStatusWall({ wallElement: statusWall }).catch(error => console.error('Failed to refresh status wall:', error));
     }, 15000);
+
+    setInterval(() => {
+        refreshHistoryDelta();
+    }, HISTORY_REFRESH_INTERVAL_MS);
     
     window.addEventListener('resize', () => {
         if (timelineChart && !timelineChart.isDisposed()) timelineChart.resize();
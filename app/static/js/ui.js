@@ -143,6 +143,9 @@ export const renderAlertHistory = (data, options = {}, context) => {
                 reasonParts.push(`HTTP ${httpCode}`);
             }
         }
+        if (incident.notification_sent) {
+            reasonParts.push('已通知');
+        }
         const detailText = reasonParts.length ? reasonParts.join(' / ') : '—';
         const endCellContent = incident.resolved
             ? escapeHtml(endText)
@@ -248,40 +251,44 @@ export const updateSummaryCards = (data, selectedSites, summaryElements) => {
     }
 };
 
-export const updateStatusWall = async ({ wallElement, initialData } = {}) => {
-    if (!wallElement) {
-        return;
-    }
+// 状态墙当前数据与对应的快照版本，轮询时只请求该版本之后变化的站点
+const statusWallState = { version: null, data: null };
 
-    const previouslySelected = new Set(
-        Array.from(wallElement.querySelectorAll('.status-card.selected')).map(card => card.dataset.siteName)
-    );
-    const isFirstRun = wallElement.children.length === 0;
-
-    let data = initialData;
-    if (!data) {
+const fetchStatusUpdate = async () => {
+    if (statusWallState.version === null || !statusWallState.data) {
         const response = await fetch('/health');
-        data = await response.json();
+        const data = await response.json();
+        const version = Number(response.headers.get('X-Status-Version'));
+        statusWallState.version = Number.isFinite(version) ? version : null;
+        statusWallState.data = data;
+        return true;
     }
 
-    const allSiteNames = Object.keys(data);
-
-    wallElement.innerHTML = allSiteNames.map(siteName => {
-        if (!data[siteName]) return '';
-        const site = data[siteName];
-        const statusClass = `status-${site.status === '正常' ? 'ok' : (site.status === '访问过慢' ? 'slow' : 'down')}`;
-        const statusSpecificLine =
-            site.status === '无法访问' && site.down_since
-                ? `<p><strong>故障开始:</strong> ${site.down_since}</p>`
-                : site.status === '访问过慢' && site.slow_since
-                    ? `<p><strong>减速开始:</strong> ${site.slow_since}</p>`
-                    : '';
-        const totalChecksLine = site.total_checks ? `<p><strong>累计检查:</strong> ${site.total_checks}</p>` : '';
-        const responseTimeText = typeof site.response_time_seconds === 'number'
-            ? `${site.response_time_seconds.toFixed(2)}秒`
-            : 'N/A';
-
-        return `
+    const response = await fetch(`/health?since_version=${statusWallState.version}`);
+    const update = await response.json();
+    const changed = update.full || update.version !== statusWallState.version;
+    const data = update.full ? {} : { ...statusWallState.data };
+    Object.assign(data, update.sites);
+    (update.removed || []).forEach(siteName => delete data[siteName]);
+    statusWallState.version = update.version;
+    statusWallState.data = data;
+    return changed;
+};
+
+const statusCardHtml = (siteName, site) => {
+    const statusClass = `status-${site.status === '正常' ? 'ok' : (site.status === '访问过慢' ? 'slow' : 'down')}`;
+    const statusSpecificLine =
+        site.status === '无法访问' && site.down_since
+            ? `<p><strong>故障开始:</strong> ${site.down_since}</p>`
+            : site.status === '访问过慢' && site.slow_since
+                ? `<p><strong>减速开始:</strong> ${site.slow_since}</p>`
+                : '';
+    const totalChecksLine = site.total_checks ? `<p><strong>累计检查:</strong> ${site.total_checks}</p>` : '';
+    const responseTimeText = typeof site.response_time_seconds === 'number'
+        ? `${site.response_time_seconds.toFixed(2)}秒`
+        : 'N/A';
+
+    return `
             <div class="status-card ${statusClass}" data-site-name="${escapeHtml(siteName)}">
                 <h3>${escapeHtml(siteName)}</h3>
                 <p><strong>状态:</strong> ${site.status}</p>
@@ -290,7 +297,18 @@ export const updateStatusWall = async ({ wallElement, initialData } = {}) => {
                 ${totalChecksLine}
                 <p><strong>上次检查:</strong> ${site.last_checked}</p>
             </div>`;
-    }).join('');
+};
+
+const renderStatusWall = (wallElement) => {
+    const previouslySelected = new Set(
+        Array.from(wallElement.querySelectorAll('.status-card.selected')).map(card => card.dataset.siteName)
+    );
+    const isFirstRun = wallElement.children.length === 0;
+    const data = statusWallState.data || {};
+
+    wallElement.innerHTML = Object.keys(data)
+        .map(siteName => (data[siteName] ? statusCardHtml(siteName, data[siteName]) : ''))
+        .join('');
 
     wallElement.querySelectorAll('.status-card').forEach(card => {
         const siteName = card.dataset.siteName;
@@ -300,6 +318,93 @@ export const updateStatusWall = async ({ wallElement, initialData } = {}) => {
     });
 };
 
+// 只替换指定站点的卡片（保留选中状态）；有卡片不存在（新增站点）时返回 false，由调用方重绘整个状态墙
+const renderStatusCards = (wallElement, siteNames) => {
+    const data = statusWallState.data || {};
+    const cards = new Map(
+        Array.from(wallElement.querySelectorAll('.status-card')).map(card => [card.dataset.siteName, card])
+    );
+    if (siteNames.some(siteName => data[siteName] && !cards.has(siteName))) {
+        return false;
+    }
+    const template = document.createElement('template');
+    siteNames.forEach(siteName => {
+        const card = cards.get(siteName);
+        if (!card || !data[siteName]) return;
+        template.innerHTML = statusCardHtml(siteName, data[siteName]).trim();
+        const replacement = template.content.firstElementChild;
+        replacement.classList.toggle('selected', card.classList.contains('selected'));
+        card.replaceWith(replacement);
+    });
+    return true;
+};
+
+export const updateStatusWall = async ({ wallElement, initialData, initialVersion } = {}) => {
+    if (!wallElement) {
+        return;
+    }
+
+    const isFirstRun = wallElement.children.length === 0;
+    if (initialData) {
+        statusWallState.data = initialData;
+        statusWallState.version = Number.isFinite(initialVersion) ? initialVersion : null;
+    } else if (!(await fetchStatusUpdate()) && !isFirstRun) {
+        // 快照版本未变化，保留现有卡片
+        return;
+    }
+    renderStatusWall(wallElement);
+};
+
+// 实时推送连接；连接不可用时由调用方继续轮询 /health
+let statusStream = null;
+const STATUS_STREAM_RETRY_MS = 60000;
+
+export const isStatusStreamActive = () => Boolean(statusStream && statusStream.readyState === EventSource.OPEN);
+
+export const connectStatusStream = ({ wallElement } = {}) => {
+    if (!wallElement || typeof EventSource === 'undefined' || statusStream) {
+        return;
+    }
+
+    // 同一帧内收到的检查事件合并后只重绘对应站点的卡片
+    const pendingSites = new Set();
+    const scheduleRender = (siteName) => {
+        const first = pendingSites.size === 0;
+        pendingSites.add(siteName);
+        if (!first) return;
+        requestAnimationFrame(() => {
+            const siteNames = Array.from(pendingSites);
+            pendingSites.clear();
+            if (!renderStatusCards(wallElement, siteNames)) {
+                renderStatusWall(wallElement);
+            }
+        });
+    };
+
+    const source = new EventSource('/stream/status');
+    statusStream = source;
+    source.addEventListener('check', event => {
+        const { site, status } = JSON.parse(event.data);
+        if (!statusWallState.data) {
+            statusWallState.data = {};
+        }
+        statusWallState.data[site] = status;
+        scheduleRender(site);
+    });
+    source.addEventListener('reset', () => {
+        // 服务端已无法补发断线期间的事件，重新读取完整状态
+        statusWallState.version = null;
+        updateStatusWall({ wallElement }).catch(error => console.error('Failed to refresh status wall:', error));
+    });
+    source.addEventListener('error', () => {
+        // 浏览器会自动重连；连接被拒绝（如连接数已满）时改回轮询，稍后再尝试
+        if (source.readyState === EventSource.CLOSED) {
+            statusStream = null;
+            setTimeout(() => connectStatusStream({ wallElement }), STATUS_STREAM_RETRY_MS);
+        }
+    });
+};
+
 export const filterAndScrollToAlerts = ({ siteName, startTime, endTime, status }, context) => {
     const { elements, controls, filters, state } = context;
     const { body } = elements;
@@ -181,3 +181,139 @@ export const determinePickerLocale = () => {
 export const toLocalISOString = (dt) => {
     return `${dt.getFullYear()}-${String(dt.getMonth() + 1).padStart(2, '0')}-${String(dt.getDate()).padStart(2, '0')}T${String(dt.getHours()).padStart(2, '0')}:${String(dt.getMinutes()).padStart(2, '0')}`;
 };
+
+const filterResponseTimes = (responseTimes, predicate) => {
+    const timestampsMs = responseTimes?.timestamps_ms || [];
+    const labels = responseTimes?.timestamps || [];
+    const result = { timestamps: [], timestamps_ms: [], times: [] };
+    timestampsMs.forEach((ts, idx) => {
+        if (predicate(ts)) {
+            if (idx < labels.length) {
+                result.timestamps.push(labels[idx]);
+            }
+            result.timestamps_ms.push(ts);
+            result.times.push(responseTimes.times[idx]);
+        }
+    });
+    return result;
+};
+
+// 将 /api/history 的增量结果（delta 为 true）合并进本地数据：since 之后的点追加到曲线末尾，
+// 结束于 since 之后的时间线分段与有变化的事件替换本地对应部分，并裁掉滑出窗口起点的数据
+export const mergeHistoryDelta = (previous, update, sinceMs, windowStartMs) => {
+    const merged = {};
+    Object.entries(update || {}).forEach(([siteName, siteUpdate]) => {
+        const siteData = previous?.[siteName];
+        if (!siteUpdate?.delta || !siteData) {
+            merged[siteName] = siteUpdate;
+            return;
+        }
+        const newSegments = siteUpdate.timeline_data || [];
+        const firstNewStart = newSegments.length > 0 ? newSegments[0][0] : Infinity;
+        const timelineData = (siteData.timeline_data || [])
+            .filter(segment => segment[1] <= sinceMs && segment[0] < firstNewStart)
+            .concat(newSegments)
+            .filter(segment => segment[1] > windowStartMs);
+        if (timelineData.length > 0 && timelineData[0][0] < windowStartMs) {
+            timelineData[0] = [windowStartMs, ...timelineData[0].slice(1)];
+        }
+
+        const keptTimes = filterResponseTimes(siteData.response_times, ts => ts >= windowStartMs && ts <= sinceMs);
+        const newTimes = siteUpdate.response_times || {};
+
+        const incidentKey = incident => `${incident.status_key}:${incident.start_ts}`;
+        const updatedKeys = new Set((siteUpdate.incidents || []).map(incidentKey));
+        const incidents = (siteData.incidents || [])
+            .filter(incident => !updatedKeys.has(incidentKey(incident)) && incident.end_ts >= windowStartMs)
+            .concat(siteUpdate.incidents || [])
+            .map(incident => (incident.start_ts < windowStartMs
+                ? { ...incident, start_ts: windowStartMs, duration_ms: Math.max(0, incident.end_ts - windowStartMs) }
+                : incident));
+
+        merged[siteName] = {
+            ...siteUpdate,
+            timeline_data: timelineData,
+            response_times: {
+                timestamps: keptTimes.timestamps.concat(newTimes.timestamps || []),
+                timestamps_ms: keptTimes.timestamps_ms.concat(newTimes.timestamps_ms || []),
+                times: keptTimes.times.concat(newTimes.times || [])
+            },
+            incidents
+        };
+    });
+    return merged;
+};
+
+const STATUS_KEYS = { 1: 'up', 2: 'slow', 3: 'down' };
+
+const formatTimelineDuration = (ms) => {
+    let seconds = Math.floor(Math.max(0, ms) / 1000);
+    const days = Math.floor(seconds / 86400);
+    seconds -= days * 86400;
+    const hours = Math.floor(seconds / 3600);
+    const minutes = Math.floor((seconds % 3600) / 60);
+    const clock = `${hours}:${String(minutes).padStart(2, '0')}:${String(seconds % 60).padStart(2, '0')}`;
+    return days ? `${days} day${days === 1 ? '' : 's'}, ${clock}` : clock;
+};
+
+// 时间线分段的提示文本，与服务端 history_format.timeline_details 保持一致
+export const renderTimelineDetails = (statusCode, durationMs, reason, avgResponse, availability, resolution) => {
+    if (statusCode === 0) {
+        return '该时间段内无数据';
+    }
+    const statusKey = STATUS_KEYS[statusCode];
+    let details = `状态: ${statusKey.toUpperCase()}<br>持续: ${formatTimelineDuration(durationMs)}<br>`;
+    const avgText = avgResponse === null || avgResponse === undefined ? '平均响应: N/A' : `平均响应: ${avgResponse.toFixed(3)}s`;
+    if (availability !== null && availability !== undefined) {
+        details += `可用率: ${availability.toFixed(2)}%<br>${avgText}<br>数据粒度: ${resolution}`;
+    } else if (statusKey === 'down') {
+        details += `原因: ${reason || '未知错误'}`;
+    } else {
+        details += avgText;
+    }
+    return details;
+};
+
+const deltaDecode = (values) => {
+    let total = 0;
+    return (values || []).map(value => {
+        total += value;
+        return total;
+    });
+};
+
+// 将 format=compact 的 /api/history 响应（列式、时间戳差分编码）还原为图表使用的行式结构
+export const decodeCompactHistory = (data) => {
+    const decoded = {};
+    Object.entries(data || {}).forEach(([siteName, siteData]) => {
+        const { timeline, response_times: responseTimes, ...rest } = siteData;
+        const starts = deltaDecode(timeline?.start_ms);
+        const timelineData = starts.map((start, idx) => {
+            const durationMs = timeline.duration_ms[idx];
+            const statusCode = timeline.status[idx];
+            return [
+                start,
+                start + durationMs,
+                statusCode,
+                renderTimelineDetails(
+                    statusCode,
+                    durationMs,
+                    timeline.reason[idx],
+                    timeline.avg_response[idx],
+                    timeline.availability ? timeline.availability[idx] : null,
+                    timeline.resolution
+                )
+            ];
+        });
+        decoded[siteName] = {
+            ...rest,
+            timeline_data: timelineData,
+            response_times: {
+                timestamps: [],
+                timestamps_ms: deltaDecode(responseTimes?.timestamps_ms),
+                times: responseTimes?.times || []
+            }
+        };
+    });
+    return decoded;
+};
@@ -0,0 +1,191 @@
+# web-monitor/app/status_snapshot.py
+"""
+/health 与仪表盘读取的站点状态快照。
+
+检查线程在预热和每轮检查结束后调用 publish()：只保留公开字段，预先序列化为 JSON，
+连同单调递增的版本号打包为不可变的 StatusSnapshot，再整体替换模块级引用。
+请求处理直接读取当前引用（引用赋值是原子的），无需获取 status_lock，也不会读到更新了一半的状态。
+
+每个站点记录最后一次变化时的版本号，/health?since_version=N 只返回版本号大于 N 的站点与之后被移除的站点。
+版本号以进程启动时的毫秒时间戳为起点，服务重启后客户端持有的旧版本号不会与新进程的版本号混淆。
+
+使用独立检查进程（app/checker.py）时，检查进程每次发布后把快照写入共享状态表（见 status_table），
+并把最近的实时推送事件原子地写入事件文件。Web 进程以只读方式使用：current() 只在状态表序号变化时重新解码，
+未变化站点沿用已序列化的片段；版本号沿用检查进程的编号，请求落在任一 Web 进程上结果都一致。
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from .status_table import StatusTableReader, StatusTableWriter
+
+logger = logging.getLogger(__name__)
+
+# 对外公开的状态字段；history、slow_history、notification_sent、last_notifications 等告警判定用的内部字段不公开
+PUBLIC_FIELDS = (
+    'status',
+    'last_checked',
+    'response_time_seconds',
+    'total_checks',
+    'failure_count',
+    'success_count',
+    'slow_count',
+    'down_since',
+    'slow_since',
+)
+
+# sites: 站点 -> 公开字段；fragments: 站点 -> 预先序列化的 JSON；site_versions: 站点 -> 最后变化的版本；
+# removed: 被移除的站点 -> 移除时的版本；body: 完整结果的 JSON（与旧版 /health 的结构与站点顺序一致）
+StatusSnapshot = namedtuple(
+    'StatusSnapshot', ['version', 'base_version', 'sites', 'fragments', 'site_versions', 'removed', 'body']
+)
+
+_BASE_VERSION = int(time.time() * 1000)
+_current = StatusSnapshot(_BASE_VERSION, _BASE_VERSION, {}, {}, {}, {}, '{}')
+_publish_lock = threading.Lock()
+
+# 共享状态表与事件文件：检查进程写入，Web 进程读取；未配置时快照只在本进程内使用
+_table_writer: Optional[StatusTableWriter] = None
+_table_reader: Optional[StatusTableReader] = None
+_table_seq = None
+_events_path: Optional[str] = None
+_events_stat = None
+_shared_events = None
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+
+def _join(fragments: Dict[str, str]) -> str:
+    return '{' + ','.join(f'{_dumps(name)}:{fragment}' for name, fragment in fragments.items()) + '}'
+
+
+def public_statuses(statuses: Mapping[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """复制站点状态中的公开字段（调用方持有 status_lock）。"""
+    return {name: {field: status.get(field) for field in PUBLIC_FIELDS} for name, status in statuses.items()}
+
+
+def configure_shared(table_path: str, events_path: str, reader: bool):
+    global _table_writer, _table_reader, _table_seq, _events_path, _events_stat
+    _table_writer = None if reader else StatusTableWriter(table_path)
+    _table_reader = StatusTableReader(table_path) if reader else None
+    _table_seq = None
+    _events_path = events_path
+    _events_stat = None
+
+
+def is_shared_reader() -> bool:
+    return _table_reader is not None
+
+
+def is_shared_writer() -> bool:
+    return _table_writer is not None
+
+
+def current() -> StatusSnapshot:
+    if _table_reader is not None:
+        seq = _table_reader.peek()
+        if seq is None or seq != _table_seq:
+            _load_table()
+    return _current
+
+
+def write_shared(snapshot: StatusSnapshot, events: Tuple[int, List[Tuple[int, str]]]):
+    """检查进程：写入共享状态表，事件写入临时文件后原子替换事件文件。"""
+    try:
+        _table_writer.write(snapshot)
+    except (OSError, ValueError) as e:
+        logger.exception("写入共享状态表失败: %s", e)
+    temp_path = f"{_events_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'base_id': events[0], 'items': events[1]}, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_path, _events_path)
+    except OSError as e:
+        logger.exception("写入状态事件文件失败: %s", e)
+
+
+def _load_table():
+    global _current, _table_seq
+    with _publish_lock:
+        seq = _table_reader.sequence()
+        if seq is None or seq == _table_seq:
+            return
+        table = _table_reader.read()
+        if table is None:
+            return
+        previous = _current
+        same_base = previous.base_version == table['base_version']
+        fragments = {}
+        for name, data in table['sites'].items():
+            if same_base and previous.site_versions.get(name) == table['site_versions'][name]:
+                fragments[name] = previous.fragments[name]
+            else:
+                fragments[name] = _dumps(data)
+        _current = StatusSnapshot(
+            table['version'], table['base_version'], table['sites'], fragments,
+            table['site_versions'], table['removed'], _join(fragments),
+        )
+        _table_seq = table['seq']
+
+
+def shared_events() -> Optional[Tuple[int, List[Tuple[int, str]]]]:
+    """Web 进程：事件文件中的实时推送事件 (事件编号起点, [(编号, SSE 文本), ...])，文件变化时重新载入。"""
+    global _events_stat, _shared_events
+    try:
+        stat = os.stat(_events_path)
+    except (OSError, TypeError):
+        return _shared_events
+    key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    if key != _events_stat:
+        try:
+            with open(_events_path, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.exception("读取状态事件文件失败: %s", e)
+            return _shared_events
+        _shared_events = (payload.get('base_id'), [tuple(item) for item in payload.get('items', [])])
+        _events_stat = key
+    return _shared_events
+
+
+def publish(sites: Dict[str, Dict[str, Any]]) -> StatusSnapshot:
+    """发布新的快照；内容与当前快照相同时不增加版本号。"""
+    global _current
+    with _publish_lock:
+        previous = _current
+        if sites == previous.sites:
+            return previous
+        version = previous.version + 1
+        fragments = {}
+        site_versions = {}
+        for name, data in sites.items():
+            if previous.sites.get(name) == data:
+                fragments[name] = previous.fragments[name]
+                site_versions[name] = previous.site_versions[name]
+            else:
+                fragments[name] = _dumps(data)
+                site_versions[name] = version
+        removed = {name: removed_at for name, removed_at in previous.removed.items() if name not in sites}
+        removed.update({name: version for name in previous.sites if name not in sites})
+        body = _join(fragments)
+        _current = StatusSnapshot(version, previous.base_version, sites, fragments, site_versions, removed, body)
+        return _current
+
+
+def delta_body(snapshot: StatusSnapshot, since_version: Optional[int]) -> str:
+    """since_version 之后变化的站点；版本号无效（早于本进程或晚于当前版本）时返回完整结果，full 为 true。"""
+    full = since_version is None or since_version < snapshot.base_version or since_version > snapshot.version
+    names = sorted(
+        name for name, site_version in snapshot.site_versions.items() if full or site_version > since_version
+    )
+    removed = [] if full else sorted(name for name, removed_at in snapshot.removed.items() if removed_at > since_version)
+    sites = ','.join(f'{_dumps(name)}:{snapshot.fragments[name]}' for name in names)
+    return (
+        f'{{"version":{snapshot.version},"full":{"true" if full else "false"},'
+        f'"sites":{{{sites}}},"removed":{_dumps(removed)}}}'
+    )
@@ -0,0 +1,189 @@
+# web-monitor/app/status_stream.py
+"""
+/stream/status 的进程内发布/订阅中心。
+
+检查线程每完成一个站点的检查发布 check 事件（站点的公开状态），状态变化时另发 status 事件，
+发送告警通知时发布 alert 事件。每个事件在发布时编号并序列化为 SSE 文本一次，各连接共享同一份数据。
+
+每个订阅者有一个有界队列；消费过慢导致队列写满时该订阅者被标记为已丢弃，连接在发完已排队的事件后关闭，
+客户端凭 Last-Event-ID 重连后从最近事件缓冲中补发。事件编号以进程启动时的毫秒时间戳为起点，
+编号早于缓冲范围或不属于当前进程时改为发送 reset 事件，客户端应重新读取 /health。
+
+使用独立检查进程时，事件随状态快照写入共享文件（见 status_snapshot），Web 进程的跟随线程定期载入并转发。
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import status_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+class Subscriber:
+    def __init__(self, buffer_size: int):
+        self.queue = queue.Queue(maxsize=buffer_size)
+        self.dropped = False
+
+
+class StatusHub:
+    def __init__(self, replay_size: int = 1000):
+        self._lock = threading.Lock()
+        self._subscribers: List[Subscriber] = []
+        self._base_id = int(time.time() * 1000)
+        self._last_id = self._base_id
+        self._replay = deque(maxlen=replay_size)
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> int:
+        with self._lock:
+            self._last_id += 1
+            event_id = self._last_id
+            message = _format_event(event_id, event_type, data)
+            self._replay.append((event_id, message))
+            self._fan_out(message)
+            return event_id
+
+    def _fan_out(self, message: str):
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.queue.put_nowait(message)
+            except queue.Full:
+                subscriber.dropped = True
+                self._subscribers.remove(subscriber)
+
+    def queue_depths(self) -> Tuple[int, int, int]:
+        """订阅者数、各订阅者待发送事件数之和与最大值（/metrics 使用）。"""
+        with self._lock:
+            sizes = [subscriber.queue.qsize() for subscriber in self._subscribers]
+        return len(sizes), sum(sizes), max(sizes, default=0)
+
+    def replay(self) -> Tuple[int, List[Tuple[int, str]]]:
+        """事件编号起点与最近事件缓冲，检查进程把它写入共享状态文件。"""
+        with self._lock:
+            return self._base_id, list(self._replay)
+
+    def relay(self, base_id: int, items: List[Tuple[int, str]]):
+        """读取模式：转发检查进程已编号的事件，沿用原编号，客户端重连到任一 Web 进程都能补发。"""
+        with self._lock:
+            if base_id != self._base_id:
+                # 首次载入或检查进程已重启，以共享文件中的事件为准
+                self._base_id = base_id
+                self._replay = deque(items, maxlen=self._replay.maxlen)
+                self._last_id = items[-1][0] if items else base_id
+                if self._subscribers:
+                    self._fan_out(_format_event(self._last_id, 'reset', {}))
+                return
+            new_items = [(event_id, message) for event_id, message in items if event_id > self._last_id]
+            if not new_items:
+                return
+            if new_items[0][0] > self._last_id + 1:
+                # 两次载入之间的事件超出了检查进程的缓冲，缺失部分无法补发
+                self._replay.clear()
+                self._fan_out(_format_event(new_items[0][0] - 1, 'reset', {}))
+            for event_id, message in new_items:
+                self._replay.append((event_id, message))
+                self._fan_out(message)
+            self._last_id = new_items[-1][0]
+
+    def subscribe(
+        self, buffer_size: int, last_event_id: Optional[int] = None, max_subscribers: Optional[int] = None
+    ) -> Optional[Tuple[Subscriber, List[str]]]:
+        """注册订阅者并返回需要先补发的事件；补发与注册在同一把锁内完成，不会漏掉或重复事件。
+        订阅者数已达 max_subscribers 时不注册，返回 None（容量检查与注册在同一把锁内，并发连接不会超出上限）。
+        """
+        subscriber = Subscriber(buffer_size)
+        with self._lock:
+            if max_subscribers is not None and len(self._subscribers) >= max_subscribers:
+                return None
+            backlog = []
+            if last_event_id is not None and last_event_id != self._last_id:
+                oldest_id = self._replay[0][0] if self._replay else self._last_id + 1
+                if self._base_id <= last_event_id < self._last_id and oldest_id <= last_event_id + 1:
+                    backlog = [message for event_id, message in self._replay if event_id > last_event_id]
+                else:
+                    # 客户端错过的事件已不在缓冲中（或来自服务重启前），通知其重新读取完整状态
+                    backlog = [_format_event(self._last_id, 'reset', {})]
+            self._subscribers.append(subscriber)
+        return subscriber, backlog
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def resize(self, replay_size: int):
+        with self._lock:
+            if replay_size != self._replay.maxlen:
+                self._replay = deque(self._replay, maxlen=replay_size)
+
+
+def _format_event(event_id: int, event_type: str, data: Dict[str, Any]) -> str:
+    payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return f"id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n"
+
+
+hub = StatusHub()
+_follower_lock = threading.Lock()
+_follower = None
+
+
+def publish(event_type: str, data: Dict[str, Any]) -> Optional[int]:
+    """发布事件；推送失败不影响健康检查。"""
+    try:
+        return hub.publish(event_type, data)
+    except Exception as e:
+        logger.exception("状态事件推送失败: %s", e)
+        return None
+
+
+def stream(subscriber: Subscriber, backlog: List[str], heartbeat_seconds: float):
+    """SSE 响应体生成器：先发补发事件，之后逐条转发，空闲时发送注释行作为心跳。"""
+    try:
+        yield "retry: 5000\n\n"
+        for message in backlog:
+            yield message
+        while True:
+            if subscriber.dropped and subscriber.queue.empty():
+                break
+            try:
+                yield subscriber.queue.get(timeout=heartbeat_seconds)
+            except queue.Empty:
+                yield ": heartbeat\n\n"
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+def sync_shared():
+    """读取模式：载入共享文件中新的事件并转发给本进程的订阅者。"""
+    status_snapshot.current()
+    events = status_snapshot.shared_events()
+    if events and events[0] is not None:
+        hub.relay(*events)
+
+
+def _follow(interval_seconds: float):
+    while True:
+        time.sleep(interval_seconds)
+        if hub.subscriber_count:
+            try:
+                sync_shared()
+            except Exception as e:
+                logger.exception("状态事件同步失败: %s", e)
+
+
+def start_follower(interval_seconds: float):
+    """读取模式下启动跟随线程（每个进程只启动一次）。"""
+    global _follower
+    with _follower_lock:
+        if _follower is None:
+            _follower = threading.Thread(target=_follow, args=(interval_seconds,), name='status-stream-follower', daemon=True)
+            _follower.start()
@@ -0,0 +1,296 @@
+# web-monitor/app/status_table.py
+"""
+检查进程与 Web 进程共享的站点状态表（mmap 映射的定长文件）。
+
+布局：48 字节文件头 + 站点索引区（JSON：槽位顺序的站点名、状态文字表、已移除站点）+ 定长状态记录区，
+每个站点一条 80 字节记录（变化版本号、状态码、响应时间、上次检查时间、累计检查与连续计数、故障/减速开始时间）。
+时间以本地时间相对 1970-01-01 的秒数保存，写回时按原格式还原，/health 的输出与进程内快照一致。
+
+只有检查进程写入，读写之间用顺序锁（seqlock）保证一致：写入前把序号加一（奇数表示正在写），
+写完再加一；读取方在序号为偶数且读取前后序号相同时才采用读到的内容，否则重试，读取无需任何锁。
+Web 进程只在序号变化时重新解码，其余请求只读取文件头中的 8 字节序号。
+
+站点索引只在站点集合或状态文字变化时重写。容量不足或检查进程重启时写入方新建文件并原子替换，
+同时把旧文件标记为已退役，仍映射旧文件的读取方据此重新打开。
+"""
+import datetime
+import json
+import math
+import mmap
+import os
+import struct
+import time
+from typing import Any, Dict, List, Optional
+
+MAGIC = b'WMST'
+LAYOUT_VERSION = 1
+# magic, layout, retired, seq, version, base_version, slot_count, slot_capacity, index_len, index_capacity
+HEADER = struct.Struct('<4sHHQqqIIII')
+SEQ = struct.Struct('<Q')
+SEQ_OFFSET = 8
+# 文件头中序号之后的部分：version, base_version, slot_count, slot_capacity, index_len, index_capacity
+META = struct.Struct('<qqIIII')
+META_OFFSET = 16
+# site_version, status_code, response_time, last_checked, total_checks, failure_count, success_count, slow_count,
+# down_since, slow_since
+RECORD = struct.Struct('<qqdqqqqqqq')
+
+DEFAULT_STATUSES = ['未知', '正常', '访问过慢', '无法访问']
+NONE_TIME = -(1 << 63)
+NA_TIME = NONE_TIME + 1
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+MIN_SLOTS = 64
+MIN_INDEX_BYTES = 64 * 1024
+READ_RETRIES = 1000
+
+
+def _encode_time(value) -> int:
+    if value is None:
+        return NONE_TIME
+    if value == 'N/A':
+        return NA_TIME
+    try:
+        return int((datetime.datetime.strptime(value, TIME_FORMAT) - _EPOCH).total_seconds())
+    except (TypeError, ValueError):
+        return NONE_TIME
+
+
+def _store_seq(mm, value: int):
+    """以一次对齐的 8 字节写入更新序号（struct.pack_into 会先把目标区域清零，读取方可能看到序号为 0）。"""
+    with memoryview(mm) as view, view[:META_OFFSET].cast('Q') as words:
+        words[SEQ_OFFSET // 8] = value
+
+
+def _decode_time(value: int):
+    if value == NONE_TIME:
+        return None
+    if value == NA_TIME:
+        return 'N/A'
+    return (_EPOCH + datetime.timedelta(seconds=value)).strftime(TIME_FORMAT)
+
+
+class StatusTableWriter:
+    """检查进程持有的写入端。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._mm = None
+        self._index_key = None
+        self._statuses = list(DEFAULT_STATUSES)
+
+    def _new_mapping(self, slot_capacity: int, index_capacity: int, seq: int):
+        """在临时文件中建立新映射，写入内容后再由 _install 替换正式文件。"""
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        size = HEADER.size + index_capacity + slot_capacity * RECORD.size
+        with open(temp_path, 'wb') as f:
+            f.truncate(size)
+        new_file = open(temp_path, 'r+b')
+        new_mm = mmap.mmap(new_file.fileno(), size)
+        HEADER.pack_into(new_mm, 0, MAGIC, LAYOUT_VERSION, 0, seq, 0, 0, 0, slot_capacity, 0, index_capacity)
+        return temp_path, new_file, new_mm
+
+    def _install(self, temp_path: str, new_file, new_mm):
+        """原子替换正式文件，再把旧文件标记为已退役。"""
+        old_file = self._file
+        if old_file is None:
+            try:
+                old_file = open(self.path, 'r+b')
+            except OSError:
+                old_file = None
+        os.replace(temp_path, self.path)
+        if old_file is not None:
+            try:
+                old_mm = self._mm or mmap.mmap(old_file.fileno(), 0)
+                if old_mm[:4] == MAGIC:
+                    struct.pack_into('<H', old_mm, 6, 1)
+                old_mm.close()
+            except (OSError, ValueError):
+                pass
+            old_file.close()
+        self._file, self._mm = new_file, new_mm
+
+    def _last_seq(self) -> int:
+        """当前（或上次运行留下的）文件的序号；新文件沿用它，读取方不会把新文件误认为未变化。"""
+        if self._mm is not None:
+            return SEQ.unpack_from(self._mm, SEQ_OFFSET)[0]
+        try:
+            with open(self.path, 'rb') as f:
+                header = f.read(HEADER.size)
+            if header[:4] == MAGIC:
+                return SEQ.unpack_from(header, SEQ_OFFSET)[0] & ~1
+        except (OSError, struct.error):
+            pass
+        return 0
+
+    def _index_bytes(self, names: List[str], removed: Dict[str, int]) -> bytes:
+        return json.dumps(
+            {'sites': names, 'statuses': self._statuses, 'removed': removed},
+            ensure_ascii=False, separators=(',', ':'),
+        ).encode('utf-8')
+
+    def write(self, snapshot):
+        """写入快照（status_snapshot.StatusSnapshot）中全部站点的状态。"""
+        names = list(snapshot.sites)
+        for data in snapshot.sites.values():
+            if data.get('status') not in self._statuses:
+                self._statuses.append(data.get('status'))
+        index_key = (tuple(names), tuple(self._statuses), tuple(sorted(snapshot.removed.items())))
+        index_bytes = self._index_bytes(names, snapshot.removed) if index_key != self._index_key else None
+
+        pending = None
+        if self._mm is not None:
+            header = HEADER.unpack_from(self._mm, 0)
+            slot_capacity, index_len, index_capacity = header[7], header[8], header[9]
+        if (self._mm is None or len(names) > slot_capacity
+                or (index_bytes is not None and len(index_bytes) > index_capacity)):
+            # 首次写入或容量不足：在新文件中写完整张表后再替换
+            index_bytes = self._index_bytes(names, snapshot.removed)
+            slot_capacity = max(MIN_SLOTS, len(names) * 2)
+            index_capacity = max(MIN_INDEX_BYTES, len(index_bytes) * 2)
+            pending = self._new_mapping(slot_capacity, index_capacity, self._last_seq() + 2)
+            mm = pending[2]
+            index_len = 0
+        else:
+            mm = self._mm
+
+        status_codes = {label: code for code, label in enumerate(self._statuses)}
+        seq = SEQ.unpack_from(mm, SEQ_OFFSET)[0]
+        _store_seq(mm, seq + 1)
+        if index_bytes is not None:
+            mm[HEADER.size:HEADER.size + len(index_bytes)] = index_bytes
+            index_len = len(index_bytes)
+        offset = HEADER.size + index_capacity
+        for name in names:
+            data = snapshot.sites[name]
+            response_time = data.get('response_time_seconds')
+            RECORD.pack_into(
+                mm, offset,
+                snapshot.site_versions[name],
+                status_codes[data.get('status')],
+                math.nan if response_time is None else float(response_time),
+                _encode_time(data.get('last_checked')),
+                data.get('total_checks') or 0,
+                data.get('failure_count') or 0,
+                data.get('success_count') or 0,
+                data.get('slow_count') or 0,
+                _encode_time(data.get('down_since')),
+                _encode_time(data.get('slow_since')),
+            )
+            offset += RECORD.size
+        META.pack_into(
+            mm, META_OFFSET, snapshot.version, snapshot.base_version,
+            len(names), slot_capacity, index_len, index_capacity,
+        )
+        _store_seq(mm, seq + 2)
+        self._index_key = index_key
+        if pending is not None:
+            self._install(*pending)
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._file.close()
+            self._mm = self._file = None
+
+
+class StatusTableReader:
+    """Web 进程持有的只读端。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._mm = None
+        self._index_raw = None
+        self._index = None
+
+    def _open(self) -> bool:
+        self.close()
+        try:
+            self._file = open(self.path, 'rb')
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self.close()
+            return False
+        if self._mm[:4] != MAGIC or struct.unpack_from('<H', self._mm, 4)[0] != LAYOUT_VERSION:
+            self.close()
+            return False
+        return True
+
+    def peek(self) -> Optional[int]:
+        """不加锁读取序号（不重新打开文件），用于请求路径上判断内容是否变化。"""
+        mm = self._mm
+        try:
+            if mm is None or struct.unpack_from('<H', mm, 6)[0]:
+                return None
+            return SEQ.unpack_from(mm, SEQ_OFFSET)[0]
+        except ValueError:
+            # 映射已被其他线程关闭（正在重新打开）
+            return None
+
+    def sequence(self) -> Optional[int]:
+        """当前序号；文件不存在或已退役时重新打开，仍不可用时返回 None。"""
+        if self._mm is None or struct.unpack_from('<H', self._mm, 6)[0]:
+            if not self._open():
+                return None
+        return SEQ.unpack_from(self._mm, SEQ_OFFSET)[0]
+
+    def read(self) -> Optional[Dict[str, Any]]:
+        """一致地读取整张表，返回 {seq, version, base_version, sites, site_versions, removed}。"""
+        for _ in range(READ_RETRIES):
+            seq = self.sequence()
+            if seq is None:
+                return None
+            if seq & 1:
+                time.sleep(0)
+                continue
+            mm = self._mm
+            _, _, retired, _, version, base_version, slot_count, _, index_len, index_capacity = HEADER.unpack_from(mm, 0)
+            index_raw = mm[HEADER.size:HEADER.size + index_len]
+            records_offset = HEADER.size + index_capacity
+            records = mm[records_offset:records_offset + slot_count * RECORD.size]
+            if retired or SEQ.unpack_from(mm, SEQ_OFFSET)[0] != seq:
+                continue
+            break
+        else:
+            return None
+
+        if index_raw != self._index_raw:
+            self._index = json.loads(index_raw)
+            self._index_raw = index_raw
+        names: List[str] = self._index['sites']
+        statuses: List[str] = self._index['statuses']
+        sites = {}
+        site_versions = {}
+        for name, record in zip(names, RECORD.iter_unpack(records)):
+            (site_version, status_code, response_time, last_checked, total_checks, failure_count,
+             success_count, slow_count, down_since, slow_since) = record
+            site_versions[name] = site_version
+            sites[name] = {
+                'status': statuses[status_code],
+                'last_checked': _decode_time(last_checked),
+                'response_time_seconds': None if math.isnan(response_time) else response_time,
+                'total_checks': total_checks,
+                'failure_count': failure_count,
+                'success_count': success_count,
+                'slow_count': slow_count,
+                'down_since': _decode_time(down_since),
+                'slow_since': _decode_time(slow_since),
+            }
+        return {
+            'seq': seq,
+            'version': version,
+            'base_version': base_version,
+            'sites': sites,
+            'site_versions': site_versions,
+            'removed': self._index['removed'],
+        }
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+        if self._file is not None:
+            self._file.close()
+        self._mm = self._file = None
@@ -0,0 +1,159 @@
+# web-monitor/app/timeline_sql.py
+"""
+在数据库中计算历史时间线（gaps-and-islands）。
+
+与 routes._build_timeline_from_logs 的规则完全一致：按简化状态（up/slow/down）变化或相邻两次检查间隔
+超过 1.5 倍监控周期切分。用 LAG 比较相邻日志得到断点标记，再以标记的累计和作为分段编号分组，
+每个分段只返回一行（开始时间、下一分段开始时间、状态、平均响应时间、首个错误），
+传输量与 Python 端的计算量只与分段数相关。需要支持窗口函数的数据库（SQLite >= 3.25 或 PostgreSQL）。
+"""
+import datetime
+from collections import namedtuple
+from typing import Dict, Iterable, List
+
+import sqlalchemy as sa
+
+from . import log_store
+from .extensions import db
+
+MIN_SQLITE_VERSION = (3, 25)
+
+TimelineRun = namedtuple(
+    'TimelineRun',
+    ['start_time', 'next_start_time', 'status_key', 'avg_response_time', 'check_count', 'http_status_code', 'error_detail'],
+)
+
+_STATUS_KEYS = {1: 'up', 2: 'slow', 3: 'down'}
+
+
+def supported() -> bool:
+    dialect = db.engine.dialect
+    if dialect.name == 'postgresql':
+        return True
+    if dialect.name != 'sqlite':
+        return False
+    version = dialect.server_version_info
+    if version is None:
+        with db.engine.connect():
+            version = dialect.server_version_info
+    return version is not None and tuple(version[:2]) >= MIN_SQLITE_VERSION
+
+
+def _epoch_us(column):
+    """时间列对应的 UTC 微秒整数，用于与 Python 路径完全一致地比较检查间隔。"""
+    if db.engine.dialect.name == 'sqlite':
+        # SQLite 以 'YYYY-MM-DD HH:MM:SS.ffffff' 文本保存时间：整秒部分用 strftime('%s')，微秒直接截取；
+        # strftime 会把小数秒按毫秒舍入（.999999 进位到下一秒），只传入前 19 个字符
+        return (
+            sa.cast(sa.func.strftime('%s', sa.func.substr(column, 1, 19)), sa.BigInteger) * 1_000_000
+            + sa.cast(sa.func.substr(column, 21, 6), sa.BigInteger)
+        )
+    return sa.cast(sa.func.round(sa.extract('epoch', column) * 1_000_000), sa.BigInteger)
+
+
+def timeline_runs(
+    site_names: Iterable[str], start: datetime.datetime, end: datetime.datetime, monitor_interval_seconds
+) -> Dict[str, List[TimelineRun]]:
+    """返回 {站点: [TimelineRun, ...]}（按开始时间升序），范围内没有日志的站点不出现在结果中。"""
+    site_names = list(site_names)
+    if not site_names:
+        return {}
+    start = log_store.to_naive_utc(start)
+    end = log_store.to_naive_utc(end)
+    gap_us = int(monitor_interval_seconds * 1.5 * 1_000_000)
+    source = log_store.log_source(start, end, site_names)
+
+    status_code = sa.case(
+        (source.c.status == '无法访问', 3),
+        (source.c.status == '访问过慢', 2),
+        else_=1,
+    )
+    ts_us = _epoch_us(source.c.timestamp)
+    by_time = {'partition_by': source.c.site_name, 'order_by': source.c.timestamp}
+    base = sa.select(
+        source.c.site_name,
+        source.c.timestamp,
+        source.c.response_time_seconds,
+        source.c.http_status_code,
+        source.c.error_detail,
+        status_code.label('status_code'),
+        ts_us.label('ts_us'),
+        sa.func.row_number().over(**by_time).label('rn'),
+        sa.func.lag(status_code).over(**by_time).label('prev_status_code'),
+        sa.func.lag(ts_us).over(**by_time).label('prev_ts_us'),
+    ).where(
+        source.c.site_name.in_(site_names),
+        source.c.timestamp.between(start, end),
+    ).subquery('timeline_base')
+
+    is_break = sa.case(
+        (base.c.prev_status_code.is_(None), 1),
+        (base.c.prev_status_code != base.c.status_code, 1),
+        (base.c.ts_us - base.c.prev_ts_us > gap_us, 1),
+        else_=0,
+    )
+    has_error = sa.or_(
+        sa.and_(base.c.error_detail.isnot(None), base.c.error_detail != ''),
+        base.c.http_status_code >= 400,
+    )
+    runs = sa.select(
+        base.c.site_name,
+        base.c.timestamp,
+        base.c.rn,
+        base.c.status_code,
+        base.c.response_time_seconds,
+        base.c.http_status_code,
+        base.c.error_detail,
+        sa.case((has_error, base.c.rn), else_=None).label('error_rn'),
+        sa.func.sum(is_break).over(partition_by=base.c.site_name, order_by=base.c.rn).label('run_id'),
+    ).cte('timeline_runs')
+
+    grouped = sa.select(
+        runs.c.site_name,
+        runs.c.run_id,
+        sa.func.min(runs.c.timestamp).label('start_time'),
+        sa.func.min(runs.c.rn).label('start_rn'),
+        sa.func.min(runs.c.status_code).label('status_code'),
+        sa.func.avg(runs.c.response_time_seconds).label('avg_response_time'),
+        sa.func.count().label('check_count'),
+        sa.func.min(runs.c.error_rn).label('error_rn'),
+    ).group_by(runs.c.site_name, runs.c.run_id).subquery('timeline_grouped')
+
+    first_error = runs.alias('timeline_first_error')
+    stmt = sa.select(
+        grouped.c.site_name,
+        grouped.c.start_time,
+        sa.func.lead(grouped.c.start_time).over(
+            partition_by=grouped.c.site_name, order_by=grouped.c.start_rn
+        ).label('next_start_time'),
+        grouped.c.status_code,
+        grouped.c.avg_response_time,
+        grouped.c.check_count,
+        first_error.c.http_status_code,
+        first_error.c.error_detail,
+    ).select_from(
+        grouped.outerjoin(
+            first_error,
+            sa.and_(first_error.c.site_name == grouped.c.site_name, first_error.c.rn == grouped.c.error_rn),
+        )
+    ).order_by(grouped.c.site_name, grouped.c.start_rn)
+
+    results: Dict[str, List[TimelineRun]] = {}
+    for row in db.session.execute(stmt):
+        results.setdefault(row.site_name, []).append(TimelineRun(
+            start_time=_as_datetime(row.start_time),
+            next_start_time=_as_datetime(row.next_start_time),
+            status_key=_STATUS_KEYS[int(row.status_code)],
+            avg_response_time=None if row.avg_response_time is None else float(row.avg_response_time),
+            check_count=row.check_count,
+            http_status_code=row.http_status_code,
+            error_detail=row.error_detail,
+        ))
+    return results
+
+
+def _as_datetime(value):
+    # 聚合 / 窗口函数的结果在 SQLite 上可能以文本返回
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime.fromisoformat(value)
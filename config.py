@@ -51,9 +51,91 @@ ALERT_SUPPRESSION_SECONDS = int(os.getenv('ALERT_SUPPRESSION_SECONDS', '600'))
 # 通知发送线程池大小（可通过环境变量 NOTIFICATION_WORKERS 覆盖，设置为 1 可禁用并发）
 NOTIFICATION_WORKERS = int(os.getenv('NOTIFICATION_WORKERS', '4'))
 
-# 数据保留
+# 数据保留（原始检查记录）
 DATA_RETENTION_DAYS = 30
 
+# 分层保留：原始记录过期后，仍按粒度保留聚合数据，用于长期 SLA 报表
+ROLLUP_MINUTE_RETENTION_DAYS = int(os.getenv('ROLLUP_MINUTE_RETENTION_DAYS', '90'))    # 分钟级聚合
+ROLLUP_HOUR_RETENTION_DAYS = int(os.getenv('ROLLUP_HOUR_RETENTION_DAYS', '730'))       # 小时级聚合
+ROLLUP_DAY_RETENTION_DAYS = int(os.getenv('ROLLUP_DAY_RETENTION_DAYS', '3650'))        # 天级聚合
+ROLLUP_INTERVAL_SECONDS = int(os.getenv('ROLLUP_INTERVAL_SECONDS', '300'))             # 聚合任务执行频率（秒）
+
+# 数据清理：按主键区间分批删除，缩短每次写锁的持有时间
+CLEANUP_BATCH_SIZE = int(os.getenv('CLEANUP_BATCH_SIZE', '5000'))              # 每批删除的主键区间大小
+CLEANUP_BATCH_PAUSE_SECONDS = float(os.getenv('CLEANUP_BATCH_PAUSE_SECONDS', '0.1'))  # 批次之间的最短间隔
+CLEANUP_MAX_DUTY_CYCLE = float(os.getenv('CLEANUP_MAX_DUTY_CYCLE', '0.5'))     # 清理占用写锁的最大时间比例
+CLEANUP_CHECKER_WAIT_SECONDS = 30        # 每批开始前最多等待正在进行的健康检查多少秒
+CLEANUP_VACUUM_STEP_PAGES = 2000         # 每次 incremental_vacuum 回收的页数
+
+# 检查日志按时间分区存储：'month' 每月一张表，'day' 每天一张表，留空则使用单表 health_check_log
+# 开启后过期分区直接整表删除，无需逐行 DELETE 与 VACUUM
+LOG_PARTITIONING = os.getenv('LOG_PARTITIONING') or None
+
+# 历史时间线的数据来源：'segments' 读取检查时维护的状态区间表，'logs' 逐条日志计算，
+# 'sql' 在数据库中用窗口函数计算分段（需要 SQLite >= 3.25 或 PostgreSQL，不支持时回退为 'logs'）
+HISTORY_TIMELINE_SOURCE = os.getenv('HISTORY_TIMELINE_SOURCE', 'segments')
+
+# /api/history 响应时间曲线的默认点数上限（前端会按图表宽度传入 max_points），超过时用 LTTB 降采样；0 表示不降采样
+HISTORY_MAX_POINTS = int(os.getenv('HISTORY_MAX_POINTS', 2000))
+
+# /api/history 的日志块缓存：已封闭的整块（默认 1 小时）连同列数组缓存在进程内存中，按缓存的日志总行数限制容量
+HISTORY_CACHE_ENABLED = os.getenv('HISTORY_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+HISTORY_CACHE_CHUNK_SECONDS = int(os.getenv('HISTORY_CACHE_CHUNK_SECONDS', 3600))
+HISTORY_CACHE_MAX_ROWS = int(os.getenv('HISTORY_CACHE_MAX_ROWS', 1000000))
+
+# /api/history 响应按客户端的 Accept-Encoding 压缩（gzip；安装 brotli 后优先使用 br）
+HISTORY_COMPRESSION = os.getenv('HISTORY_COMPRESSION', 'true').lower() in ('1', 'true', 'yes')
+
+# 健康检查、聚合与清理任务默认在 Web 进程内运行。多进程部署（如 gunicorn 多个 worker）时设为 false，
+# 另行启动独立检查进程（flask monitor run 或 python -m app.checker），Web 进程只读取它写入的共享状态表（mmap）
+# 与实时推送事件文件
+MONITOR_EMBEDDED_CHECKER = os.getenv('MONITOR_EMBEDDED_CHECKER', 'true').lower() in ('1', 'true', 'yes')
+STATUS_TABLE_PATH = os.getenv('STATUS_TABLE_PATH') or os.path.join(basedir, 'instance', 'status_table.bin')
+STATUS_EVENTS_PATH = os.getenv('STATUS_EVENTS_PATH') or os.path.join(basedir, 'instance', 'status_events.json')
+# 后台修改的监控参数在其他 Web 工作进程与检查进程中生效的最长延迟（秒）：各进程按此间隔检查参数版本
+MONITORING_CONFIG_SYNC_SECONDS = float(os.getenv('MONITORING_CONFIG_SYNC_SECONDS', 5))
+
+# /stream/status 实时推送（Server-Sent Events）：心跳间隔、每个连接的待发送事件上限（超过时断开该连接，
+# 客户端凭 Last-Event-ID 重连补发）、用于断线补发的最近事件数与最大连接数（每个连接占用一个工作线程）
+STREAM_HEARTBEAT_SECONDS = int(os.getenv('STREAM_HEARTBEAT_SECONDS', 15))
+STREAM_CLIENT_BUFFER = int(os.getenv('STREAM_CLIENT_BUFFER', 256))
+STREAM_REPLAY_EVENTS = int(os.getenv('STREAM_REPLAY_EVENTS', 1000))
+STREAM_MAX_CLIENTS = int(os.getenv('STREAM_MAX_CLIENTS', 100))
+# 使用独立检查进程时，Web 进程检查共享快照文件中新事件的间隔（秒）
+STREAM_FOLLOW_SECONDS = float(os.getenv('STREAM_FOLLOW_SECONDS', 1))
+
+# 日志经队列由后台线程输出。INFO 输出每轮检查的汇总、告警与错误；DEBUG 另外输出每个站点每次检查的明细；
+# LOG_FORMAT=json 时每条日志为一行 JSON，便于日志系统采集与过滤
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+
+# 性能分析（默认关闭）：PROFILE_EVERY_N=N 时每 N 次健康检查周期 / /api/history 请求用 cProfile 完整分析一次；
+# 慢执行阈值（秒）大于 0 时每次执行期间低频采样调用栈，超过阈值才保存为火焰图折叠栈。
+# 文件写入 PROFILE_DIR，每类只保留最新 PROFILE_KEEP 个，可在后台“系统设置 → 性能分析”中下载
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+PROFILE_EVERY_N = int(os.getenv('PROFILE_EVERY_N', 0))
+PROFILE_CYCLE_SLOW_SECONDS = float(os.getenv('PROFILE_CYCLE_SLOW_SECONDS', 0))
+PROFILE_HISTORY_SLOW_SECONDS = float(os.getenv('PROFILE_HISTORY_SLOW_SECONDS', 0))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', 10))
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', 20))
+PROFILE_DIR = os.getenv('PROFILE_DIR') or os.path.join(basedir, 'instance', 'profiles')
+
+# /metrics：监控服务自身的运行指标（Prometheus 文本格式）。站点级序列（site 标签）默认关闭，站点较多时开启会显著增加序列数；
+# 使用独立检查进程时，检查进程每轮检查后把检查相关指标写入 METRICS_PATH，由 Web 进程输出
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+METRICS_SITE_SERIES = os.getenv('METRICS_SITE_SERIES', 'false').lower() in ('1', 'true', 'yes')
+METRICS_PATH = os.getenv('METRICS_PATH') or os.path.join(basedir, 'instance', 'checker_metrics.prom')
+
+# 冷归档：原始日志过期后先按 站点/月份 导出为压缩的列式文件，再从数据库中删除
+LOG_ARCHIVE_ENABLED = os.getenv('LOG_ARCHIVE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+LOG_ARCHIVE_DIR = os.getenv('LOG_ARCHIVE_DIR') or os.path.join(basedir, 'instance', 'archive')
+
+# 启动时把 create_app 各阶段耗时（导入、插件、后台页面注册、数据库准备、后台任务）写入日志；
+# 导入模块的耗时明细可运行 python -m app.startup 查看
+STARTUP_PROFILE = os.getenv('STARTUP_PROFILE', 'false').lower() in ('1', 'true', 'yes')
+
 # 数据库配置（将数据库文件放在 instance 目录下）
 SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'instance', 'monitoring_data.db')
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+# SQLite 写锁被占用时等待而不是立即报错（毫秒）
+SQLITE_BUSY_TIMEOUT_MS = 30000
@@ -0,0 +1,36 @@
+"""Add (site_name, timestamp) index to health_check_log
+
+Revision ID: 5b1e7d3a9c42
+Revises: c9e5a1b3d742
+Create Date: 2026-10-19 10:12:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1e7d3a9c42'
+down_revision = 'c9e5a1b3d742'
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = 'ix_health_check_log_site_timestamp'
+
+
+def upgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    indexes = [index['name'] for index in inspector.get_indexes('health_check_log')]
+
+    if INDEX_NAME not in indexes:
+        op.create_index(INDEX_NAME, 'health_check_log', ['site_name', 'timestamp'], unique=False)
+
+
+def downgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    indexes = [index['name'] for index in inspector.get_indexes('health_check_log')]
+
+    if INDEX_NAME in indexes:
+        op.drop_index(INDEX_NAME, table_name='health_check_log')
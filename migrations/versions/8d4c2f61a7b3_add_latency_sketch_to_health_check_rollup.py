@@ -0,0 +1,41 @@
+"""Add latency_sketch column to health_check_rollup
+
+Revision ID: 8d4c2f61a7b3
+Revises: 5b1e7d3a9c42
+Create Date: 2026-10-19 14:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d4c2f61a7b3'
+down_revision = '5b1e7d3a9c42'
+branch_labels = None
+# health_check_rollup 由 a3f1c9e27b10 创建
+depends_on = 'a3f1c9e27b10'
+
+TABLE_NAME = 'health_check_rollup'
+COLUMN_NAME = 'latency_sketch'
+
+
+def _rollup_columns(connection):
+    inspector = sa.inspect(connection)
+    if TABLE_NAME not in inspector.get_table_names():
+        return None
+    return [column['name'] for column in inspector.get_columns(TABLE_NAME)]
+
+
+def upgrade():
+    columns = _rollup_columns(op.get_bind())
+    if columns is not None and COLUMN_NAME not in columns:
+        with op.batch_alter_table(TABLE_NAME, schema=None) as batch_op:
+            batch_op.add_column(sa.Column(COLUMN_NAME, sa.LargeBinary(), nullable=True))
+
+
+def downgrade():
+    columns = _rollup_columns(op.get_bind())
+    if columns is not None and COLUMN_NAME in columns:
+        with op.batch_alter_table(TABLE_NAME, schema=None) as batch_op:
+            batch_op.drop_column(COLUMN_NAME)
@@ -0,0 +1,50 @@
+"""Create health_check_rollup table
+
+Revision ID: a3f1c9e27b10
+Revises: c007c9af2919
+Create Date: 2026-10-19 08:59:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f1c9e27b10'
+down_revision = 'c007c9af2919'
+branch_labels = None
+depends_on = None
+
+TABLE_NAME = 'health_check_rollup'
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    # 应用启动时的 create_all 可能已创建该表
+    if TABLE_NAME in inspector.get_table_names():
+        return
+    op.create_table(
+        TABLE_NAME,
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('site_name', sa.String(), nullable=False),
+        sa.Column('bucket_seconds', sa.Integer(), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('total_count', sa.Integer(), nullable=False),
+        sa.Column('up_count', sa.Integer(), nullable=False),
+        sa.Column('slow_count', sa.Integer(), nullable=False),
+        sa.Column('down_count', sa.Integer(), nullable=False),
+        sa.Column('response_time_sum', sa.Float(), nullable=False),
+        sa.Column('response_time_count', sa.Integer(), nullable=False),
+        sa.Column('response_time_min', sa.Float(), nullable=True),
+        sa.Column('response_time_max', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('site_name', 'bucket_seconds', 'bucket_start', name='uq_health_check_rollup_bucket'),
+    )
+    op.create_index('ix_health_check_rollup_resolution_bucket', TABLE_NAME, ['bucket_seconds', 'bucket_start'], unique=False)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if TABLE_NAME in inspector.get_table_names():
+        op.drop_index('ix_health_check_rollup_resolution_bucket', table_name=TABLE_NAME)
+        op.drop_table(TABLE_NAME)
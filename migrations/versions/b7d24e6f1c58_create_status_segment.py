@@ -0,0 +1,53 @@
+"""Create status_segment table
+
+Revision ID: b7d24e6f1c58
+Revises: a3f1c9e27b10
+Create Date: 2026-10-19 09:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d24e6f1c58'
+down_revision = 'a3f1c9e27b10'
+branch_labels = None
+depends_on = None
+
+TABLE_NAME = 'status_segment'
+INDEXES = {
+    'ix_status_segment_site_start': ['site_name', 'start_time'],
+    'ix_status_segment_site_end': ['site_name', 'end_time'],
+}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    # 应用启动时的 create_all 可能已创建该表
+    if TABLE_NAME in inspector.get_table_names():
+        return
+    op.create_table(
+        TABLE_NAME,
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('site_name', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.Column('end_time', sa.DateTime(), nullable=False),
+        sa.Column('check_count', sa.Integer(), nullable=False),
+        sa.Column('first_reason', sa.String(length=500), nullable=True),
+        sa.Column('http_status_code', sa.Integer(), nullable=True),
+        sa.Column('response_time_sum', sa.Float(), nullable=False),
+        sa.Column('response_time_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    for name, columns in INDEXES.items():
+        op.create_index(name, TABLE_NAME, columns, unique=False)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if TABLE_NAME in inspector.get_table_names():
+        for name in INDEXES:
+            op.drop_index(name, table_name=TABLE_NAME)
+        op.drop_table(TABLE_NAME)
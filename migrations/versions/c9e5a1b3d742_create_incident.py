@@ -0,0 +1,55 @@
+"""Create incident table
+
+Revision ID: c9e5a1b3d742
+Revises: b7d24e6f1c58
+Create Date: 2026-10-19 09:55:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9e5a1b3d742'
+down_revision = 'b7d24e6f1c58'
+branch_labels = None
+depends_on = None
+
+TABLE_NAME = 'incident'
+INDEXES = {
+    'ix_incident_site_start': ['site_name', 'start_time'],
+    'ix_incident_site_end': ['site_name', 'end_time'],
+    'ix_incident_start': ['start_time'],
+}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    # 应用启动时的 create_all 可能已创建该表
+    if TABLE_NAME in inspector.get_table_names():
+        return
+    op.create_table(
+        TABLE_NAME,
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('site_name', sa.String(), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.Column('end_time', sa.DateTime(), nullable=True),
+        sa.Column('last_seen', sa.DateTime(), nullable=False),
+        sa.Column('check_count', sa.Integer(), nullable=False),
+        sa.Column('reasons', sa.Text(), nullable=True),
+        sa.Column('http_status_code', sa.Integer(), nullable=True),
+        sa.Column('peak_response_time', sa.Float(), nullable=True),
+        sa.Column('notification_sent', sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    for name, columns in INDEXES.items():
+        op.create_index(name, TABLE_NAME, columns, unique=False)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if TABLE_NAME in inspector.get_table_names():
+        for name in INDEXES:
+            op.drop_index(name, table_name=TABLE_NAME)
+        op.drop_table(TABLE_NAME)
@@ -0,0 +1,38 @@
+"""Create site_alert_state table
+
+Revision ID: e2b8f4a6c913
+Revises: 8d4c2f61a7b3
+Create Date: 2026-10-19 20:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b8f4a6c913'
+down_revision = '8d4c2f61a7b3'
+branch_labels = None
+depends_on = None
+
+TABLE_NAME = 'site_alert_state'
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    # 应用启动时的 create_all 可能已创建该表
+    if TABLE_NAME in inspector.get_table_names():
+        return
+    op.create_table(
+        TABLE_NAME,
+        sa.Column('site_name', sa.String(), nullable=False),
+        sa.Column('state', sa.Text(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('site_name'),
+    )
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if TABLE_NAME in inspector.get_table_names():
+        op.drop_table(TABLE_NAME)
@@ -0,0 +1,38 @@
+"""Create app_bootstrap table
+
+Revision ID: f4c6d8e0a215
+Revises: e2b8f4a6c913
+Create Date: 2026-10-19 20:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4c6d8e0a215'
+down_revision = 'e2b8f4a6c913'
+branch_labels = None
+depends_on = None
+
+TABLE_NAME = 'app_bootstrap'
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    # 应用启动时的 create_all 可能已创建该表
+    if TABLE_NAME in inspector.get_table_names():
+        return
+    op.create_table(
+        TABLE_NAME,
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('marker', sa.String(length=64), nullable=False),
+        sa.Column('completed_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if TABLE_NAME in inspector.get_table_names():
+        op.drop_table(TABLE_NAME)
@@ -0,0 +1,33 @@
+# web-monitor/tests/conftest.py
+import pytest
+
+import config
+from app import create_app, history_cache, history_window, log_store
+from app.extensions import db
+
+
+def _test_config(**overrides):
+    """以 config 模块为基础，使用内存 SQLite，不启动后台检查任务。"""
+    values = {key: getattr(config, key) for key in dir(config) if key.isupper()}
+    values.update(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI='sqlite://',
+        MONITOR_EMBEDDED_CHECKER=False,
+        LOG_PARTITIONING=None,
+        WTF_CSRF_ENABLED=False,
+    )
+    values.update(overrides)
+    return type('TestConfig', (), values)
+
+
+@pytest.fixture
+def app():
+    app = create_app(_test_config(), web=False)
+    with app.app_context():
+        # 分区与历史数据缓存是模块级的，每个测试使用新的数据库
+        log_store._load_partitions(force=True)
+        history_cache.get_cache().clear()
+        history_window.get_cache().clear()
+        yield app
+        db.session.remove()
+        log_store._load_partitions(force=True)
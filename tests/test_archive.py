@@ -0,0 +1,42 @@
+# web-monitor/tests/test_archive.py
+"""归档数据的统计口径与聚合数据一致。"""
+import datetime
+
+from app import archive, log_store
+from app.extensions import db
+from app.models import HealthCheckLog
+from app.services import _aggregate_raw_logs
+
+START = datetime.datetime(2026, 3, 1)
+STATUSES = ['正常', '访问过慢', '无法访问', 'SSL证书错误', '正常', '正常', '连接被重置', '访问过慢']
+
+
+def _write_logs():
+    log_store.write_logs([
+        {
+            'site_name': '站点A',
+            'timestamp': START + datetime.timedelta(minutes=index),
+            'status': status,
+            'response_time_seconds': 0.1 * (index + 1) if status in ('正常', '访问过慢') else None,
+            'http_status_code': 200 if status in ('正常', '访问过慢') else None,
+            'error_detail': None,
+        }
+        for index, status in enumerate(STATUSES)
+    ])
+    db.session.commit()
+
+
+def test_summary_counts_unknown_statuses_as_down(app, tmp_path):
+    app.config['LOG_ARCHIVE_DIR'] = str(tmp_path)
+    _write_logs()
+    end = START + datetime.timedelta(hours=1)
+    archive.export_logs(HealthCheckLog.__table__, end, {})
+
+    summary = archive.summarize(['站点A'], START, end, 3600)['站点A']
+    rollup = _aggregate_raw_logs(START, end, 3600)[('站点A', START)]
+    expected = (rollup['up_count'] + rollup['slow_count']) / rollup['total_count'] * 100
+
+    assert summary['overall_stats']['availability'] == expected == 5 / 8 * 100
+    assert summary['buckets']['availability'] == [round(expected, 4)]
+    assert summary['buckets']['down'] == [rollup['down_count']] == [3]
+    assert summary['buckets']['slow'] == [rollup['slow_count']]
@@ -0,0 +1,72 @@
+# web-monitor/tests/test_config_sync.py
+import pytest
+
+from app import config_sync, create_app, status_snapshot
+from app.checker import sync_monitoring_config
+from app.extensions import db
+from app.models import MonitoringConfig
+
+from conftest import _test_config
+
+
+@pytest.fixture
+def two_workers(tmp_path, monkeypatch):
+    """共用同一个 SQLite 文件的两个 Web 工作进程（同一进程内的两个应用模拟）。"""
+    # Web 进程启动时会映射检查进程的共享状态表，这里不需要
+    monkeypatch.setattr(status_snapshot, 'configure_shared', lambda *args, **kwargs: None)
+    settings = _test_config(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'monitor.db'}",
+        MONITORING_CONFIG_SYNC_SECONDS=0,
+    )
+    first = create_app(settings)
+    second = create_app(settings)
+    yield first, second
+    for app in (first, second):
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+
+def _save_interval(app, seconds):
+    """模拟在 app 所在的工作进程中保存后台“监控参数”。"""
+    with app.app_context():
+        config_record = MonitoringConfig.query.first()
+        config_record.monitor_interval_seconds = seconds
+        db.session.commit()
+        config_record.apply_to_config(app.config)
+        config_sync.mark_applied(app, config_record)
+        db.session.remove()
+
+
+def test_other_worker_resyncs_on_request(two_workers):
+    first, second = two_workers
+    original = second.config['MONITOR_INTERVAL_SECONDS']
+    _save_interval(first, original + 17)
+    assert first.config['MONITOR_INTERVAL_SECONDS'] == original + 17
+    assert second.config['MONITOR_INTERVAL_SECONDS'] == original
+
+    second.test_client().get('/health')
+    assert second.config['MONITOR_INTERVAL_SECONDS'] == original + 17
+
+
+def test_sync_reads_only_when_version_changes(two_workers):
+    first, second = two_workers
+    with second.app_context():
+        assert not sync_monitoring_config(second, force=True)
+    _save_interval(first, 45)
+    with second.app_context():
+        assert sync_monitoring_config(second, force=True)
+        assert second.config['MONITOR_INTERVAL_SECONDS'] == 45
+        assert not sync_monitoring_config(second, force=True)
+    with first.app_context():
+        # 保存的进程已直接应用，不重复读取
+        assert not sync_monitoring_config(first, force=True)
+
+
+def test_sync_is_throttled(two_workers):
+    first, second = two_workers
+    second.config['MONITORING_CONFIG_SYNC_SECONDS'] = 3600
+    _save_interval(first, 50)
+    with second.app_context():
+        assert not sync_monitoring_config(second)
+        assert sync_monitoring_config(second, force=True)
@@ -0,0 +1,153 @@
+# web-monitor/tests/test_history_delta.py
+"""增量请求（since）的结果与整个范围完整计算后截取 since 之后的部分一致。"""
+import datetime
+import random
+from datetime import timezone
+
+import pytest
+
+from app import history_cache, history_format, history_stats, history_window, log_store, timeline_sql
+from app.extensions import db
+from app.incidents import rebuild_incidents
+from app.routes import _build_history_delta, _build_site_history
+from app.segments import rebuild_segments
+
+MONITOR_INTERVAL = datetime.timedelta(seconds=20)
+SITES = ['站点A', '站点B']
+
+
+def _rows(site_name, start, count, seed):
+    rng = random.Random(seed)
+    rows = []
+    timestamp = start
+    status = '正常'
+    for _ in range(count):
+        timestamp += datetime.timedelta(seconds=20, microseconds=rng.randrange(1_000_000))
+        if rng.random() < 0.02:
+            timestamp += datetime.timedelta(seconds=rng.choice([29, 31, 120]))
+        if rng.random() < 0.05:
+            status = rng.choice(['正常', '访问过慢', '无法访问'])
+        down = status == '无法访问'
+        rows.append({
+            'site_name': site_name,
+            'timestamp': timestamp,
+            'status': status,
+            'response_time_seconds': None if down or rng.random() < 0.03 else round(rng.uniform(0.05, 5), 3),
+            'http_status_code': rng.choice([503, None]) if down else 200,
+            'error_detail': rng.choice(['连接超时', None]) if down else None,
+        })
+    return rows
+
+
+def _latest():
+    return log_store.latest_log_times(SITES)
+
+
+def _full(start, end, timeline_source, site_runs=None):
+    site_logs = history_cache.load_history_logs(SITES, start, end, _latest())
+    return {
+        site: _build_site_history(
+            site, logs, start, end, MONITOR_INTERVAL, timeline_source,
+            runs=site_runs.get(site, []) if site_runs is not None else None, arrays=arrays, labels=False,
+        )
+        for site, (logs, arrays) in site_logs.items()
+    }
+
+
+def _assert_delta_matches(delta, full, since):
+    since_ms = int(since.timestamp() * 1000)
+    for site in SITES:
+        got, expected = delta[site], full[site]
+        assert got['delta'] is True
+        assert got['cursor'] == expected['cursor']
+        assert history_format.timeline_rows(got['timeline_data']) == history_format.timeline_rows(
+            [segment for segment in expected['timeline_data'] if segment.end_ms > since_ms]
+        )
+        assert got['incidents'] == [
+            incident for incident in expected['incidents'] if not incident['resolved'] or incident['end_ts'] > since_ms
+        ]
+        keep = [index for index, ts in enumerate(expected['response_times']['timestamps_ms']) if ts > since_ms]
+        assert got['response_times']['timestamps_ms'] == [expected['response_times']['timestamps_ms'][i] for i in keep]
+        assert got['response_times']['times'] == [expected['response_times']['times'][i] for i in keep]
+        got_stats, expected_stats = got['overall_stats'], expected['overall_stats']
+        assert got_stats['availability'] == expected_stats['availability']
+        assert got_stats['avg_response_time'] == pytest.approx(expected_stats['avg_response_time'], rel=1e-12)
+        assert got_stats['p95_response_time'] == expected_stats['p95_response_time']
+        assert got_stats['p99_response_time'] == expected_stats['p99_response_time']
+        assert got['sla_stats'] == expected['sla_stats']
+
+
+@pytest.mark.parametrize('timeline_source', ['logs', 'sql', 'segments'])
+def test_delta_matches_full_result(app, timeline_source, monkeypatch):
+    if timeline_source == 'sql' and not timeline_sql.supported():
+        pytest.skip('SQLite 版本不支持窗口函数')
+    now = datetime.datetime.now(timezone.utc).replace(tzinfo=None)
+    first = {site: _rows(site, now - datetime.timedelta(hours=30), 4000, seed) for seed, site in enumerate(SITES)}
+    last_time = max(row['timestamp'] for rows in first.values() for row in rows)
+    log_store.write_logs([row for rows in first.values() for row in rows])
+    db.session.commit()
+
+    def rebuild():
+        if timeline_source == 'segments':
+            rebuild_segments(MONITOR_INTERVAL.total_seconds(), SITES)
+            rebuild_incidents(SITES)
+            db.session.commit()
+
+    rebuild()
+    start = (now - datetime.timedelta(hours=24)).replace(tzinfo=timezone.utc)
+    end = last_time.replace(tzinfo=timezone.utc) + datetime.timedelta(seconds=1)
+    latest = _latest()
+    now_utc = datetime.datetime.now(timezone.utc)
+    # 首次调用建立窗口
+    history_window.window_summaries(SITES, start, end, latest, [start], now_utc)
+    # 之后的增量请求只追加新日志、前移窗口起点，不再读取整个范围
+    rebuilt = []
+    build_window = history_window._build_window
+    monkeypatch.setattr(history_window, '_build_window', lambda *args: rebuilt.append(args) or build_window(*args))
+    previous = _full(start, end, timeline_source)
+    since = min(datetime.datetime.fromisoformat(result['cursor']) for result in previous.values())
+
+    for step in range(3):
+        more = [row for seed, site in enumerate(SITES)
+                for row in _rows(site, last_time, 60, 100 + step * 10 + seed)]
+        last_time = max(row['timestamp'] for row in more)
+        log_store.write_logs(more)
+        db.session.commit()
+        rebuild()
+        shift = datetime.timedelta(minutes=7 * (step + 1))
+        window_start, window_end = start + shift, last_time.replace(tzinfo=timezone.utc) + datetime.timedelta(seconds=1)
+
+        site_runs = None
+        if timeline_source == 'sql':
+            site_runs = timeline_sql.timeline_runs(
+                SITES, window_start, window_end, MONITOR_INTERVAL.total_seconds()
+            )
+        expected = _full(window_start, window_end, timeline_source, site_runs)
+        delta = _build_history_delta(
+            SITES, window_start, window_end, since, _latest(), MONITOR_INTERVAL, timeline_source,
+            labels=False, span_seconds=(end - start).total_seconds(),
+        )
+        _assert_delta_matches(delta, expected, since)
+        assert rebuilt == []
+        since = min(datetime.datetime.fromisoformat(result['cursor']) for result in delta.values())
+
+
+def test_window_rebuilds_when_range_moves_back(app):
+    start = datetime.datetime(2026, 1, 1, tzinfo=timezone.utc)
+    rows = _rows('站点A', start.replace(tzinfo=None), 500, 1)
+    log_store.write_logs(rows)
+    db.session.commit()
+    end = rows[-1]['timestamp'].replace(tzinfo=timezone.utc)
+    latest = log_store.latest_log_times(['站点A'])
+    span_seconds = (end - start).total_seconds()
+    later = history_window.window_summaries(
+        ['站点A'], start + datetime.timedelta(hours=1), end, latest, [start], end, span_seconds=span_seconds
+    )['站点A']
+    # 同一长度的窗口起点前移后，起点更早的请求需要重建窗口
+    earlier = history_window.window_summaries(
+        ['站点A'], start, end, latest, [start], end, span_seconds=span_seconds
+    )['站点A']
+    assert later.count < earlier.count == len(rows)
+    logs, arrays = history_cache.load_history_logs(['站点A'], start, end)['站点A']
+    assert earlier.overall[0] == history_stats.overall_stats(arrays)[0]
+    assert earlier.overall[2:] == history_stats.overall_stats(arrays)[2:]
@@ -0,0 +1,145 @@
+# web-monitor/tests/test_history_stats.py
+"""history_stats 向量化实现与逐条循环的原始实现（benchmarks.legacy_history_stats）的等价性测试。"""
+import datetime
+
+import numpy as np
+import pytest
+
+from app import benchmarks, history_stats
+from app.benchmarks import BenchLog
+
+MONITOR_INTERVAL = datetime.timedelta(seconds=20)
+
+
+def _log(timestamp, status='正常', response_time=0.2, http_status_code=200, error_detail=None):
+    return BenchLog('site', timestamp, status, response_time, http_status_code, error_detail)
+
+
+def _edge_logs(now):
+    """间隔恰好在 1.5 倍检查间隔两侧、状态切换、缺失响应时间与跨天的日志。"""
+    start = now.replace(tzinfo=None) - datetime.timedelta(days=2, hours=1)
+    offsets = [0, 20, 30, 60.000001, 80, 110, 140.5, 160, 180]
+    logs = [_log(start + datetime.timedelta(seconds=s)) for s in offsets]
+    logs += [
+        _log(start + datetime.timedelta(seconds=200), '访问过慢', 4.5),
+        _log(start + datetime.timedelta(seconds=220), '无法访问', None, 503, '连接超时'),
+        _log(start + datetime.timedelta(seconds=240), '无法访问', None, None, None),
+        _log(start + datetime.timedelta(seconds=260), '未知状态', None),
+        _log(start + datetime.timedelta(days=1, seconds=5), '正常', 0.3),
+        _log(now.replace(tzinfo=None) - datetime.timedelta(minutes=1), '访问过慢', 5.0),
+    ]
+    return logs
+
+
+def _datasets():
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return {
+        'synthetic': (benchmarks.synthetic_logs(5000, seed=7), now),
+        'edges': (_edge_logs(now), now),
+        'all_missing': ([_log(now.replace(tzinfo=None) - datetime.timedelta(seconds=20 * i), '无法访问', None)
+                         for i in range(5, 0, -1)], now),
+        'single': ([_log(now.replace(tzinfo=None) - datetime.timedelta(hours=1))], now),
+    }
+
+
+@pytest.mark.parametrize('name', ['synthetic', 'edges', 'all_missing', 'single'])
+def test_matches_legacy_implementation(name):
+    logs, now = _datasets()[name]
+    expected = benchmarks.legacy_history_stats(logs, now, MONITOR_INTERVAL)
+    actual = benchmarks.vectorized_history_stats(logs, now, MONITOR_INTERVAL)
+    assert benchmarks.compare_history_stats(expected, actual) == []
+
+
+def test_overall_stats_empty():
+    arrays = history_stats.log_arrays([])
+    assert history_stats.overall_stats(arrays) == (0, 0, 0, 0)
+
+
+def test_overall_stats_ignores_missing_response_times():
+    now = datetime.datetime(2026, 1, 1)
+    logs = [_log(now + datetime.timedelta(seconds=i), response_time=value)
+            for i, value in enumerate([0.1, None, 0.3, None, 0.2])]
+    availability, average, p95, p99 = history_stats.overall_stats(history_stats.log_arrays(logs))
+    assert availability == 100
+    assert average == pytest.approx(0.2)
+    assert (p95, p99) == (0.3, 0.3)
+
+
+def test_period_availability_bounds_and_fallback():
+    start = datetime.datetime(2026, 1, 1)
+    logs = [_log(start + datetime.timedelta(minutes=i), '正常' if i % 2 else '无法访问', None) for i in range(4)]
+    arrays = history_stats.log_arrays(logs)
+    to_us = history_stats.to_epoch_us
+    # 区间两端都包含在内
+    assert history_stats.period_availability(
+        arrays, to_us(start + datetime.timedelta(minutes=1)), to_us(start + datetime.timedelta(minutes=2)), -1
+    ) == 50
+    assert history_stats.period_availability(
+        arrays, to_us(start + datetime.timedelta(minutes=1)), to_us(start + datetime.timedelta(minutes=1)), -1
+    ) == 100
+    assert history_stats.period_availability(
+        arrays, to_us(start + datetime.timedelta(hours=1)), to_us(start + datetime.timedelta(hours=2)), -1
+    ) == -1
+
+
+def test_timeline_segments_gap_threshold():
+    start = datetime.datetime(2026, 1, 1)
+    gap_us = int(MONITOR_INTERVAL.total_seconds() * 1.5 * 1_000_000)
+    # 30 秒（等于阈值）不切分，30.000001 秒切分；未知状态按正常处理
+    offsets = [0, 30, 60.000001, 80]
+    statuses = ['正常', '未知状态', '正常', '访问过慢']
+    logs = [_log(start + datetime.timedelta(seconds=s), status) for s, status in zip(offsets, statuses)]
+    starts, ends = history_stats.timeline_segments(history_stats.log_arrays(logs), gap_us)
+    assert starts.tolist() == [0, 2, 3]
+    assert ends.tolist() == [2, 3, 4]
+
+
+def _lttb_input(n, seed=3, missing_ratio=0.0):
+    rng = np.random.default_rng(seed)
+    x = np.arange(n, dtype=np.int64) * 20_000_000
+    y = rng.lognormal(-1.0, 0.5, n)
+    if missing_ratio:
+        y[rng.random(n) < missing_ratio] = np.nan
+    return x, y
+
+
+def test_lttb_keeps_all_points_when_under_limit():
+    x, y = _lttb_input(50)
+    assert history_stats.lttb_indices(x, y, 50).tolist() == list(range(50))
+    assert history_stats.lttb_indices(x, y, 0).tolist() == list(range(50))
+
+
+def test_lttb_keeps_endpoints_and_peak():
+    x, y = _lttb_input(10_000)
+    peak = 1234
+    y[peak] = 100.0
+    indices = history_stats.lttb_indices(x, y, 200)
+    assert indices.size <= 200
+    assert np.all(np.diff(indices) > 0)
+    assert indices[0] == 0 and indices[-1] == x.size - 1
+    assert peak in indices
+
+
+def test_lttb_marks_missing_buckets():
+    x, y = _lttb_input(10_000, missing_ratio=0.002)
+    peak = int(np.nanargmax(y))
+    max_points = 200
+    indices = history_stats.lttb_indices(x, y, max_points)
+    assert indices.size <= max_points
+    assert peak in indices
+    # 每个含 NaN 的桶都保留了该桶第一个 NaN 点
+    bucket_count = max(1, (max_points - 2) // 2)
+    edges = np.linspace(1, x.size - 1, bucket_count + 1).astype(np.int64)
+    kept = set(indices.tolist())
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        missing = np.flatnonzero(np.isnan(y[lo:hi]))
+        if missing.size:
+            assert lo + int(missing[0]) in kept
+
+
+def test_lttb_all_missing():
+    x = np.arange(1000, dtype=np.int64)
+    y = np.full(1000, np.nan)
+    indices = history_stats.lttb_indices(x, y, 50)
+    assert indices.size <= 50
+    assert indices[0] == 0 and indices[-1] == 999
@@ -0,0 +1,92 @@
+# web-monitor/tests/test_rollup_history.py
+"""历史数据层的选择与基于聚合数据的历史结果。"""
+import datetime
+from datetime import timezone
+
+from app import log_store
+from app.extensions import db
+from app.models import HealthCheckRollup
+from app.routes import _build_rollup_history
+from app.services import select_history_resolution
+from app.sketches import LatencySketch
+
+MINUTE = HealthCheckRollup.RESOLUTION_MINUTE
+
+
+def test_retention_boundary_uses_raw_logs(app):
+    now = datetime.datetime(2026, 10, 19, 12, 0, 0)
+    retention = datetime.timedelta(days=app.config['DATA_RETENTION_DAYS'])
+    # “最近 N 天”按钮：客户端先计算起点，到达服务端时已早于 now - N 天几毫秒
+    assert select_history_resolution(now - retention, app.config, now=now) == 0
+    assert select_history_resolution(now - retention - datetime.timedelta(milliseconds=40), app.config, now=now) == 0
+    assert select_history_resolution(now - retention - datetime.timedelta(hours=2), app.config, now=now) == MINUTE
+
+
+def test_raw_logs_still_covering_start_are_used(app):
+    now = datetime.datetime.utcnow()
+    start = now - datetime.timedelta(days=app.config['DATA_RETENTION_DAYS'], hours=2)
+    assert select_history_resolution(start, app.config, now=now, site_names=['站点A']) == MINUTE
+    # 清理任务尚未运行，截止时间之前的原始日志仍在
+    log_store.write_logs([{
+        'site_name': '站点A',
+        'timestamp': start - datetime.timedelta(minutes=1),
+        'status': '正常',
+        'response_time_seconds': 0.2,
+        'http_status_code': 200,
+        'error_detail': None,
+    }])
+    db.session.commit()
+    assert select_history_resolution(start, app.config, now=now, site_names=['站点A']) == 0
+    assert select_history_resolution(start, app.config, now=now, site_names=['站点B']) == MINUTE
+
+
+def _add_buckets(site_name, start, count, step, down_at=()):
+    for index in range(count):
+        down = index in down_at
+        sketch = LatencySketch()
+        if not down:
+            sketch.add(0.2)
+        db.session.add(HealthCheckRollup(
+            site_name=site_name,
+            bucket_seconds=MINUTE,
+            bucket_start=start + step * index,
+            total_count=1,
+            up_count=0 if down else 1,
+            slow_count=0,
+            down_count=1 if down else 0,
+            response_time_sum=0.0 if down else 0.2,
+            response_time_count=0 if down else 1,
+            response_time_min=None if down else 0.2,
+            response_time_max=None if down else 0.2,
+            latency_sketch=sketch.to_bytes(),
+        ))
+    db.session.commit()
+
+
+def _range(start, count, step):
+    return start.replace(tzinfo=timezone.utc), (start + step * count).replace(tzinfo=timezone.utc)
+
+
+def test_buckets_within_monitor_interval_are_one_segment(app):
+    # 检查间隔大于聚合粒度时，每个分钟桶之间都隔着空桶，不应各自成段
+    app.config['MONITOR_INTERVAL_SECONDS'] = 180
+    step = datetime.timedelta(minutes=3)
+    start = datetime.datetime(2026, 8, 1)
+    _add_buckets('站点A', start, 40, step, down_at={20, 21})
+    start_utc, end_utc = _range(start, 40, step)
+
+    result = _build_rollup_history(['站点A'], start_utc, end_utc, MINUTE)['站点A']
+    assert [entry[2] for entry in result['timeline_data']] == [1, 3, 1]
+    assert len(result['incidents']) == 1
+
+
+def test_sites_match_single_site_queries(app):
+    step = datetime.timedelta(minutes=1)
+    start = datetime.datetime(2026, 8, 1)
+    _add_buckets('站点A', start, 30, step, down_at={5})
+    _add_buckets('站点B', start + step * 10, 30, step, down_at={1, 2, 3})
+    start_utc, end_utc = _range(start, 60, step)
+
+    combined = _build_rollup_history(['站点A', '站点B', '站点C'], start_utc, end_utc, MINUTE)
+    for site in ('站点A', '站点B', '站点C'):
+        assert combined[site] == _build_rollup_history([site], start_utc, end_utc, MINUTE)[site]
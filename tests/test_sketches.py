@@ -0,0 +1,125 @@
+# web-monitor/tests/test_sketches.py
+"""响应时间分位数草图：合并后的分位数误差、序列化往返与边界值。"""
+import random
+
+import numpy as np
+import pytest
+
+from app import benchmarks, sketches
+from app.sketches import MIN_VALUE, RELATIVE_ACCURACY, LatencySketch
+
+QUANTILES = (0.0, 0.25, 0.5, 0.9, 0.95, 0.99, 0.999, 1.0)
+
+
+def _order_statistic(ordered, q):
+    # 与 LatencySketch.quantile 以及 get_history 相同的取值方式
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def _blobs(values, bucket_size):
+    blobs = []
+    for offset in range(0, len(values), bucket_size):
+        sketch = LatencySketch()
+        sketch.add_many(values[offset:offset + bucket_size])
+        blobs.append(sketch.to_bytes())
+    return blobs
+
+
+@pytest.mark.parametrize('distribution', benchmarks.PERCENTILE_DISTRIBUTIONS)
+@pytest.mark.parametrize('bucket_size', [1, 3, 1000])
+def test_merged_quantiles_within_relative_accuracy(distribution, bucket_size):
+    rng = random.Random(11)
+    values = [max(value, 0.0) for value in benchmarks._synthetic_latencies(distribution, 10_000, rng)]
+    merged = sketches.merge_blobs(_blobs(values, bucket_size))
+    assert merged.count == len(values)
+    ordered = sorted(values)
+    for q in QUANTILES:
+        exact = _order_statistic(ordered, q)
+        estimate = merged.quantile(q)
+        if exact < MIN_VALUE:
+            assert estimate == 0.0
+        else:
+            assert abs(estimate - exact) <= RELATIVE_ACCURACY * exact * (1 + 1e-9), (q, exact, estimate)
+    # 中位数附近也与 numpy 的分位数在误差范围内（名次取法不同，只比较数据足够密集的位置）
+    assert merged.quantile(0.5) == pytest.approx(np.percentile(values, 50), rel=RELATIVE_ACCURACY * 2)
+
+
+def test_benchmark_accuracy_check():
+    for result in benchmarks.check_sketch_accuracy(5000, seed=3).values():
+        assert result['max_relative_error'] <= RELATIVE_ACCURACY * (1 + 1e-9)
+
+
+def test_add_and_add_many_agree():
+    values = [0.0, MIN_VALUE / 2, MIN_VALUE, 0.05, 0.05, 1.7, 42.0, None, float('nan')]
+    one_by_one = LatencySketch()
+    for value in values:
+        one_by_one.add(value)
+    batched = LatencySketch()
+    batched.add_many([np.nan if value is None else value for value in values])
+    assert (one_by_one.zero_count, one_by_one.bins) == (batched.zero_count, batched.bins)
+    assert one_by_one.count == 7
+
+
+def test_bytes_round_trip_and_merge_blobs():
+    rng = random.Random(5)
+    parts = []
+    for _ in range(20):
+        sketch = LatencySketch()
+        sketch.add_many([rng.lognormvariate(-1, 1) for _ in range(rng.randint(0, 50))] + [0.0] * rng.randint(0, 2))
+        parts.append(sketch)
+
+    expected = LatencySketch()
+    for sketch in parts:
+        restored = LatencySketch.from_bytes(sketch.to_bytes())
+        assert (restored.zero_count, restored.bins) == (sketch.zero_count, sketch.bins)
+        expected.merge(sketch)
+
+    merged = sketches.merge_blobs([None, b''] + [sketch.to_bytes() for sketch in parts])
+    assert (merged.zero_count, merged.bins) == (expected.zero_count, expected.bins)
+    assert LatencySketch.from_bytes(merged.to_bytes()).bins == merged.bins
+    for q in QUANTILES:
+        assert merged.quantile(q) == expected.quantile(q)
+
+
+def test_empty_sketches():
+    empty = LatencySketch()
+    assert empty.count == 0
+    assert empty.quantile(0.5) is None
+    restored = LatencySketch.from_bytes(empty.to_bytes())
+    assert (restored.zero_count, restored.bins) == (0, {})
+    for blobs in ([], [None], [empty.to_bytes(), empty.to_bytes()]):
+        merged = sketches.merge_blobs(blobs)
+        assert merged.count == 0
+        assert merged.quantile(0.99) is None
+    empty.add_many([])
+    assert empty.count == 0
+
+
+def test_zero_and_tiny_values():
+    sketch = LatencySketch()
+    sketch.add_many([0.0, 0.0, MIN_VALUE / 10, 1.0])
+    assert sketch.zero_count == 3
+    # 名次落在零值桶内时返回 0，之后返回非零桶的代表值
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(0.74) == 0.0
+    assert sketch.quantile(0.75) == pytest.approx(1.0, rel=RELATIVE_ACCURACY)
+
+    only_zeros = sketches.merge_blobs([LatencySketch().to_bytes(), _zeros(4)])
+    assert only_zeros.count == 4
+    assert only_zeros.quantile(1.0) == 0.0
+
+
+def _zeros(count):
+    sketch = LatencySketch()
+    for _ in range(count):
+        sketch.add(0.0)
+    return sketch.to_bytes()
+
+
+def test_unknown_version_rejected():
+    blob = bytearray(LatencySketch().to_bytes())
+    blob[0] = sketches.SKETCH_VERSION + 1
+    with pytest.raises(ValueError):
+        LatencySketch.from_bytes(bytes(blob))
+    with pytest.raises(ValueError):
+        sketches.merge_blobs([bytes(blob)])
@@ -0,0 +1,62 @@
+# web-monitor/tests/test_startup.py
+import sqlalchemy as sa
+
+from app import create_app, log_store, status_snapshot
+from app.extensions import db
+from app.startup import bootstrap_marker
+
+from conftest import _test_config
+
+
+def test_marker_is_stable(app):
+    assert bootstrap_marker(app.config) == bootstrap_marker(app.config)
+
+
+def test_marker_changes_with_columns_and_indexes(app):
+    original = bootstrap_marker(app.config)
+    table = sa.Table('test_only', db.metadata, sa.Column('id', sa.Integer, primary_key=True))
+    try:
+        with_table = bootstrap_marker(app.config)
+        assert with_table != original
+
+        column = sa.Column('value', sa.Integer)
+        table.append_column(column)
+        with_column = bootstrap_marker(app.config)
+        assert with_column != with_table
+
+        sa.Index('ix_test_only_value', column)
+        assert bootstrap_marker(app.config) != with_column
+    finally:
+        db.metadata.remove(table)
+    assert bootstrap_marker(app.config) == original
+
+
+def test_marker_changes_with_config(app):
+    original = bootstrap_marker(app.config)
+    app.config['QYWECHAT_WEBHOOK_URL'] = 'https://example.invalid/hook'
+    assert bootstrap_marker(app.config) != original
+
+
+def test_migrate_is_initialised_outside_cli(app):
+    # 非命令行进程（Web、检查进程）中同样可以使用 flask_migrate 的 upgrade 等接口
+    assert app.extensions['migrate'].db is db
+
+
+def test_pooled_connections_use_busy_timeout(tmp_path, monkeypatch):
+    # 注册后台页面时已经查询过数据库，那时建立并放回连接池的连接同样需要设置 busy_timeout
+    monkeypatch.setattr(status_snapshot, 'configure_shared', lambda *args, **kwargs: None)
+    monkeypatch.setattr(log_store, '_partitions_loaded_at', None)
+    app = create_app(_test_config(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'monitor.db'}",
+        SQLITE_BUSY_TIMEOUT_MS=12345,
+    ))
+    with app.app_context():
+        # 同时取出连接池中已有的全部连接（再加一个新建连接）
+        connections = [db.engine.connect() for _ in range(db.engine.pool.checkedin() + 1)]
+        try:
+            assert [c.exec_driver_sql('PRAGMA busy_timeout').scalar() for c in connections] == [12345] * len(connections)
+        finally:
+            for connection in connections:
+                connection.close()
+            db.session.remove()
+            db.engine.dispose()
@@ -0,0 +1,38 @@
+# web-monitor/tests/test_status_stream.py
+import threading
+
+from app.status_stream import StatusHub
+
+
+def test_subscribe_respects_capacity_under_concurrency():
+    hub = StatusHub()
+    barrier = threading.Barrier(20)
+    results = []
+
+    def connect():
+        barrier.wait()
+        results.append(hub.subscribe(8, max_subscribers=5))
+
+    threads = [threading.Thread(target=connect) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    accepted = [result for result in results if result is not None]
+    assert len(accepted) == 5
+    assert hub.subscriber_count == 5
+
+    # 有连接断开后可以重新订阅
+    hub.unsubscribe(accepted[0][0])
+    assert hub.subscribe(8, max_subscribers=5) is not None
+    assert hub.subscribe(8, max_subscribers=5) is None
+
+
+def test_subscribe_replays_missed_events():
+    hub = StatusHub()
+    first = hub.publish('check', {'site': 'A'})
+    hub.publish('check', {'site': 'B'})
+    subscriber, backlog = hub.subscribe(8, last_event_id=first)
+    assert len(backlog) == 1 and '"site":"B"' in backlog[0]
+    hub.publish('status', {'site': 'A'})
+    assert subscriber.queue.get_nowait().startswith(f'id: {first + 2}\n')
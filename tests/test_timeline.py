@@ -0,0 +1,121 @@
+# web-monitor/tests/test_timeline.py
+"""时间线的两种计算方式（逐条日志 / 数据库窗口函数）在同一批日志上的结果必须一致。"""
+import datetime
+from datetime import timezone
+
+import pytest
+import sqlalchemy as sa
+
+from app import history_format, history_stats, log_store, timeline_sql
+from app.extensions import db
+from app.history_cache import HISTORY_LOG_COLUMNS
+from app.routes import _build_timeline_from_logs, _build_timeline_from_runs
+
+MONITOR_INTERVAL = datetime.timedelta(seconds=20)
+START = datetime.datetime(2026, 3, 1, 23, 50)
+
+
+def _row(site_name, seconds, status='正常', response_time=0.2, http_status_code=200, error_detail=None):
+    return {
+        'site_name': site_name,
+        'timestamp': START + datetime.timedelta(seconds=seconds),
+        'status': status,
+        'response_time_seconds': response_time,
+        'http_status_code': http_status_code,
+        'error_detail': error_detail,
+    }
+
+
+def _edge_rows(site_name):
+    """检查间隔 20 秒（断开阈值 30 秒），跨越午夜（按天分区时落在两个分区）。"""
+    rows = [
+        _row(site_name, 0),
+        _row(site_name, 20, response_time=None),
+        # 间隔依次为 29.999999、30、30.000001 与 30.000001 秒：刚好低于、等于与刚好超过 1.5 倍检查间隔
+        _row(site_name, 49.999999),
+        _row(site_name, 79.999999),
+        _row(site_name, 110),
+        _row(site_name, 140.000001),
+        _row(site_name, 160, '访问过慢', 4.2),
+        _row(site_name, 180, '访问过慢', None),
+        _row(site_name, 200, '无法访问', None, None, None),
+        _row(site_name, 220, '无法访问', None, 503, None),
+        _row(site_name, 240, '无法访问', None, None, '连接超时'),
+        _row(site_name, 270.000001, '无法访问', None, None, '连接超时'),
+        _row(site_name, 290, '正常', None, 404, None),
+        _row(site_name, 310, '未知状态', 0.3),
+        _row(site_name, 330, '正常', None),
+    ]
+    # 午夜前后连续检查，中间夹杂状态切换
+    for i in range(40):
+        status = '无法访问' if 15 <= i < 18 else '正常'
+        rows.append(_row(
+            site_name, 560 + i * 20, status,
+            None if status == '无法访问' or i % 7 == 0 else 0.1 + i / 100,
+            500 if status == '无法访问' and i == 16 else 200,
+        ))
+    return rows
+
+
+def _python_timelines(site_names, start, end):
+    source = log_store.log_source(start, end, site_names)
+    rows = db.session.execute(
+        sa.select(*[source.c[name] for name in HISTORY_LOG_COLUMNS]).where(
+            source.c.site_name.in_(site_names),
+            source.c.timestamp.between(start, end),
+        ).order_by(source.c.site_name, source.c.timestamp)
+    ).all()
+    by_site = {}
+    for row in rows:
+        by_site.setdefault(row.site_name, []).append(row)
+    end_time_utc = end.replace(tzinfo=timezone.utc)
+    return {
+        site: history_format.timeline_rows(
+            _build_timeline_from_logs(logs, history_stats.log_arrays(logs), end_time_utc, MONITOR_INTERVAL)
+        )
+        for site, logs in by_site.items()
+    }
+
+
+def _sql_timelines(site_names, start, end):
+    end_time_utc = end.replace(tzinfo=timezone.utc)
+    runs = timeline_sql.timeline_runs(site_names, start, end, MONITOR_INTERVAL.total_seconds())
+    return {
+        site: history_format.timeline_rows(_build_timeline_from_runs(site_runs, end_time_utc))
+        for site, site_runs in runs.items()
+    }
+
+
+@pytest.mark.parametrize('partitioning', [None, 'day'])
+def test_sql_timeline_matches_python(app, partitioning):
+    if not timeline_sql.supported():
+        pytest.skip('SQLite 版本不支持窗口函数')
+    site_names = ['站点A', '站点B']
+    # 站点 A 写入未分区的表，开启分区时站点 B 按天写入分区表
+    log_store.write_logs(_edge_rows('站点A'))
+    app.config['LOG_PARTITIONING'] = partitioning
+    log_store.write_logs(_edge_rows('站点B'))
+    db.session.commit()
+    if partitioning:
+        assert len(log_store.list_partitions()) == 2
+
+    end = START + datetime.timedelta(hours=1)
+    for start in (START - datetime.timedelta(minutes=1), START + datetime.timedelta(seconds=100)):
+        expected = _python_timelines(site_names, start, end)
+        actual = _sql_timelines(site_names, start, end)
+        assert set(expected) == set(site_names)
+        assert actual == expected
+
+
+def test_gap_threshold_splits_segments(app):
+    log_store.write_logs(_edge_rows('站点A'))
+    db.session.commit()
+    if not timeline_sql.supported():
+        pytest.skip('SQLite 版本不支持窗口函数')
+    start, end = START, START + datetime.timedelta(hours=1)
+    start_ms = int(START.replace(tzinfo=timezone.utc).timestamp() * 1000)
+    for timelines in (_python_timelines(['站点A'], start, end), _sql_timelines(['站点A'], start, end)):
+        rows = timelines['站点A']
+        # 只有超过 30 秒的两个间隔断开，之后才是状态切换
+        assert [row[0] - start_ms for row in rows[:4]] == [0, 110_000, 140_000, 160_000]
+        assert [row[2] for row in rows[:4]] == [1, 1, 1, 2]